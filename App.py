@@ -1,35 +1,102 @@
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import sys
 from PyQt6.QtWidgets import QApplication, QMainWindow, QDialog, QMessageBox
-from PyQt6.QtCore import Qt
-from MySQLConnectionConfigure import ConnectionDialog, check_database_connection
+from PyQt6.QtCore import Qt, QTimer
+from MySQLConnectionConfigure import ConnectionDialog, open_database_connection
+from ConnectionManager import ConnectionManager, read_database_config, read_replica_configs
 from StoreManager import MainWindow
 import warnings
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 
+class StartupProfile:
+    # Per-phase cold start timings for --profile-startup. Time spent waiting
+    # for the user in the login dialog is left out of the total.
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.phases = [("imports", time.perf_counter() - STARTED)]
+        self.last = time.perf_counter()
+        self.reported = False
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def skip(self):
+        self.last = time.perf_counter()
+
+    def report(self):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        for phase, seconds in self.phases:
+            print(f"{phase:>22}: {seconds * 1000:8.1f} ms")
+        print(f"{'total':>22}: {sum(seconds for _, seconds in self.phases) * 1000:8.1f} ms")
+
+
 class MainApplication(QApplication):
-    def __init__(self, argv):
+    def __init__(self, argv, profile_startup=False):
         super().__init__(argv)
+        self.profile = StartupProfile(profile_startup)
 
+        config = read_database_config()
+        if config.get("backend") == "sqlite":
+            # The embedded store needs no login
+            self.db = ConnectionManager(config)
+        else:
+            self.db = self.login(config)
+
+        if self.db is not None:
+            self.aboutToQuit.connect(self.db.close)
+            self.profile.mark("connect")
+
+            self.main_window = MainWindow(self.db)
+            self.profile.mark("main window UI")
+            self.main_window.show()
+            if profile_startup:
+                # The first pages are loaded once the executor goes idle
+                QTimer.singleShot(0, lambda: self.profile.mark("first paint"))
+                self.main_window.executor.busy_changed.connect(self.first_data_loaded)
+
+    def login(self, config):
         self.connection_dialog = ConnectionDialog()
+        self.profile.mark("login dialog UI")
         while True:
             result = self.connection_dialog.exec()
+            self.profile.skip()
 
             if result == QDialog.DialogCode.Accepted:
                 username, password, port = self.connection_dialog.get_connection_info()
-                if check_database_connection(username, password, port):
+                connection = open_database_connection(username, password, port)
+                if connection is not None:
                     self.connection_dialog.hide()
                     break
                 else:
                     QMessageBox.warning(None, "Warning", "Database connection failed. Please check your credentials.")
             else:
-                break
+                return None
 
-        if result == QDialog.DialogCode.Accepted:
-            self.main_window = MainWindow()
-            self.main_window.show()
+        # The validated connection becomes the first pooled connection
+        config.update(user=username, password=password, port=int(port or 3306))
+        return ConnectionManager(config, connection=connection, replicas=read_replica_configs(config))
+
+    def first_data_loaded(self, busy):
+        if not busy and not self.profile.reported:
+            self.profile.mark("first data load")
+            self.profile.report()
 
 
 if __name__ == "__main__":
-    app = MainApplication([])
+    parser = argparse.ArgumentParser(description="Store Management System")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long each startup phase took")
+    args, qt_args = parser.parse_known_args()
+
+    app = MainApplication(sys.argv[:1] + qt_args, args.profile_startup)
     app.exec()
@@ -0,0 +1,227 @@
+import argparse
+import csv
+import os
+import time
+from contextlib import closing
+from datetime import date
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    # Parquet and Arrow exports need pyarrow; CSV does not
+    pyarrow = None
+
+CHUNK_SIZE = 10000
+KINDS = ("sales", "inventory")
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+# Inventory rows are read in primary key order, so the server streams them
+# without sorting the result first. Sales come from the live table and the
+# archive; a date filter is pushed into both, so only the archive partitions
+# of those dates are read.
+EXPORTS = {
+    "sales": (
+        """
+        SELECT sale.saleid, customer.name, product.name, sale.quantity, sale.unitprice,
+               sale.quantity * sale.unitprice, sale.saledate
+            FROM (SELECT saleid, productid, customerid, quantity, unitprice, saledate FROM sale
+                  UNION ALL
+                  SELECT saleid, productid, customerid, quantity, unitprice, saledate FROM sale_archive) AS sale
+            LEFT JOIN customer ON sale.customerid = customer.customerid
+            LEFT JOIN product ON sale.productid = product.productid
+        """,
+        "order by sale.saleid",
+        (("saleid", "int"), ("customer", "text"), ("product", "text"), ("quantity", "int"),
+         ("unitprice", "money"), ("total", "money"), ("saledate", "date")),
+    ),
+    "inventory": (
+        """
+        SELECT p.productid, p.name, p.price, su.supplierid, su.name, s.quantity, s.purchasedate
+            FROM product p
+            JOIN stock s ON p.productid = s.productid
+            JOIN supplier su ON s.supplierid = su.supplierid
+        """,
+        "order by p.productid, su.supplierid",
+        (("productid", "int"), ("product", "text"), ("price", "money"), ("supplierid", "int"),
+         ("supplier", "text"), ("quantity", "int"), ("purchasedate", "date")),
+    ),
+}
+
+
+class ExportReport:
+    def __init__(self, kind, path):
+        self.kind = kind
+        self.path = path
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"Exported {self.rows} {self.kind} rows to {self.path} in {self.elapsed:.2f}s "
+                f"({self.rows_per_sec:,.0f} rows/sec).")
+
+
+def sales_filter(date_from=None, date_to=None, customer=None, product_id=None):
+    # (conditions, params) for exporting part of the sales
+    conditions, params = [], []
+    if date_from is not None:
+        conditions.append("sale.saledate >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("sale.saledate <= %s")
+        params.append(date_to)
+    if customer:
+        conditions.append("customer.name = %s")
+        params.append(customer)
+    if product_id is not None:
+        conditions.append("sale.productid = %s")
+        params.append(product_id)
+    return conditions, params
+
+
+def format_for(path):
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Cannot tell the export format of '{path}'. Use one of: {', '.join(FORMATS)}.")
+    return fmt
+
+
+######################### WRITERS ######################################
+class CsvExportWriter:
+    def __init__(self, path, fields):
+        self.stream = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow([name for name, kind in fields])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.stream.close()
+
+
+class ArrowExportWriter:
+    # Each chunk becomes one Parquet row group or Arrow record batch, so only
+    # one chunk is ever held in memory
+    def __init__(self, path, fields, fmt):
+        if pyarrow is None:
+            raise ValueError(f"Exporting to {fmt} needs pyarrow (pip install pyarrow); CSV works without it.")
+        self.schema = pyarrow.schema([(name, self.arrow_type(kind)) for name, kind in fields])
+        if fmt == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_file(path, self.schema)
+
+    @staticmethod
+    def arrow_type(kind):
+        if kind == "money":
+            return pyarrow.decimal128(22, 2)
+        return {"int": pyarrow.int32(), "text": pyarrow.string(), "date": pyarrow.date32()}[kind]
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(fmt, path, fields):
+    if fmt == "csv":
+        return CsvExportWriter(path, fields)
+    if fmt in ("parquet", "arrow"):
+        return ArrowExportWriter(path, fields, fmt)
+    raise ValueError(f"Unknown export format '{fmt}'. Expected csv, parquet or arrow.")
+
+
+def stream_rows(connection, query, params, chunk_size):
+    # Chunks of up to chunk_size rows from an unbuffered cursor: the server
+    # sends the result as it is read instead of the client buffering it all
+    cursor = connection.cursor(buffered=False)
+    # The server waits on us while a chunk is written out. The connection
+    # may be a pooled one, so its own timeout is put back afterwards.
+    # SQLite has no such timeout.
+    timeout = None
+    if getattr(connection, "backend", "mysql") != "sqlite":
+        cursor.execute("SELECT @@SESSION.net_write_timeout")
+        timeout = cursor.fetchall()[0][0]
+        cursor.execute("SET SESSION net_write_timeout = 600")
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        # A result left half read must be drained before the connection can
+        # run anything else
+        connection.consume_results()
+        if timeout is not None:
+            cursor.execute("SET SESSION net_write_timeout = %s", (timeout,))
+        cursor.close()
+
+
+def export_file(connection, kind, path, fmt=None, conditions=([], []), chunk_size=CHUNK_SIZE, progress=None):
+    # Streams the rows into `path` chunk by chunk, so memory stays flat
+    # however many rows there are. The file is written under a temporary
+    # name and only appears once it is complete.
+    if kind not in EXPORTS:
+        raise ValueError(f"Unknown export kind '{kind}'. Expected one of: {', '.join(KINDS)}.")
+    query, order, fields = EXPORTS[kind]
+    conditions, params = conditions
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    report = ExportReport(kind, path)
+
+    part = path + ".part"
+    writer = open_writer(fmt or format_for(path), part, fields)
+    try:
+        with closing(stream_rows(connection, f"{query} {order}", tuple(params), chunk_size)) as chunks:
+            for rows in chunks:
+                writer.write(rows)
+                report.rows += len(rows)
+                report.elapsed = time.perf_counter() - report.started
+                if progress is not None:
+                    progress(report)
+    except BaseException:
+        writer.close()
+        os.remove(part)
+        raise
+    writer.close()
+    os.replace(part, path)
+
+    report.elapsed = time.perf_counter() - report.started
+    return report
+
+
+if __name__ == "__main__":
+    from ConnectionManager import read_database_config, connect_database
+
+    parser = argparse.ArgumentParser(description="Export sales or inventory to CSV, Parquet or Arrow.")
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("path", help="the extension picks the format: .csv, .parquet, .arrow or .feather")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="sales only")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="sales only")
+    parser.add_argument("--customer", help="sales only: the customer's name")
+    parser.add_argument("--product", type=int, help="sales only: the product ID")
+    args = parser.parse_args()
+    conditions = sales_filter(args.date_from, args.date_to, args.customer, args.product) if args.kind == "sales" else ([], [])
+
+    connection = connect_database(read_database_config())
+    try:
+        report = export_file(connection, args.kind, args.path,
+                             conditions=conditions,
+                             progress=lambda r: print(f"{r.rows} rows, {r.rows_per_sec:,.0f} rows/sec"))
+    finally:
+        connection.close()
+    print(report.summary())
@@ -0,0 +1,340 @@
+import argparse
+import csv
+import json
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+import mysql.connector
+
+BATCH_SIZE = 5000
+KINDS = ("products", "stock", "sales")
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows_ok = 0
+        self.rows_failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def fail(self, line, message):
+        self.rows_failed += 1
+        self.errors.append((line, message))
+
+    @property
+    def rows_per_sec(self):
+        return self.rows_ok / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"Imported {self.rows_ok} {self.kind} rows in {self.elapsed:.2f}s "
+                f"({self.rows_per_sec:,.0f} rows/sec), {self.rows_failed} failed.")
+
+
+######################### READING ######################################
+def iter_json_array(stream, chunk_size=1 << 16):
+    # Yields the elements of a top-level JSON array without loading the file
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array or JSON lines.")
+    position = 1
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer):
+            if buffer[position] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # A value running to the end of the buffer may be cut short
+            if end is not None and (end < len(buffer) or eof):
+                yield value
+                position = end
+                continue
+        elif eof:
+            raise ValueError("Unterminated JSON array.")
+
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_records(path):
+    # Yields (line, record) pairs from a CSV file with a header row, a JSON
+    # lines file or a JSON array of objects, one record at a time
+    with open(path, newline="", encoding="utf-8") as stream:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(stream)
+            for record in reader:
+                yield reader.line_num, record
+            return
+
+        first = stream.read(1)
+        while first and first.isspace():
+            first = stream.read(1)
+        stream.seek(0)
+        if first == "[":
+            # Array elements are numbered by position rather than line
+            for line, record in enumerate(iter_json_array(stream), start=1):
+                yield line, record
+        else:
+            for line, text in enumerate(stream, start=1):
+                if text.strip():
+                    yield line, json.loads(text)
+
+
+def batches(records, size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+######################### ROW VALIDATION ################################
+def _text(record, field, required=True):
+    value = record.get(field)
+    value = value.strip() if isinstance(value, str) else value
+    if value in (None, ""):
+        if required:
+            raise ValueError(f"missing {field}")
+        return None
+    return str(value)
+
+
+def _int(record, field, required=True):
+    value = _text(record, field, required)
+    return None if value is None else int(value)
+
+
+def _price(record, field):
+    try:
+        return Decimal(_text(record, field)).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"invalid {field}")
+
+
+def _date(record, field):
+    value = _text(record, field, required=False)
+    return None if value is None else date.fromisoformat(value)
+
+
+def parse_product(record):
+    return (_int(record, "productid", required=False), _text(record, "name"), _price(record, "price"),
+            _int(record, "supplierid"), _int(record, "quantity"))
+
+
+def parse_stock(record):
+    return (_int(record, "productid"), _int(record, "supplierid"), _int(record, "quantity"),
+            _date(record, "purchasedate") or date.today())
+
+
+def parse_sale(record):
+    customer_id = _int(record, "customerid", required=False)
+    customer = None if customer_id is not None else _text(record, "customer")
+    return (customer_id, customer, _int(record, "productid"), _int(record, "quantity"),
+            _date(record, "saledate") or date.today())
+
+
+######################### WRITING ######################################
+def _values(count, width):
+    row = "(" + ", ".join(["%s"] * width) + ")"
+    return ", ".join([row] * count)
+
+
+def upsert_stock(cursor, rows, mode="set"):
+    # rows are (productid, supplierid, quantity, purchasedate)
+    if not rows:
+        return
+    quantity = "quantity + VALUES(quantity)" if mode == "add" else "VALUES(quantity)"
+    cursor.execute(
+        "INSERT INTO stock (productid, supplierid, quantity, purchasedate) VALUES "
+        + _values(len(rows), 4)
+        + f" ON DUPLICATE KEY UPDATE quantity = {quantity}, purchasedate = VALUES(purchasedate)",
+        [value for row in rows for value in row]
+    )
+
+
+def write_products(cursor, rows, stock_mode):
+    with_id = [row for row in rows if row[0] is not None]
+    without_id = [row for row in rows if row[0] is None]
+    product_ids = []
+
+    if with_id:
+        cursor.execute(
+            "INSERT INTO product (productid, name, price) VALUES " + _values(len(with_id), 3)
+            + " ON DUPLICATE KEY UPDATE name = VALUES(name), price = VALUES(price)",
+            [value for row in with_id for value in row[:3]]
+        )
+        product_ids += [row[0] for row in with_id]
+    if without_id:
+        # The ids of a multi-row INSERT rise in row order but need not be
+        # consecutive while other terminals insert products too
+        # (innodb_autoinc_lock_mode = 2), and names are not unique. The
+        # locking read takes the gap after the highest product, so until the
+        # batch commits no other product can land above it (at the default
+        # REPEATABLE READ): every product above it is then one of ours, in
+        # row order.
+        cursor.execute("SELECT COALESCE(MAX(productid), 0) FROM product FOR UPDATE")
+        highest = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM product WHERE productid > %s FOR UPDATE", (highest,))
+        cursor.fetchone()
+        cursor.execute(
+            "INSERT INTO product (name, price) VALUES " + _values(len(without_id), 2),
+            [value for row in without_id for value in row[1:3]]
+        )
+        cursor.execute("SELECT productid FROM product WHERE productid > %s ORDER BY productid", (highest,))
+        new_ids = [row[0] for row in cursor.fetchall()]
+        if len(new_ids) != len(without_id):
+            raise mysql.connector.errors.DatabaseError(msg="New product ids could not be matched to their rows.")
+        product_ids += new_ids
+
+    today = date.today()
+    stock = [(product_id, row[3], row[4], today) for product_id, row in zip(product_ids, with_id + without_id)]
+    upsert_stock(cursor, stock, stock_mode)
+
+
+def resolve_customers(cursor, names):
+    # Name to id for every customer in the batch, adding the missing ones
+    names = sorted(set(names))
+    if not names:
+        return {}
+    placeholders = ", ".join(["%s"] * len(names))
+    cursor.execute(f"SELECT name, customerid FROM customer WHERE name IN ({placeholders})", names)
+    ids = dict(cursor.fetchall())
+    missing = [name for name in names if name not in ids]
+    if missing:
+        # Names are unique, so the new ids are read back by name rather than
+        # assumed consecutive, which they need not be while other terminals
+        # insert customers too
+        cursor.execute("INSERT INTO customer (name) VALUES " + _values(len(missing), 1), missing)
+        placeholders = ", ".join(["%s"] * len(missing))
+        cursor.execute(f"SELECT name, customerid FROM customer WHERE name IN ({placeholders})", missing)
+        ids.update(cursor.fetchall())
+    return ids
+
+
+def write_sales(cursor, rows):
+    customers = resolve_customers(cursor, [row[1] for row in rows if row[0] is None])
+    values = []
+    for customer_id, customer, product_id, quantity, saledate in rows:
+        values += [product_id, customers[customer] if customer_id is None else customer_id, quantity, saledate]
+    # The after_sale trigger takes each imported sale off the stock and
+    # rejects one that would oversell; the row-by-row retry reports it
+    cursor.execute(
+        "INSERT INTO sale (productid, customerid, quantity, saledate) VALUES " + _values(len(rows), 4),
+        values
+    )
+
+
+def log_bulk_load(cursor, origin=None):
+    # One '*' row in the change log makes every other terminal reload in
+    # full, in place of a row per imported row
+    cursor.execute(
+        "INSERT INTO change_log (tablename, rowkey, origin) VALUES ('*', 0, COALESCE(%s, CONNECTION_ID()))",
+        (origin,)
+    )
+
+
+PARSERS = {"products": parse_product, "stock": parse_stock, "sales": parse_sale}
+
+
+def write_batch(cursor, kind, rows, stock_mode):
+    if kind == "products":
+        write_products(cursor, rows, stock_mode)
+    elif kind == "stock":
+        upsert_stock(cursor, rows, stock_mode)
+    else:
+        write_sales(cursor, rows)
+
+
+def import_file(connection, kind, path, batch_size=BATCH_SIZE, stock_mode="set", progress=None, origin=None):
+    # Streams `path` into the database in batches of batch_size rows, one
+    # transaction and multi-row statements per batch. Rows that fail
+    # validation or are rejected by the database are reported in the returned
+    # ImportReport; the rest of their batch is still imported. The rows are
+    # not logged one by one: the change log gets a single '*' row at the end,
+    # recorded as from `origin` (this connection by default), which makes the
+    # other terminals reload.
+    if kind not in PARSERS:
+        raise ValueError(f"Unknown import kind '{kind}'. Expected one of: {', '.join(KINDS)}.")
+    parse = PARSERS[kind]
+    report = ImportReport(kind)
+
+    with connection.cursor() as cursor:
+        cursor.execute("SET @skip_change_log = 1")
+        try:
+            for batch in batches(iter_records(path), batch_size):
+                lines, rows = [], []
+                for line, record in batch:
+                    try:
+                        rows.append(parse(record))
+                        lines.append(line)
+                    except (ValueError, TypeError, AttributeError) as err:
+                        report.fail(line, str(err))
+
+                if rows:
+                    try:
+                        write_batch(cursor, kind, rows, stock_mode)
+                        connection.commit()
+                        report.rows_ok += len(rows)
+                    except mysql.connector.Error:
+                        # Find the offending rows one by one so the others
+                        # still land, each behind a savepoint so the batch
+                        # still commits once rather than once per row
+                        connection.rollback()
+                        for line, row in zip(lines, rows):
+                            cursor.execute("SAVEPOINT import_row")
+                            try:
+                                write_batch(cursor, kind, [row], stock_mode)
+                                report.rows_ok += 1
+                            except mysql.connector.Error as err:
+                                cursor.execute("ROLLBACK TO SAVEPOINT import_row")
+                                report.fail(line, err.msg)
+                        connection.commit()
+
+                report.elapsed = time.perf_counter() - report.started
+                if progress is not None:
+                    progress(report)
+        finally:
+            # A batch cut short by an error is not committed
+            connection.rollback()
+            cursor.execute("SET @skip_change_log = NULL")
+            if report.rows_ok:
+                log_bulk_load(cursor, origin)
+                connection.commit()
+
+    return report
+
+
+if __name__ == "__main__":
+    from ConnectionManager import read_database_config, connect_database
+
+    parser = argparse.ArgumentParser(description="Bulk import products, stock or sales from CSV or JSON.")
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--add-stock", action="store_true", help="add quantities to existing stock instead of replacing them")
+    args = parser.parse_args()
+
+    connection = connect_database(read_database_config())
+    try:
+        report = import_file(connection, args.kind, args.path, args.batch_size,
+                             "add" if args.add_stock else "set",
+                             progress=lambda r: print(f"{r.rows_ok + r.rows_failed} rows, {r.rows_per_sec:,.0f} rows/sec"))
+    finally:
+        connection.close()
+
+    for line, message in report.errors:
+        print(f"line {line}: {message}")
+    print(report.summary())
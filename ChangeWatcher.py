@@ -0,0 +1,79 @@
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+POLL_INTERVAL_MS = 2000
+# Rows of the change log kept when pruning, and how often to prune
+KEEP_CHANGES = 100000
+PRUNE_EVERY_POLLS = 150
+
+
+class ChangeWatcher(QObject):
+    # Keeps the views in step with writes made from other terminals. Every few
+    # seconds the change log is read past the last change seen, which reads
+    # no row while nothing changes; the keys changed since the last poll are
+    # handed to the refresh engine, which re-reads just those rows.
+    message = pyqtSignal(str)
+    # The keys changed per table, or None when too far behind to tell
+    changed = pyqtSignal(object)
+
+    def __init__(self, service, executor, refresh, parent=None, interval=POLL_INTERVAL_MS):
+        super().__init__(parent)
+        self.service = service
+        self.executor = executor
+        self.refresh = refresh
+        self.position = None
+        self.polls = 0
+        self.failing = False
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.poll)
+
+    def start(self):
+        self.poll()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def poll(self):
+        self.polls += 1
+        if self.polls % PRUNE_EVERY_POLLS == 0:
+            self.executor.submit(self.service.prune_changes, KEEP_CHANGES,
+                                 on_error=self.poll_failed, key=("changes", "prune"), traced=False)
+        self.executor.submit(
+            self.service.poll_changes, self.position,
+            on_result=self.apply,
+            on_error=self.poll_failed,
+            key=("changes",),
+            traced=False
+        )
+
+    def poll_failed(self, err):
+        # Reported once, not every few seconds while the database is away
+        if not self.failing:
+            self.failing = True
+            self.message.emit(f"Failed to check for changes from other terminals: {err}")
+
+    def apply(self, result):
+        self.failing = False
+        first_poll = self.position is None
+        self.position, changes = result
+        if first_poll:
+            return
+        if changes is None:
+            # Too far behind the log to tell what changed
+            self.refresh.invalidate_all()
+            self.changed.emit(None)
+            return
+        if not changes:
+            return
+
+        if "sale" in changes:
+            self.refresh.touch("sales", changes["sale"])
+        if "product" in changes or "stock" in changes:
+            self.refresh.touch("products", changes.get("product", set()) | changes.get("stock", set()))
+        if "supplier" in changes:
+            self.refresh.touch("suppliers", changes["supplier"])
+        if "product" in changes or "customer" in changes:
+            # Sales rows show product and customer names and prices
+            self.refresh.invalidate("sales")
+        self.changed.emit(changes)
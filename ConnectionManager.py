@@ -0,0 +1,210 @@
+import configparser
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import mysql.connector
+import SQLiteBackend
+
+CONFIG_FILE = "config.ini"
+
+
+def read_database_config(path=CONFIG_FILE):
+    # Connection settings from the [Database] section of config.ini, the same
+    # file ConnectionDialog writes through QSettings
+    parser = configparser.ConfigParser()
+    parser.read(path)
+    section = parser["Database"] if parser.has_section("Database") else {}
+    if section.get("backend", "mysql") == "sqlite":
+        # An embedded store in one file, no server or credentials
+        return {"backend": "sqlite", "path": section.get("path", "") or "store.db"}
+    return {
+        "host": section.get("host", "localhost") or "localhost",
+        "port": int(section.get("port", "") or 3306),
+        "user": section.get("user", ""),
+        "password": section.get("password", ""),
+        "database": section.get("database", "storedb") or "storedb",
+    }
+
+
+def read_replica_configs(config, path=CONFIG_FILE):
+    # Read replicas listed as "replicas = host:port, host:port" in the
+    # [Database] section. They share the primary's credentials and database.
+    if config.get("backend") == "sqlite":
+        return []
+    parser = configparser.ConfigParser()
+    parser.read(path)
+    endpoints = parser.get("Database", "replicas", fallback="")
+    replicas = []
+    for endpoint in filter(None, (text.strip() for text in endpoints.split(","))):
+        host, _, port = endpoint.partition(":")
+        replicas.append(dict(config, host=host, port=int(port or 3306)))
+    return replicas
+
+
+def connect_database(config):
+    if config.get("backend") == "sqlite":
+        return SQLiteBackend.connect(config["path"])
+    return mysql.connector.connect(**config)
+
+
+class ManagedConnection:
+    # Thin wrapper around a database connection that checks the link
+    # before use. A connection idle for longer than the ping interval is
+    # pinged (and reconnected if the server dropped it) before a new cursor
+    # is handed out, so an idle timeout or network blip does not need a
+    # restart. Everything else is forwarded to the wrapped connection.
+    def __init__(self, manager, connection):
+        self.manager = manager
+        self.connection = connection
+        self.last_used = time.monotonic()
+
+    def cursor(self, *args, **kwargs):
+        self.ensure_alive()
+        cursor = self.connection.cursor(*args, **kwargs)
+        if self.manager.instrumentation is not None:
+            return self.manager.instrumentation.wrap(cursor, kwargs.get("prepared", False))
+        return cursor
+
+    def ensure_alive(self):
+        # Also called before a cached prepared cursor is reused
+        self.manager.ensure_alive(self)
+        self.last_used = time.monotonic()
+
+    def start_transaction(self, *args, **kwargs):
+        self.manager.ensure_alive(self)
+        self.last_used = time.monotonic()
+        return self.connection.start_transaction(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+class ConnectionManager:
+    # Pool of database connections shared by the GUI and background workers.
+    # Connections are opened lazily up to pool_size and reused, so workers do
+    # not pay a TCP and authentication handshake per job. The connection the
+    # login dialog already validated becomes the first pooled connection.
+    #
+    # Read replicas, when given, get a pool each; read_session() and
+    # read_connection() hand out a replica connection and fall back to the
+    # primary when no replica can be reached.
+    def __init__(self, config=None, pool_size=5, connection=None, ping_interval=5.0, instrumentation=None,
+                 replicas=()):
+        self.config = dict(config or read_database_config())
+        self.pool_size = pool_size
+        self.ping_interval = ping_interval
+        # Optional QueryInstrumentation that sees every pooled cursor
+        self.instrumentation = instrumentation
+        self.replicas = [ConnectionManager(replica, pool_size, ping_interval=ping_interval) for replica in replicas]
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+        if connection is not None:
+            self._created = 1
+            self._idle.put(ManagedConnection(self, connection))
+
+    def connect(self):
+        return ManagedConnection(self, connect_database(self.config))
+
+    def acquire(self, timeout=None):
+        try:
+            managed = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.pool_size
+                if grow:
+                    self._created += 1
+            if grow:
+                try:
+                    return self.connect()
+                except mysql.connector.Error:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            try:
+                managed = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise mysql.connector.errors.PoolError("No database connection available.")
+
+        self.ensure_alive(managed)
+        return managed
+
+    def release(self, managed):
+        try:
+            if managed.connection.is_connected() and managed.connection.in_transaction:
+                managed.connection.rollback()
+        except mysql.connector.Error:
+            pass
+        self._idle.put(managed)
+
+    @contextmanager
+    def connection(self):
+        managed = self.acquire()
+        try:
+            yield managed
+        finally:
+            self.release(managed)
+
+    def session(self):
+        # A connection checked out for the lifetime of the GUI window. It runs
+        # in autocommit mode so reads never hold a transaction (or a stale
+        # snapshot) open; writes open short explicit units of work.
+        managed = self.acquire()
+        managed.connection.autocommit = True
+        return managed
+
+    def acquire_replica(self):
+        # A pooled replica connection, or None when none can be reached
+        for replica in self.replicas:
+            replica.instrumentation = self.instrumentation
+            try:
+                return replica, replica.acquire()
+            except mysql.connector.Error:
+                continue
+        return None, None
+
+    def read_session(self):
+        # The session's counterpart on a replica, or None to read from the
+        # primary. Read only, so a write sent to it by mistake fails loudly
+        # instead of diverging from the primary.
+        replica, managed = self.acquire_replica()
+        if managed is None:
+            return None
+        managed.connection.autocommit = True
+        with managed.cursor() as cursor:
+            cursor.execute("SET SESSION TRANSACTION READ ONLY")
+        return managed
+
+    @contextmanager
+    def read_connection(self):
+        # For long reads such as exports: a replica when one is reachable
+        replica, managed = self.acquire_replica()
+        if managed is None:
+            with self.connection() as managed:
+                yield managed
+            return
+        try:
+            yield managed
+        finally:
+            replica.release(managed)
+
+    def ensure_alive(self, managed):
+        if time.monotonic() - managed.last_used >= self.ping_interval:
+            managed.connection.ping(reconnect=True, attempts=3, delay=1)
+            managed.last_used = time.monotonic()
+
+    def close(self):
+        for replica in self.replicas:
+            replica.close()
+        while True:
+            try:
+                managed = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                managed.connection.close()
+            except mysql.connector.Error:
+                pass
@@ -0,0 +1,89 @@
+import time
+from PyQt6.QtWidgets import (QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QSpinBox, QCheckBox,
+                             QPushButton, QTreeWidget, QTreeWidgetItem)
+from PyQt6.QtCore import Qt, QSettings, pyqtSignal
+from PyQt6.QtGui import QBrush, QColor
+
+MAX_ACTIONS = 200
+
+
+class DiagnosticsPanel(QDockWidget):
+    # Dockable list of the recent database actions, newest first, each with
+    # its statements. Statements slower than the threshold are shown in red;
+    # "Slow only" hides actions without one. Prepared statements are marked
+    # [prepare] on their first run and [execute] when run by handle. Traces
+    # arrive on the database threads and are handed to the GUI thread through
+    # a queued signal.
+    trace_finished = pyqtSignal(object)
+
+    def __init__(self, instrumentation, parent=None):
+        super().__init__("Diagnostics", parent)
+        self.setObjectName("diagnostics_panel")
+        self.instrumentation = instrumentation
+        self.settings = QSettings("config.ini", QSettings.Format.IniFormat)
+
+        self.threshold = QSpinBox()
+        self.threshold.setRange(1, 60000)
+        self.threshold.setSuffix(" ms")
+        self.threshold.setValue(int(self.settings.value("Diagnostics/slow_query_ms", instrumentation.slow_ms)))
+        self.slow_only = QCheckBox("Slow only")
+        self.clear_button = QPushButton("Clear")
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Action / statement", "Round trips", "Rows", "ms"])
+        self.tree.setColumnWidth(0, 420)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Slow query threshold:"))
+        controls.addWidget(self.threshold)
+        controls.addWidget(self.slow_only)
+        controls.addStretch()
+        controls.addWidget(self.clear_button)
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.tree)
+        body = QWidget()
+        body.setLayout(layout)
+        self.setWidget(body)
+
+        # Only a value the user picks is saved; config.ini also holds the
+        # database settings and is not rewritten on every launch
+        self.instrumentation.slow_ms = self.threshold.value()
+        self.threshold.valueChanged.connect(self.set_threshold)
+        self.slow_only.toggled.connect(self.apply_filter)
+        self.clear_button.clicked.connect(self.tree.clear)
+        self.trace_finished.connect(self.add_trace)
+        instrumentation.listeners.append(self.trace_finished.emit)
+
+    def set_threshold(self, value):
+        self.instrumentation.slow_ms = value
+        self.settings.setValue("Diagnostics/slow_query_ms", value)
+
+    def is_slow(self, trace):
+        return any(self.instrumentation.is_slow(record) for record in trace.statements)
+
+    def add_trace(self, trace):
+        stamp = time.strftime("%H:%M:%S", time.localtime(trace.started))
+        label = f"{stamp}  {trace.label}" + (f"  (failed: {trace.error})" if trace.error else "")
+        item = QTreeWidgetItem([label, str(trace.round_trips), str(trace.rows), f"{trace.ms:.1f}"])
+        item.setData(0, Qt.ItemDataRole.UserRole, self.is_slow(trace))
+        red = QBrush(QColor("red"))
+        for record in trace.statements:
+            text = f"[{record.mode}] {record.text}" if record.mode else record.text
+            child = QTreeWidgetItem(item, [text, "", str(record.rows), f"{record.ms:.1f}"])
+            child.setToolTip(0, f"{record.text}\n\nFetching and decoding the rows: {record.fetch_ms:.1f} ms")
+            if self.instrumentation.is_slow(record):
+                for column in range(4):
+                    child.setForeground(column, red)
+        if self.is_slow(trace):
+            item.setForeground(0, red)
+
+        self.tree.insertTopLevelItem(0, item)
+        item.setHidden(self.slow_only.isChecked() and not self.is_slow(trace))
+        while self.tree.topLevelItemCount() > MAX_ACTIONS:
+            self.tree.takeTopLevelItem(self.tree.topLevelItemCount() - 1)
+
+    def apply_filter(self, slow_only):
+        for row in range(self.tree.topLevelItemCount()):
+            item = self.tree.topLevelItem(row)
+            item.setHidden(slow_only and not item.data(0, Qt.ItemDataRole.UserRole))
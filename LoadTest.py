@@ -0,0 +1,199 @@
+import argparse
+import json
+import random
+import threading
+import time
+import mysql.connector
+from ConnectionManager import CONFIG_FILE, read_database_config
+
+# Simulates several cashiers selling the same few products at once against a
+# local MySQL with StoreDB.sql loaded. Each cashier has its own connection and
+# sells through makepurchase (or makeorder with --basket), as the GUI does.
+# The fixture rows are named "loadtest ..." and are removed afterwards unless
+# --keep is given.
+
+DEADLOCK = 1213
+LOCK_WAIT_TIMEOUT = 1205
+INSUFFICIENT_STOCK = "45000"
+
+
+class CashierStats:
+    def __init__(self):
+        self.latencies = []
+        self.sold = 0
+        self.rejected = 0
+        self.deadlocks = 0
+        self.lock_timeouts = 0
+        self.errors = 0
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+######################### FIXTURE ######################################
+def create_fixture(connection, products, suppliers, stock):
+    # Every product is stocked by every supplier, so sales have to be
+    # allocated across several stock rows
+    with connection.cursor() as cursor:
+        supplier_ids = []
+        for number in range(suppliers):
+            cursor.execute("INSERT INTO supplier (name) VALUES (%s)", (f"loadtest supplier {number}",))
+            supplier_ids.append(cursor.lastrowid)
+        product_ids = []
+        for number in range(products):
+            cursor.execute("INSERT INTO product (name, price) VALUES (%s, %s)", (f"loadtest product {number}", 1))
+            product_ids.append(cursor.lastrowid)
+        per_supplier, extra = divmod(stock, suppliers)
+        cursor.executemany(
+            "INSERT INTO stock (productid, supplierid, quantity, purchasedate) VALUES (%s, %s, %s, CURRENT_DATE() - INTERVAL %s DAY)",
+            [(product_id, supplier_id, per_supplier + (1 if number < extra else 0), number)
+             for product_id in product_ids for number, supplier_id in enumerate(supplier_ids)]
+        )
+        cursor.execute("INSERT INTO customer (name) VALUES ('loadtest customer')")
+        customer_id = cursor.lastrowid
+    connection.commit()
+    return product_ids, supplier_ids, customer_id
+
+
+def remove_fixture(connection, product_ids, supplier_ids, customer_id):
+    with connection.cursor() as cursor:
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        cursor.execute(f"DELETE FROM sale WHERE productid IN ({placeholders})", product_ids)
+        cursor.execute(f"DELETE FROM product WHERE productid IN ({placeholders})", product_ids)
+        placeholders = ", ".join(["%s"] * len(supplier_ids))
+        cursor.execute(f"DELETE FROM supplier WHERE supplierid IN ({placeholders})", supplier_ids)
+        cursor.execute("DELETE FROM customer WHERE customerid = %s", (customer_id,))
+    connection.commit()
+
+
+def count_oversold(connection, product_ids, stock):
+    # Units sold beyond the starting stock, plus any stock row below zero
+    with connection.cursor() as cursor:
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        cursor.execute(
+            f"SELECT productid, COALESCE(SUM(quantity), 0) FROM sale WHERE productid IN ({placeholders}) GROUP BY productid",
+            product_ids
+        )
+        oversold = sum(max(0, int(sold) - stock) for _, sold in cursor.fetchall())
+        cursor.execute(
+            f"SELECT COALESCE(SUM(-quantity), 0) FROM stock WHERE productid IN ({placeholders}) AND quantity < 0",
+            product_ids
+        )
+        oversold += int(cursor.fetchone()[0])
+        connection.commit()
+        return oversold
+
+
+######################### CASHIERS ######################################
+def cashier(config, product_ids, customer_id, args, stats, start, stop):
+    try:
+        connection = mysql.connector.connect(**config)
+    except mysql.connector.Error:
+        # Release everyone waiting at the start line
+        start.abort()
+        raise
+    rng = random.Random()
+    start.wait()
+    try:
+        with connection.cursor() as cursor:
+            while not stop.is_set():
+                lines = [(rng.choice(product_ids), rng.randint(1, args.max_quantity)) for _ in range(args.basket)]
+                began = time.perf_counter()
+                try:
+                    if args.basket == 1:
+                        cursor.callproc("makepurchase", (customer_id, *lines[0]))
+                        connection.commit()
+                        sold = True
+                    else:
+                        items = json.dumps([{"productid": product_id, "quantity": quantity} for product_id, quantity in lines])
+                        cursor.callproc("makeorder", ("loadtest customer", items, 0, 0))
+                        statuses = [row[4] for result in cursor.stored_results() for row in result.fetchall()]
+                        connection.commit()
+                        sold = all(status == "ok" for status in statuses)
+                    if sold:
+                        stats.sold += 1
+                    else:
+                        stats.rejected += 1
+                except mysql.connector.Error as err:
+                    connection.rollback()
+                    if err.errno == DEADLOCK:
+                        stats.deadlocks += 1
+                    elif err.errno == LOCK_WAIT_TIMEOUT:
+                        stats.lock_timeouts += 1
+                    elif err.sqlstate == INSUFFICIENT_STOCK:
+                        stats.rejected += 1
+                    else:
+                        stats.errors += 1
+                stats.latencies.append(time.perf_counter() - began)
+    finally:
+        connection.close()
+
+
+def run(config, args):
+    setup = mysql.connector.connect(**config)
+    product_ids, supplier_ids, customer_id = create_fixture(setup, args.products, args.suppliers, args.stock)
+    try:
+        stats = [CashierStats() for _ in range(args.cashiers)]
+        start = threading.Barrier(args.cashiers + 1)
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=cashier, args=(config, product_ids, customer_id, args, cashier_stats, start, stop))
+            for cashier_stats in stats
+        ]
+        for thread in threads:
+            thread.start()
+        # Everyone starts selling once all the connections are open
+        start.wait()
+        began = time.perf_counter()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        oversold = count_oversold(setup, product_ids, args.stock)
+    finally:
+        if not args.keep:
+            remove_fixture(setup, product_ids, supplier_ids, customer_id)
+        setup.close()
+
+    latencies = [latency for cashier_stats in stats for latency in cashier_stats.latencies]
+    return {
+        "cashiers": args.cashiers,
+        "seconds": round(elapsed, 2),
+        "sales": sum(s.sold for s in stats),
+        "sales_per_sec": round(sum(s.sold for s in stats) / elapsed, 1) if elapsed else 0.0,
+        "rejected": sum(s.rejected for s in stats),
+        "deadlocks": sum(s.deadlocks for s in stats),
+        "lock_timeouts": sum(s.lock_timeouts for s in stats),
+        "errors": sum(s.errors for s in stats),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "oversold": oversold,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent cashier load test for the sale procedures.")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument("--cashiers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to sell for")
+    parser.add_argument("--products", type=int, default=3, help="fewer products means more contention")
+    parser.add_argument("--suppliers", type=int, default=3, help="stock rows per product")
+    parser.add_argument("--stock", type=int, default=1000, help="starting stock per product")
+    parser.add_argument("--max-quantity", type=int, default=3)
+    parser.add_argument("--basket", type=int, default=1, help="lines per sale; above 1 uses makeorder")
+    parser.add_argument("--keep", action="store_true", help="leave the fixture rows in the database")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = run(read_database_config(args.config), args)
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, value in results.items():
+            print(f"{name:>14}: {value}")
@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+
+
+class LookupCache:
+    # In-process LRU cache for name to id lookups. `loader(name)` runs on a
+    # miss and returns the id or None; None is not cached, so a name that does
+    # not exist yet is looked up again once it has been inserted. Writers must
+    # call put/invalidate when they insert, rename or delete rows.
+    def __init__(self, name, loader, maxsize=4096):
+        self.name = name
+        self.loader = loader
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = self.loader(key)
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_value(self, value):
+        # For deletes and renames, where only the id is known
+        with self._lock:
+            for key in [key for key, cached in self._entries.items() if cached == value]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def describe(self):
+        stats = self.stats()
+        return (f"{stats['name']}: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%} hit rate), {stats['size']} cached")
@@ -0,0 +1,56 @@
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableView
+from PyQt6.QtCore import QTimer, pyqtSignal
+from TableModels import StoreTableModel, INT, TEXT, DATE
+
+
+class LowStockTab(QWidget):
+    # The products at or below their reorder level, read from the low_stock
+    # watchlist the stock triggers keep, so the list and its count cost the
+    # same however large the inventory is. The tab's title shows the count;
+    # it is re-read shortly after any product or stock change.
+    message = pyqtSignal(str)
+    count_changed = pyqtSignal(int)
+
+    def __init__(self, service, executor, parent=None):
+        super().__init__(parent)
+        self.service = service
+        self.executor = executor
+
+        self.model = StoreTableModel(
+            ["Product ID", "Product Name", "In Stock", "Reorder Level", "Low Since"],
+            [INT, TEXT, INT, INT, DATE],
+            service.fetch_low_stock_page,
+            executor=executor,
+            parent=self
+        )
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.refresh_button = QPushButton("Refresh")
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Set reorder levels from the product list's right-click menu."))
+        controls.addStretch()
+        controls.addWidget(self.refresh_button)
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+        # Bursts of changes are counted once
+        self.count_timer = QTimer(self)
+        self.count_timer.setSingleShot(True)
+        self.count_timer.setInterval(500)
+        self.count_timer.timeout.connect(self.update_count)
+        self.refresh_button.clicked.connect(self.refresh)
+
+    def refresh(self):
+        self.model.reload()
+        self.update_count()
+
+    def update_count(self):
+        self.executor.submit(
+            self.service.count_low_stock,
+            on_result=self.count_changed.emit,
+            on_error=lambda err: self.message.emit(f"Failed to count the low stock products: {err}"),
+            key=("low_stock", id(self))
+        )
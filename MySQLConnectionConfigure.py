@@ -1,7 +1,8 @@
 from PyQt6.QtWidgets import QApplication, QDialog, QLabel, QLineEdit, QVBoxLayout, QDialogButtonBox, QFormLayout
 from PyQt6.QtCore import QSettings, Qt
-from PyQt6.uic import loadUi
 import mysql.connector
+from ConnectionManager import read_database_config
+from UiCache import load_ui
 
 
 class ConnectionDialog(QDialog):
@@ -10,7 +11,7 @@ class ConnectionDialog(QDialog):
 
         self.settings = QSettings("config.ini", QSettings.Format.IniFormat)
 
-        loadUi("ConnectionDialog.ui", self)
+        load_ui("ConnectionDialog.ui", self)
 
         self.button_box.accepted.connect(self.accept)
         self.button_box.rejected.connect(self.reject)
@@ -40,23 +41,24 @@ class ConnectionDialog(QDialog):
         super().accept()
 
 
-def check_database_connection(username, password, port):
+def open_database_connection(username, password, port):
+    # Host and database come from config.ini, credentials from the dialog.
+    # The open connection is returned so it can be reused by the pool.
+    config = read_database_config()
+    config.update(user=username, password=password, port=int(port or 3306))
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user=username,
-            password=password,
-            port=port,
-            database='storedb'
-        )
-
-        return True
-    except mysql.connector.Error as err:
+        return mysql.connector.connect(**config)
+    except (mysql.connector.Error, ValueError) as err:
         print(f"Error: {err}")
+        return None
+
+
+def check_database_connection(username, password, port):
+    connection = open_database_connection(username, password, port)
+    if connection is None:
         return False
-    finally:
-        if 'connection' in locals():
-            connection.close()
+    connection.close()
+    return True
 
 
 if __name__ == "__main__":
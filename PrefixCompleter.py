@@ -0,0 +1,38 @@
+from PyQt6.QtWidgets import QCompleter
+from PyQt6.QtGui import QStandardItem, QStandardItemModel
+from PyQt6.QtCore import Qt
+from SearchIndex import PrefixIndex
+
+SUGGESTIONS = 12
+
+
+class PrefixCompleter(QCompleter):
+    # Suggestions for an entry field from a PrefixIndex held in memory, so
+    # typing never waits on a query. The popup only ever holds the current
+    # matches: the index does the filtering, not QCompleter. Choosing a
+    # suggestion puts its value into the field, which may differ from the
+    # label shown (a product's id for "name (#id)").
+    def __init__(self, field, limit=SUGGESTIONS, parent=None):
+        super().__init__(parent)
+        self.index = PrefixIndex()
+        self.limit = limit
+        self.suggestions = QStandardItemModel(self)
+        self.setModel(self.suggestions)
+        self.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.setCompletionRole(Qt.ItemDataRole.UserRole)
+        self.setMaxVisibleItems(limit)
+        field.setCompleter(self)
+        field.textEdited.connect(self.suggest)
+
+    def suggest(self, text):
+        self.suggestions.clear()
+        text = text.strip()
+        matches = self.index.complete(text, self.limit) if text else []
+        for label, value in matches:
+            item = QStandardItem(label)
+            item.setData(value, Qt.ItemDataRole.UserRole)
+            self.suggestions.appendRow(item)
+        if matches:
+            self.complete()
+        else:
+            self.popup().hide()
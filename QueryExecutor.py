@@ -0,0 +1,111 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class QueryJob(QRunnable):
+    def __init__(self, executor, fn, args, on_result, on_error, key, generation, traced=True):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.executor = executor
+        self.fn = fn
+        self.args = args
+        self.on_result = on_result
+        self.on_error = on_error
+        self.key = key
+        self.generation = generation
+        self.traced = traced
+
+    def run(self):
+        try:
+            instrumentation = self.executor.instrumentation
+            if instrumentation is None or not self.traced:
+                result = self.fn(*self.args)
+            else:
+                with instrumentation.action(getattr(self.fn, "__name__", "query")):
+                    result = self.fn(*self.args)
+        except Exception as err:
+            self.executor.job_done.emit(self, None, err)
+        else:
+            self.executor.job_done.emit(self, result, None)
+
+
+class QueryExecutor(QObject):
+    # Runs database work off the GUI thread. Jobs run one at a time, in order,
+    # on a dedicated thread that is the only user of the window's session
+    # connection. The session runs in autocommit and every write commits its
+    # own unit of work before its job ends, so no job ever starts inside
+    # another job's transaction.
+    # Results and errors are delivered back on the GUI thread via signals.
+    #
+    # A job submitted with a key replaces a queued job with the same key, and
+    # the result of an already running one is dropped, so repeated reloads of
+    # the same table collapse into the most recent request. Untraced jobs,
+    # such as background polls, stay out of the query log and diagnostics.
+    job_done = pyqtSignal(object, object, object)
+    busy_changed = pyqtSignal(bool)
+    failed = pyqtSignal(str)
+
+    def __init__(self, parent=None, threads=1, instrumentation=None):
+        super().__init__(parent)
+        # Each job is traced as one action when instrumentation is given
+        self.instrumentation = instrumentation
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(threads)
+        self.pool.setExpiryTimeout(-1)
+        self.generations = {}
+        self.queued = {}
+        self.pending = set()
+        self.job_done.connect(self.deliver)
+
+    def submit(self, fn, *args, on_result=None, on_error=None, key=None, traced=True):
+        generation = None
+        if key is not None:
+            generation = self.generations.get(key, 0) + 1
+            self.generations[key] = generation
+            queued = self.queued.pop(key, None)
+            if queued is not None and self.pool.tryTake(queued):
+                self.pending.discard(queued)
+
+        job = QueryJob(self, fn, args, on_result, on_error, key, generation, traced)
+        if key is not None:
+            self.queued[key] = job
+        self.pending.add(job)
+        if len(self.pending) == 1:
+            self.busy_changed.emit(True)
+        self.pool.start(job)
+        return job
+
+    def cancel(self, key):
+        # Drops queued and running work for key without replacing it
+        self.generations[key] = self.generations.get(key, 0) + 1
+        queued = self.queued.pop(key, None)
+        if queued is not None and self.pool.tryTake(queued):
+            self.discard(queued)
+
+    def deliver(self, job, result, error):
+        self.discard(job)
+        if job.key is not None:
+            if self.queued.get(job.key) is job:
+                del self.queued[job.key]
+            if self.generations.get(job.key) != job.generation:
+                return
+
+        if error is not None:
+            if job.on_error is not None:
+                job.on_error(error)
+            else:
+                self.failed.emit(str(error))
+        elif job.on_result is not None:
+            job.on_result(result)
+
+    def discard(self, job):
+        if job in self.pending:
+            self.pending.discard(job)
+            if not self.pending:
+                self.busy_changed.emit(False)
+
+    def is_busy(self):
+        return bool(self.pending)
+
+    def shutdown(self):
+        self.pool.clear()
+        self.pool.waitForDone()
@@ -0,0 +1,205 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+LOG_FILE = "queries.log"
+SLOW_QUERY_MS = 100
+
+
+def _compact(statement, limit=500):
+    text = " ".join(str(statement).split())
+    return text if len(text) <= limit else text[:limit] + " ..."
+
+
+class StatementRecord:
+    def __init__(self, text, mode=None):
+        self.text = text
+        # "prepare" or "execute" for prepared statements, None for plain text
+        self.mode = mode
+        self.elapsed = 0.0
+        # Part of elapsed spent fetching and decoding the rows
+        self.fetch_elapsed = 0.0
+        self.rows = 0
+
+    @property
+    def ms(self):
+        return self.elapsed * 1000
+
+    @property
+    def fetch_ms(self):
+        return self.fetch_elapsed * 1000
+
+
+class ActionTrace:
+    # Everything one action (one executor job) sent to the database
+    def __init__(self, label):
+        self.label = label
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.statements = []
+        self.error = None
+
+    @property
+    def ms(self):
+        return self.elapsed * 1000
+
+    @property
+    def round_trips(self):
+        return len(self.statements)
+
+    @property
+    def rows(self):
+        return sum(statement.rows for statement in self.statements)
+
+    @property
+    def database_ms(self):
+        return sum(statement.ms for statement in self.statements)
+
+
+class InstrumentedCursor:
+    # Times execute/callproc and the fetches that follow them. Parameters are
+    # not recorded, so customer names and the like stay out of the log. A
+    # prepared cursor's statements are marked as prepared on their first run
+    # and executed by handle after that.
+    def __init__(self, cursor, instrumentation, prepared=False):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+        self._prepared = prepared
+        self._last_operation = None
+        self._record = None
+
+    def _run(self, text, call, *args, mode=None):
+        self._record = self._instrumentation.statement(text, mode)
+        started = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            self._record.elapsed += time.perf_counter() - started
+            self._record.rows = max(self._cursor.rowcount, 0)
+
+    def _fetch(self, call, *args):
+        started = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            if self._record is not None:
+                self._record.elapsed += time.perf_counter() - started
+                self._record.fetch_elapsed += time.perf_counter() - started
+                self._record.rows = max(self._cursor.rowcount, 0)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        mode = None
+        if self._prepared:
+            # Prepared cursors keep their statement for the same string object
+            mode = "execute" if operation is self._last_operation else "prepare"
+            self._last_operation = operation
+        return self._run(_compact(operation), self._cursor.execute, operation, params, *args, mode=mode, **kwargs)
+
+    def executemany(self, operation, seq_params):
+        return self._run(_compact(operation), self._cursor.executemany, operation, seq_params)
+
+    def callproc(self, procname, args=()):
+        return self._run(f"CALL {procname}", self._cursor.callproc, procname, args)
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class QueryInstrumentation:
+    # Records the statements each action sends: text, rows, wall time and
+    # round trips. Finished actions go to a rotating log file, to a short
+    # in-memory history and to listeners such as the diagnostics panel.
+    def __init__(self, log_path=LOG_FILE, slow_ms=SLOW_QUERY_MS, history=200, max_bytes=1 << 20, backups=3):
+        self.slow_ms = slow_ms
+        self.history = deque(maxlen=history)
+        self.listeners = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.logger = logging.getLogger("storems.queries")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if log_path and not self.logger.handlers:
+            try:
+                handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            except OSError:
+                handler = None
+            if handler is not None:
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                self.logger.addHandler(handler)
+
+    def wrap(self, cursor, prepared=False):
+        return InstrumentedCursor(cursor, self, prepared)
+
+    @contextmanager
+    def action(self, label):
+        if getattr(self._local, "trace", None) is not None:
+            # Nested actions count towards the outer one
+            yield self._local.trace
+            return
+        trace = ActionTrace(label)
+        self._local.trace = trace
+        started = time.perf_counter()
+        try:
+            yield trace
+        except Exception as err:
+            trace.error = str(err)
+            raise
+        finally:
+            trace.elapsed = time.perf_counter() - started
+            self._local.trace = None
+            self.finish(trace)
+
+    def statement(self, text, mode=None):
+        # Statements made outside an action are timed but not kept
+        record = StatementRecord(text, mode)
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.statements.append(record)
+        return record
+
+    def is_slow(self, record):
+        return record.ms >= self.slow_ms
+
+    def finish(self, trace):
+        if not trace.statements:
+            # Answered without the database, from a cache for instance
+            return
+        with self._lock:
+            self.history.append(trace)
+        self.log(trace)
+        for listener in list(self.listeners):
+            listener(trace)
+
+    def log(self, trace):
+        status = f" error={trace.error!r}" if trace.error else ""
+        self.logger.info(
+            f"action={trace.label} round_trips={trace.round_trips} rows={trace.rows} "
+            f"ms={trace.ms:.1f} db_ms={trace.database_ms:.1f}{status}"
+        )
+        for record in trace.statements:
+            marker = "SLOW " if self.is_slow(record) else ""
+            mode = f" {record.mode}" if record.mode else ""
+            self.logger.info(f"    {marker}{record.ms:.1f}ms fetch={record.fetch_ms:.1f}ms rows={record.rows}{mode} "
+                             f"{record.text}")
@@ -0,0 +1,75 @@
+class _ViewState:
+    def __init__(self, model, fetch_rows, page):
+        self.model = model
+        self.fetch_rows = fetch_rows
+        self.page = page
+        self.pending_keys = set()
+        self.needs_reload = False
+        self.subscribers = []
+
+
+class RefreshEngine:
+    # Keeps the table models in step with the database after a mutation without
+    # re-running the full load queries. Mutations report the primary keys they
+    # touched; the engine re-reads just those rows and patches them into the
+    # model. Views on a tab that is not showing only collect the keys (a dirty
+    # flag) and are patched when their tab is opened.
+    def __init__(self, tab_widget, executor=None):
+        self.tab_widget = tab_widget
+        self.executor = executor
+        self.views = {}
+        self.tab_widget.currentChanged.connect(self.flush_visible)
+
+    def register(self, name, model, fetch_rows, page):
+        # fetch_rows(keys) returns the current rows for the given group keys
+        self.views[name] = _ViewState(model, fetch_rows, page)
+
+    def subscribe(self, name, callback):
+        # callback(keys) after each touch of the view, callback(None) after
+        # each invalidate, for views derived from this one
+        self.views[name].subscribers.append(callback)
+
+    def touch(self, name, keys):
+        state = self.views[name]
+        keys = [key for key in keys if key is not None]
+        state.pending_keys.update(keys)
+        self.flush_if_visible(state)
+        for callback in state.subscribers:
+            callback(keys)
+
+    def invalidate(self, name):
+        # For changes whose keys are unknown; the view is reloaded in full
+        state = self.views[name]
+        state.needs_reload = True
+        state.pending_keys.clear()
+        self.flush_if_visible(state)
+        for callback in state.subscribers:
+            callback(None)
+
+    def invalidate_all(self):
+        for name in self.views:
+            self.invalidate(name)
+
+    def flush_if_visible(self, state):
+        if self.tab_widget.currentWidget() is state.page:
+            self.flush(state)
+
+    def flush_visible(self, *args):
+        for state in self.views.values():
+            self.flush_if_visible(state)
+
+    def flush(self, state):
+        if state.needs_reload:
+            state.needs_reload = False
+            state.pending_keys.clear()
+            state.model.reload()
+        elif state.pending_keys:
+            keys = sorted(state.pending_keys)
+            state.pending_keys.clear()
+            if self.executor is None:
+                state.model.patch_groups(keys, state.fetch_rows(keys))
+            else:
+                self.executor.submit(
+                    state.fetch_rows, keys,
+                    on_result=lambda rows: state.model.patch_groups(keys, rows)
+                )
@@ -0,0 +1,113 @@
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QDateEdit, QPushButton,
+                             QTableView, QMessageBox)
+from PyQt6.QtCore import QDate, pyqtSignal
+from TableModels import StoreTableModel, INT, MONEY, DATE, TEXT
+
+
+class ReportsTab(QWidget):
+    # Sales reports read from the summary tables the sale triggers maintain,
+    # so each page costs the same however long the sales history grows. The
+    # summaries change with every sale; the report reloads whenever the tab
+    # is opened or the dates change.
+    message = pyqtSignal(str)
+
+    def __init__(self, service, executor, parent=None):
+        super().__init__(parent)
+        self.service = service
+        self.executor = executor
+        # Read on the executor's thread by the daily report, so kept as plain
+        # dates rather than read from the date fields there
+        self.date_range = (QDate.currentDate().addDays(-30).toPyDate(), QDate.currentDate().toPyDate())
+
+        self.models = {
+            "Revenue by day": StoreTableModel(
+                ["Date", "Sales", "Units", "Revenue"],
+                [DATE, INT, INT, MONEY],
+                lambda after_key, limit: self.service.fetch_daily_summary_page(after_key, limit, *self.date_range),
+                executor=executor,
+                parent=self
+            ),
+            "Top products": StoreTableModel(
+                ["Product ID", "Product Name", "Sales", "Units", "Revenue"],
+                [INT, TEXT, INT, INT, MONEY],
+                service.fetch_product_summary_page,
+                key_columns=(4, 0),
+                executor=executor,
+                parent=self
+            ),
+            "Top customers": StoreTableModel(
+                ["Customer ID", "Customer Name", "Sales", "Units", "Revenue"],
+                [INT, TEXT, INT, INT, MONEY],
+                service.fetch_customer_summary_page,
+                key_columns=(4, 0),
+                executor=executor,
+                parent=self
+            ),
+        }
+
+        self.report = QComboBox()
+        self.report.addItems(self.models)
+        self.date_from = QDateEdit(QDate.currentDate().addDays(-30))
+        self.date_to = QDateEdit(QDate.currentDate())
+        for field in (self.date_from, self.date_to):
+            field.setCalendarPopup(True)
+            field.setDisplayFormat("yyyy-MM-dd")
+        self.refresh_button = QPushButton("Refresh")
+        self.rebuild_button = QPushButton("Rebuild summaries")
+        self.totals_label = QLabel()
+        self.table = QTableView()
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Report:"))
+        controls.addWidget(self.report)
+        controls.addWidget(QLabel("From:"))
+        controls.addWidget(self.date_from)
+        controls.addWidget(QLabel("To:"))
+        controls.addWidget(self.date_to)
+        controls.addWidget(self.refresh_button)
+        controls.addStretch()
+        controls.addWidget(self.rebuild_button)
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.totals_label)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+        self.report.currentTextChanged.connect(self.refresh)
+        self.date_from.dateChanged.connect(self.refresh)
+        self.date_to.dateChanged.connect(self.refresh)
+        self.refresh_button.clicked.connect(self.refresh)
+        self.rebuild_button.clicked.connect(self.rebuild)
+
+    def refresh(self, *args):
+        self.date_range = (self.date_from.date().toPyDate(), self.date_to.date().toPyDate())
+        model = self.models[self.report.currentText()]
+        if self.table.model() is not model:
+            self.table.setModel(model)
+        model.reload()
+        self.executor.submit(
+            self.service.summary_totals, *self.date_range,
+            on_result=self.show_totals,
+            on_error=lambda err: self.message.emit(f"Failed to load the report totals: {err}"),
+            key=("totals", id(self))
+        )
+
+    def show_totals(self, totals):
+        sales, units, revenue = totals
+        date_from, date_to = self.date_range
+        self.totals_label.setText(f"{date_from} to {date_to}: {sales} sales, {units} units, revenue {revenue}")
+
+    def rebuild(self):
+        reply = QMessageBox.question(self, "Rebuild summaries",
+                                     "Recompute the sales summaries from every sale? Sales wait until it finishes.",
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            self.executor.submit(
+                self.service.rebuild_summaries,
+                on_result=self.rebuilt,
+                on_error=lambda err: self.message.emit(f"Failed to rebuild the summaries: {err}")
+            )
+
+    def rebuilt(self, _):
+        self.message.emit("Sales summaries rebuilt.")
+        self.refresh()
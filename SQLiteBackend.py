@@ -0,0 +1,421 @@
+import json
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from itertools import count
+import mysql.connector
+
+# Embedded backend for single-terminal stores: the whole store lives in one
+# SQLite file next to the app, in WAL mode, with no server to run. The
+# connection below speaks the part of the mysql.connector interface the rest
+# of the code uses (cursors, callproc, transactions, error classes) and
+# translates the MySQL dialect of its statements, so StoreService, the undo
+# journal, imports and exports run unchanged on either backend.
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "StoreDB.sqlite.sql")
+BUSY_TIMEOUT_MS = 5000
+CENT = Decimal("0.01")
+STOCK_MESSAGE = "Product is not available in sufficient quantity. Transaction rolled back."
+# CONNECTION_ID() numbers, unique across the processes sharing one file
+_connection_ids = count((os.getpid() % 100000) * 100000 + 1)
+
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter("date", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("decimal", lambda value: Decimal(value.decode()).quantize(CENT))
+
+
+def connect(path):
+    # Opens (and on first use creates) the store in the file at `path`
+    connection = SQLiteConnection(path)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'sale'")
+        if not cursor.fetchone()[0]:
+            with open(SCHEMA_FILE, encoding="utf-8") as stream:
+                connection.raw.executescript(stream.read())
+    return connection
+
+
+def fulltext_match(text, expression):
+    # MATCH ... AGAINST in boolean mode for the "+word* +word*" expressions
+    # sales_search_condition builds: every word must start a word of text
+    if text is None:
+        return False
+    words = re.findall(r"\w+", text.lower())
+    return all(any(word.startswith(term) for word in words) for term in re.findall(r"\w+", expression.lower()))
+
+
+@lru_cache(maxsize=512)
+def translate(statement):
+    # MySQL dialect to SQLite, for the statements this code base sends
+    statement = re.sub(r"MATCH\s*\((\w+)\)\s*AGAINST\s*\(%s IN BOOLEAN MODE\)", r"fulltext_match(\1, %s)",
+                       statement, flags=re.IGNORECASE)
+    statement = re.sub(r"\s+FOR UPDATE(\s+OF\s+\w+)?", "", statement, flags=re.IGNORECASE)
+    statement = re.sub(r"CURRENT_DATE\(\)", "date('now', 'localtime')", statement, flags=re.IGNORECASE)
+    statement = re.sub(r"LAST_INSERT_ID\(\)", "last_insert_rowid()", statement, flags=re.IGNORECASE)
+    statement = re.sub(r"ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET", statement, flags=re.IGNORECASE)
+    statement = re.sub(r"\bVALUES\((\w+)\)", r"excluded.\1", statement, flags=re.IGNORECASE)
+    return statement.replace("%s", "?")
+
+
+def _money(value):
+    # Computed decimal columns come back from SQLite as floats
+    return Decimal(repr(value)).quantize(CENT) if type(value) is float else value
+
+
+def _row(row):
+    return None if row is None else tuple(_money(value) for value in row)
+
+
+@contextmanager
+def mysql_errors():
+    # Raised as the mysql.connector errors the callers already handle
+    try:
+        yield
+    except sqlite3.IntegrityError as err:
+        if str(err) == STOCK_MESSAGE:
+            raise mysql.connector.errors.DatabaseError(msg=str(err), errno=1644, sqlstate="45000") from err
+        raise mysql.connector.errors.IntegrityError(msg=str(err)) from err
+    except sqlite3.OperationalError as err:
+        raise mysql.connector.errors.OperationalError(msg=str(err)) from err
+    except sqlite3.Error as err:
+        raise mysql.connector.errors.DatabaseError(msg=str(err)) from err
+
+
+class StoredResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class SQLiteCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.raw.cursor()
+        self.results = []
+        self.lastrowid = None
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def execute(self, operation, params=None):
+        call = re.match(r"\s*CALL\s+(\w+)\s*\((.*)\)\s*$", operation, re.IGNORECASE | re.DOTALL)
+        if call:
+            return self.callproc(call.group(1), params or ())
+        if re.match(r"\s*SET\s", operation, re.IGNORECASE):
+            # @variables are kept for session_variable(); server settings
+            # such as timeouts have no SQLite counterpart
+            self.connection.set_variables(operation)
+            return None
+        with mysql_errors():
+            self.connection.begin_implicit(operation)
+            self.cursor.execute(translate(operation), tuple(params or ()))
+        self.lastrowid = self.cursor.lastrowid
+        if self.cursor.rowcount > 1 and re.match(r"\s*INSERT", operation, re.IGNORECASE):
+            # MySQL reports the first id of a multi-row insert
+            self.lastrowid = self.cursor.lastrowid - self.cursor.rowcount + 1
+        return None
+
+    def executemany(self, operation, seq_params):
+        with mysql_errors():
+            self.connection.begin_implicit(operation)
+            self.cursor.executemany(translate(operation), [tuple(params) for params in seq_params])
+
+    def callproc(self, procname, args=()):
+        # Each procedure is atomic, like a statement, inside or outside the
+        # caller's transaction
+        procedure = PROCEDURES.get(procname)
+        if procedure is None:
+            raise mysql.connector.errors.ProgrammingError(msg=f"PROCEDURE {procname} does not exist")
+        with mysql_errors():
+            self.connection.begin_implicit("CALL")
+            if not self.connection.in_transaction:
+                # Autocommit: the call is its own transaction
+                self.connection.start_transaction()
+                try:
+                    result, self.results = procedure(self, *args)
+                except BaseException:
+                    self.connection.rollback()
+                    raise
+                self.connection.commit()
+                return result
+
+            self.cursor.execute("SAVEPOINT procedure_call")
+            try:
+                result, self.results = procedure(self, *args)
+            except BaseException:
+                self.cursor.execute("ROLLBACK TO SAVEPOINT procedure_call")
+                self.cursor.execute("RELEASE SAVEPOINT procedure_call")
+                raise
+            self.cursor.execute("RELEASE SAVEPOINT procedure_call")
+            return result
+
+    def stored_results(self):
+        return iter(self.results)
+
+    def fetchone(self):
+        with mysql_errors():
+            return _row(self.cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        with mysql_errors():
+            return [_row(row) for row in self.cursor.fetchmany(size)]
+
+    def fetchall(self):
+        with mysql_errors():
+            return [_row(row) for row in self.cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self.cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SQLiteConnection:
+    # Lets tools skip MySQL-only DDL such as partitioning
+    backend = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        # Transactions are begun explicitly, as MySQL would begin them
+        self.raw = sqlite3.connect(path, isolation_level=None, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+        self.raw.create_function("fulltext_match", 2, fulltext_match, deterministic=True)
+        # Stamped on the change log, so a terminal can skip its own changes
+        self.connection_id = next(_connection_ids)
+        self.raw.create_function("connection_id", 0, lambda: self.connection_id)
+        # @variables SET on this connection, read by the triggers that MySQL
+        # lets a session skip
+        self.variables = {}
+        self.raw.create_function("session_variable", 1, self.variables.get)
+        self.raw.execute("PRAGMA journal_mode = WAL")
+        # WAL makes NORMAL durable across application crashes
+        self.raw.execute("PRAGMA synchronous = NORMAL")
+        self.raw.execute("PRAGMA foreign_keys = ON")
+        self.raw.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        self.autocommit = False
+        self.closed = False
+
+    def cursor(self, buffered=None, **kwargs):
+        # Every SQLite cursor streams its rows; buffered makes no difference
+        return SQLiteCursor(self)
+
+    def set_variables(self, statement):
+        # SET @name = value, ... with literal numbers, strings or NULL
+        for name, value in re.findall(r"@(\w+)\s*=\s*('[^']*'|[^,\s]+)", statement):
+            if value.upper() == "NULL":
+                self.variables.pop(name, None)
+            elif value.startswith("'"):
+                self.variables[name] = value[1:-1]
+            else:
+                self.variables[name] = int(value)
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    def begin_implicit(self, operation):
+        # Without autocommit MySQL opens a transaction on the first statement.
+        # Here only writes open one, and IMMEDIATE takes the write lock up
+        # front, so a reader never has to upgrade (and fail) halfway through.
+        if not self.autocommit and not self.raw.in_transaction and not re.match(r"\s*SELECT", operation,
+                                                                                re.IGNORECASE):
+            self.raw.execute("BEGIN IMMEDIATE")
+
+    def start_transaction(self):
+        with mysql_errors():
+            self.raw.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        with mysql_errors():
+            self.raw.commit()
+
+    def rollback(self):
+        with mysql_errors():
+            self.raw.rollback()
+
+    def is_connected(self):
+        return not self.closed
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        # Nothing to reconnect to
+        pass
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        self.closed = True
+        self.raw.close()
+
+
+######################### PROCEDURES ######################################
+# The stored procedures of StoreDB.sql. Each returns the arguments (with OUT
+# parameters filled in) and the result sets, as callproc does for MySQL.
+def makepurchase(cursor, customer_id, product_id, quantity):
+    # The after_sale trigger checks and takes the stock
+    cursor.execute(
+        "INSERT INTO sale (productid, customerid, quantity, saledate) VALUES (%s, %s, %s, CURRENT_DATE())",
+        (product_id, customer_id, quantity)
+    )
+    return (customer_id, product_id, quantity), []
+
+
+def updatesale(cursor, customer_id, product_id, quantity, sale_id):
+    cursor.execute(
+        "UPDATE sale SET customerid = %s, productid = %s, quantity = %s WHERE saleid = %s",
+        (customer_id, product_id, quantity, sale_id)
+    )
+    return (customer_id, product_id, quantity, sale_id), []
+
+
+def release_stock(cursor, sale_id):
+    # Hands back the stock the sale holds, to the rows it was taken from
+    cursor.execute(
+        "UPDATE stock SET quantity = stock.quantity + sale_allocation.quantity FROM sale_allocation"
+        " WHERE sale_allocation.saleid = %s AND stock.productid = sale_allocation.productid"
+        " AND stock.supplierid = sale_allocation.supplierid",
+        (sale_id,)
+    )
+    cursor.execute("DELETE FROM sale_allocation WHERE saleid = %s", (sale_id,))
+    return (sale_id,), []
+
+
+def restore_sales(cursor, sales, allocations):
+    # Puts sales back as they were before an edit or a delete. A sale still
+    # there hands back what it holds and takes its old allocation again; a
+    # deleted sale kept its stock, so only its allocation is recorded.
+    rows = json.loads(sales)
+    taken = json.loads(allocations)
+    ids = ", ".join(["%s"] * len(rows))
+    sale_ids = [row[0] for row in rows]
+    cursor.execute(f"SELECT saleid FROM sale WHERE saleid IN ({ids})", sale_ids)
+    edited = {row[0] for row in cursor.fetchall()}
+    for sale_id in edited:
+        release_stock(cursor, sale_id)
+    for sale_id, product_id, supplier_id, quantity in taken:
+        if sale_id in edited:
+            cursor.execute(
+                "UPDATE stock SET quantity = quantity - %s WHERE productid = %s AND supplierid = %s",
+                (quantity, product_id, supplier_id)
+            )
+
+    cursor.connection.variables["skip_stock_triggers"] = 1
+    try:
+        cursor.execute(
+            "INSERT INTO sale (saleid, productid, customerid, quantity, unitprice, saledate) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows))
+            + " ON CONFLICT (saleid) DO UPDATE SET customerid = excluded.customerid, productid = excluded.productid,"
+            " quantity = excluded.quantity, unitprice = excluded.unitprice, saledate = excluded.saledate",
+            [value for row in rows for value in row]
+        )
+    finally:
+        cursor.connection.variables.pop("skip_stock_triggers", None)
+    if taken:
+        cursor.execute(
+            "INSERT INTO sale_allocation (saleid, productid, supplierid, quantity) VALUES "
+            + ", ".join(["(%s, %s, %s, %s)"] * len(taken)),
+            [value for row in taken for value in row]
+        )
+    return (sales, allocations), []
+
+
+def makeorder(cursor, customer, items, customer_id=None, added=None):
+    # Every line is checked before anything is written: either all lines are
+    # sold or none are, and the customer is only added with a sale
+    lines = [(line, item.get("productid"), item.get("quantity")) for line, item in enumerate(json.loads(items), 1)]
+    requested = {}
+    for _, product_id, quantity in lines:
+        requested[product_id] = requested.get(product_id, 0) + (quantity or 0)
+
+    statuses = []
+    for line, product_id, quantity in lines:
+        cursor.execute("SELECT COUNT(*) FROM product WHERE productid = %s", (product_id,))
+        known = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(SUM(quantity), 0) FROM stock WHERE productid = %s", (product_id,))
+        available = cursor.fetchone()[0]
+        if quantity is None or quantity <= 0:
+            status = "invalid quantity"
+        elif not known:
+            status = "unknown product"
+        elif requested[product_id] > available:
+            status = "insufficient stock"
+        else:
+            status = "ok"
+        statuses.append([line, product_id, quantity, available, status, None])
+
+    cursor.execute("SELECT customerid FROM customer WHERE name = %s LIMIT 1", (customer,))
+    found = cursor.fetchone()
+    customer_id = found[0] if found else None
+    added = 0
+    if all(row[4] == "ok" for row in statuses):
+        if customer_id is None:
+            cursor.execute("INSERT INTO customer (name) VALUES (%s)", (customer,))
+            customer_id = cursor.lastrowid
+            added = 1
+        for row in statuses:
+            cursor.execute(
+                "INSERT INTO sale (productid, customerid, quantity, saledate) VALUES (%s, %s, %s, CURRENT_DATE())",
+                (row[1], customer_id, row[2])
+            )
+            row[5] = cursor.lastrowid
+    return (customer, items, customer_id, added), [StoredResult([tuple(row) for row in statuses])]
+
+
+def rebuild_summaries(cursor):
+    for table, key in (("sales_daily", "saledate"), ("sales_by_product", "productid"),
+                       ("sales_by_customer", "customerid")):
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(
+            f"INSERT INTO {table} ({key}, sales, units, revenue)"
+            f" SELECT {key}, COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(quantity * unitprice), 0)"
+            f" FROM (SELECT {key}, quantity, unitprice FROM sale"
+            f" UNION ALL SELECT {key}, quantity, unitprice FROM sale_archive)"
+            f" WHERE {key} IS NOT NULL GROUP BY {key}"
+        )
+    return (), []
+
+
+def archive_sales(cursor, before, batch, moved=None):
+    # Moves up to batch of the oldest sales dated before `before` into
+    # sale_archive, without taking them out of the summaries
+    cursor.execute("SELECT saleid FROM sale WHERE saledate < %s ORDER BY saledate, saleid LIMIT %s", (before, batch))
+    sale_ids = [row[0] for row in cursor.fetchall()]
+    if sale_ids:
+        ids = ", ".join(["%s"] * len(sale_ids))
+        cursor.execute(
+            "INSERT INTO sale_archive (saleid, productid, customerid, quantity, unitprice, saledate)"
+            f" SELECT saleid, productid, customerid, quantity, unitprice, saledate FROM sale WHERE saleid IN ({ids})",
+            sale_ids
+        )
+        cursor.connection.variables["skip_summary_triggers"] = 1
+        try:
+            cursor.execute(f"DELETE FROM sale WHERE saleid IN ({ids})", sale_ids)
+        finally:
+            cursor.connection.variables.pop("skip_summary_triggers", None)
+    return (before, batch, len(sale_ids)), []
+
+
+PROCEDURES = {
+    "makepurchase": makepurchase,
+    "updatesale": updatesale,
+    "release_stock": release_stock,
+    "restore_sales": restore_sales,
+    "makeorder": makeorder,
+    "rebuild_summaries": rebuild_summaries,
+    "archive_sales": archive_sales,
+}
@@ -0,0 +1,116 @@
+import argparse
+import re
+import time
+from datetime import date
+
+BATCH_SIZE = 5000
+PARTITION_NAME = re.compile(r"p(\d{4})$")
+
+
+class ArchiveReport:
+    def __init__(self, before):
+        self.before = before
+        self.rows = 0
+        self.batches = 0
+        self.partitions = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        added = f", added partitions {', '.join(self.partitions)}" if self.partitions else ""
+        return (f"Archived {self.rows} sales dated before {self.before} in {self.batches} batches, "
+                f"{self.elapsed:.2f}s ({self.rows_per_sec:,.0f} rows/sec){added}.")
+
+
+def default_cutoff(today=None):
+    # Everything before the current year counts as a closed period
+    today = today or date.today()
+    return date(today.year, 1, 1)
+
+
+def ensure_partitions(connection, before):
+    # Splits a yearly partition off p_future for every year with sales to
+    # archive that has none yet. Only the empty p_future is reorganized, so
+    # no archived rows are copied. The names of the partitions added are
+    # returned. SQLite has no partitions.
+    if getattr(connection, "backend", "mysql") == "sqlite":
+        return []
+    cursor = connection.cursor(buffered=True)
+    try:
+        cursor.execute("SELECT YEAR(MIN(saledate)) FROM sale WHERE saledate < %s", (before,))
+        first_year = cursor.fetchone()[0]
+        if first_year is None:
+            return []
+        cursor.execute(
+            "SELECT partition_name FROM information_schema.partitions"
+            " WHERE table_schema = DATABASE() AND table_name = 'sale_archive'"
+        )
+        years = [int(match.group(1)) for (name,) in cursor.fetchall()
+                 if name and (match := PARTITION_NAME.match(name))]
+        # A partition per year up to the one `before` falls in
+        last_year = before.year if before > date(before.year, 1, 1) else before.year - 1
+        first_year = max(first_year, max(years) + 1) if years else first_year
+        added = [f"p{year}" for year in range(first_year, last_year + 1)]
+        if added:
+            ranges = ", ".join(f"PARTITION p{year} VALUES LESS THAN ('{year + 1}-01-01')"
+                               for year in range(first_year, last_year + 1))
+            cursor.execute(f"ALTER TABLE sale_archive REORGANIZE PARTITION p_future INTO "
+                           f"({ranges}, PARTITION p_future VALUES LESS THAN (MAXVALUE))")
+        return added
+    finally:
+        cursor.close()
+
+
+def archive_sales(connection, before=None, batch_size=BATCH_SIZE, progress=None):
+    # Moves the sales dated before `before` into sale_archive, oldest first,
+    # batch_size rows per transaction, so locks are held briefly and the
+    # till keeps selling while a year is archived. The summaries already
+    # count the archived sales and are left as they are. Stopping part way
+    # loses nothing: running again carries on with the sales still left.
+    before = before or default_cutoff()
+    report = ArchiveReport(before)
+    report.partitions = ensure_partitions(connection, before)
+
+    cursor = connection.cursor()
+    try:
+        while True:
+            try:
+                _, _, moved = cursor.callproc("archive_sales", (before, batch_size, 0))
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            if not moved:
+                break
+            report.rows += moved
+            report.batches += 1
+            report.elapsed = time.perf_counter() - report.started
+            if progress is not None:
+                progress(report)
+    finally:
+        cursor.close()
+
+    report.elapsed = time.perf_counter() - report.started
+    return report
+
+
+if __name__ == "__main__":
+    from ConnectionManager import read_database_config, connect_database
+
+    parser = argparse.ArgumentParser(description="Move the sales of closed periods into sale_archive.")
+    parser.add_argument("--before", type=date.fromisoformat,
+                        help="archive sales dated before this day (default: January 1 of this year)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    connection = connect_database(read_database_config())
+    try:
+        report = archive_sales(connection, args.before, args.batch_size,
+                               progress=lambda r: print(f"{r.rows} sales, {r.rows_per_sec:,.0f} rows/sec"))
+    finally:
+        connection.close()
+    print(report.summary())
@@ -0,0 +1,131 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+# Separates the column texts of a row so a match never spans two columns
+COLUMN_SEPARATOR = "\x1f"
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    # Lowercase trigram index over table rows, keyed by the row's primary key.
+    # A query is answered by intersecting the posting sets of its trigrams and
+    # confirming the substring on the few rows left, instead of reading every
+    # cell of every row. When a query only extends the previous one, the search
+    # starts from the previous matches.
+    def __init__(self):
+        self.texts = {}
+        self.postings = defaultdict(set)
+        self.query = ""
+        self.matches = None
+
+    def clear(self):
+        # The active query survives a reload and is matched as rows come back
+        self.texts.clear()
+        self.postings.clear()
+        self.matches = set() if self.query else None
+
+    def add(self, key, values):
+        if key in self.texts:
+            self.remove(key)
+        text = COLUMN_SEPARATOR.join("" if value is None else str(value) for value in values).lower()
+        self.texts[key] = text
+        for gram in trigrams(text):
+            self.postings[gram].add(key)
+        # Keep an active search current as rows arrive or are patched
+        if self.matches is not None and self.query in text:
+            self.matches.add(key)
+
+    def remove(self, key):
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del self.postings[gram]
+        if self.matches is not None:
+            self.matches.discard(key)
+
+    def search(self, query):
+        # Returns the set of matching keys, or None when every row matches
+        query = query.lower()
+        if not query:
+            self.query = ""
+            self.matches = None
+            return None
+
+        if self.matches is not None and self.query and self.query in query:
+            candidates = self.matches
+        else:
+            grams = trigrams(query)
+            if grams:
+                postings = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                # One or two characters have no trigram to look up
+                candidates = self.texts.keys()
+
+        texts = self.texts
+        self.matches = {key for key in candidates if query in texts[key]}
+        self.query = query
+        return self.matches
+
+
+class PrefixIndex:
+    # Case-insensitive prefix lookup for the entry field completers: the
+    # folded search texts sit in one sorted list, with (key, label, value)
+    # entries in a parallel list, so a prefix is found by binary search and
+    # its matches are the run of texts that follows. A key may have several
+    # texts, such as a product's name and its id.
+    def __init__(self):
+        self.texts = []
+        self.entries = []
+        self.keys = {}
+
+    def load(self, rows):
+        # rows of (key, text, label, value); replaces the whole index
+        rows = sorted((text.casefold(), (key, label, value)) for key, text, label, value in rows)
+        self.texts = [text for text, _ in rows]
+        self.entries = [entry for _, entry in rows]
+        self.keys = {}
+        for text, (key, _, _) in rows:
+            self.keys.setdefault(key, []).append(text)
+
+    def add(self, key, text, label, value):
+        text = text.casefold()
+        position = bisect_left(self.texts, text)
+        self.texts.insert(position, text)
+        self.entries.insert(position, (key, label, value))
+        self.keys.setdefault(key, []).append(text)
+
+    def remove(self, key):
+        for text in self.keys.pop(key, ()):
+            position = bisect_left(self.texts, text)
+            while position < len(self.texts) and self.texts[position] == text:
+                if self.entries[position][0] == key:
+                    del self.texts[position]
+                    del self.entries[position]
+                    break
+                position += 1
+
+    def complete(self, prefix, limit=20):
+        # (label, value) of up to `limit` entries whose text starts with
+        # prefix, in text order, one per key
+        prefix = prefix.casefold()
+        matches, seen = [], set()
+        position = bisect_left(self.texts, prefix)
+        while position < len(self.texts) and len(matches) < limit and self.texts[position].startswith(prefix):
+            key, label, value = self.entries[position]
+            if key not in seen:
+                seen.add(key)
+                matches.append((label, value))
+            position += 1
+        return matches
+
+    def __len__(self):
+        return len(self.keys)
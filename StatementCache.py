@@ -0,0 +1,67 @@
+from collections import OrderedDict
+import mysql.connector
+
+
+class StatementCache:
+    # Server-side prepared statements for the hot queries, one prepared
+    # cursor per statement text and connection. The first run prepares the
+    # statement; later runs execute it by handle over the binary protocol, so
+    # the server skips parsing and planning and rows arrive as typed values
+    # rather than text for the client to convert. A reconnect loses the
+    # server's statements: the cache notices the new connection id and
+    # prepares again. Least recently used statements are closed beyond
+    # maxsize, which frees them on the server.
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.prepares = 0
+        self.executions = 0
+        self._entries = OrderedDict()
+
+    def rows(self, connection, statement, params=()):
+        # All rows of `statement`; the cursor is drained so it can run again
+        cursor, statement = self.cursor(connection, statement)
+        self.executions += 1
+        cursor.execute(statement, tuple(params))
+        return cursor.fetchall()
+
+    def cursor(self, connection, statement):
+        # The cached (cursor, statement) pair. Prepared cursors only reuse
+        # their statement when handed the very same string object, so the
+        # cached copy of the text is returned with the cursor.
+        ensure_alive = getattr(connection, "ensure_alive", None)
+        if ensure_alive is not None:
+            ensure_alive()
+        key = (id(connection), statement)
+        entry = self._entries.get(key)
+        if entry is not None:
+            session, cursor, cached = entry
+            if session == connection.connection_id:
+                self._entries.move_to_end(key)
+                return cursor, cached
+            self._close(cursor)
+
+        self.prepares += 1
+        cursor = connection.cursor(prepared=True)
+        self._entries[key] = (connection.connection_id, cursor, statement)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self._close(evicted)
+        return cursor, statement
+
+    def _close(self, cursor):
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            # The statement died with its connection
+            pass
+
+    def clear(self):
+        for _, cursor, _ in self._entries.values():
+            self._close(cursor)
+        self._entries.clear()
+
+    def describe(self):
+        reused = self.executions - self.prepares
+        return (f"Prepared statements: {self.executions} executions, {self.prepares} prepares, "
+                f"{max(reused, 0)} reused, {len(self._entries)} cached")
@@ -0,0 +1,265 @@
+import argparse
+import sys
+from datetime import date, timedelta
+from itertools import islice
+import mysql.connector
+import BulkExport
+import BulkImport
+import SaleArchive
+from ConnectionManager import CONFIG_FILE, read_database_config, read_replica_configs, connect_database
+from StoreService import StoreService, sales_conditions
+
+# Headless entry point for batch jobs: imports, stock reconciliation and
+# reports run from cron or a shell without PyQt6 or a display. Rows are
+# printed tab separated; every command that writes commits before it exits.
+
+
+def print_rows(rows):
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+
+
+def parse_item(text):
+    # PRODUCT:QUANTITY, as used by the order command
+    try:
+        product_id, quantity = text.split(":")
+        return {"productid": int(product_id), "quantity": int(quantity)}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected PRODUCT:QUANTITY, got '{text}'")
+
+
+######################### COMMANDS ######################################
+def list_suppliers(service, args):
+    print_rows(service.iter_rows(service.fetch_suppliers_page))
+
+
+def list_products(service, args):
+    print_rows(service.iter_rows(service.fetch_products_page, key_columns=(0, 5)))
+
+
+def list_sales(service, args):
+    # A date range also finds archived sales
+    window = (args.date_from, args.date_to or date.today()) if args.date_from else None
+    conditions = sales_conditions(args.search)
+    print_rows(service.iter_rows(
+        lambda after_key, limit: service.fetch_sales_page(after_key, limit, conditions, window)
+    ))
+
+
+def report(service, args):
+    # Read from the sales summaries, not the sales themselves
+    if args.report == "daily":
+        date_to = args.date_to or date.today()
+        date_from = args.date_from or date_to - timedelta(days=30)
+        rows = service.iter_rows(
+            lambda after_key, limit: service.fetch_daily_summary_page(after_key, limit, date_from, date_to)
+        )
+    elif args.report == "products":
+        rows = service.iter_rows(service.fetch_product_summary_page, key_columns=(4, 0))
+    else:
+        rows = service.iter_rows(service.fetch_customer_summary_page, key_columns=(4, 0))
+    print_rows(islice(rows, args.limit))
+
+
+def low_stock(service, args):
+    # Reads the watchlist the stock triggers keep, not the inventory
+    print_rows(service.iter_rows(service.fetch_low_stock_page))
+
+
+def rebuild_summaries(service, args):
+    service.rebuild_summaries()
+
+
+def reorder_level(service, args):
+    service.set_reorder_levels(args.ids, args.level)
+
+
+def add_supplier(service, args):
+    print(service.insert_supplier(args.name))
+
+
+def save_product(service, args):
+    print(service.save_product(args.id, args.supplier, args.name, args.price, args.quantity))
+
+
+def set_stock(service, args):
+    service.set_stock(args.product, args.supplier, args.quantity)
+
+
+def sell(service, args):
+    sale_id, _, customer_added = service.save_sale(args.customer, args.product, args.quantity, args.sale_id)
+    if customer_added:
+        print(f"New customer added: {args.customer}", file=sys.stderr)
+    print(sale_id)
+
+
+def order(service, args):
+    lines = service.place_order(args.customer, args.items)
+    print_rows(lines)
+    if any(line[4] != "ok" for line in lines):
+        print("Order not placed, nothing was sold.", file=sys.stderr)
+        return 1
+
+
+def delete(service, args):
+    remove = {"supplier": service.remove_suppliers, "product": service.remove_products, "sale": service.remove_sales}
+    remove[args.table](args.ids)
+
+
+def archive(service, args):
+    report = SaleArchive.archive_sales(service.conn, args.before, args.batch_size)
+    print(report.summary())
+
+
+def import_data(service, args):
+    report = BulkImport.import_file(service.conn, args.kind, args.path, args.batch_size,
+                                    "add" if args.add_stock else "set")
+    for line, message in report.errors:
+        print(f"line {line}: {message}", file=sys.stderr)
+    print(report.summary())
+    return 1 if report.rows_failed else 0
+
+
+def export_data(service, args):
+    conditions = ([], [])
+    if args.kind == "sales":
+        conditions = BulkExport.sales_filter(args.date_from, args.date_to, args.customer, args.product)
+    report = BulkExport.export_file(service.conn, args.kind, args.path, conditions=conditions)
+    print(report.summary())
+
+
+READ_ONLY_COMMANDS = (list_suppliers, list_products, list_sales, report, low_stock, export_data)
+
+
+def open_connection(args):
+    # Commands that only read run on the first reachable read replica, if
+    # config.ini lists any; everything else goes to the primary
+    config = read_database_config(args.config)
+    if args.run in READ_ONLY_COMMANDS:
+        for replica in read_replica_configs(config, args.config):
+            try:
+                return connect_database(replica)
+            except mysql.connector.Error:
+                continue
+    return connect_database(config)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Store Management System without the GUI.")
+    parser.add_argument("--config", default=CONFIG_FILE, help="connection settings file (default: config.ini)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("suppliers", help="list suppliers")
+    command.set_defaults(run=list_suppliers)
+
+    command = commands.add_parser("products", help="list products with their stock")
+    command.set_defaults(run=list_products)
+
+    command = commands.add_parser("sales", help="list sales")
+    command.add_argument("--search", default="", help="customer or product name, or a sale ID")
+    command.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    command.add_argument("--to", dest="date_to", type=date.fromisoformat)
+    command.set_defaults(run=list_sales)
+
+    command = commands.add_parser("report", help="sales, units and revenue per day, product or customer")
+    command.add_argument("report", choices=("daily", "products", "customers"))
+    command.add_argument("--from", dest="date_from", type=date.fromisoformat, help="daily only (default: 30 days ago)")
+    command.add_argument("--to", dest="date_to", type=date.fromisoformat, help="daily only (default: today)")
+    command.add_argument("--limit", type=int, help="print at most this many rows, best first")
+    command.set_defaults(run=report)
+
+    command = commands.add_parser("low-stock", help="list the products at or below their reorder level")
+    command.set_defaults(run=low_stock)
+
+    command = commands.add_parser("rebuild-summaries", help="recompute the sales summaries from the sales")
+    command.set_defaults(run=rebuild_summaries)
+
+    command = commands.add_parser("add-supplier", help="add a supplier and print its ID")
+    command.add_argument("name")
+    command.set_defaults(run=add_supplier)
+
+    command = commands.add_parser("save-product", help="add or update a product and its stock")
+    command.add_argument("name")
+    command.add_argument("price", type=float)
+    command.add_argument("supplier", type=int)
+    command.add_argument("quantity", type=int)
+    command.add_argument("--id", type=int, help="update this product instead of adding one")
+    command.set_defaults(run=save_product)
+
+    command = commands.add_parser("set-stock", help="set the stock of a product from one supplier")
+    command.add_argument("product", type=int)
+    command.add_argument("supplier", type=int)
+    command.add_argument("quantity", type=int)
+    command.set_defaults(run=set_stock)
+
+    command = commands.add_parser("reorder-level", help="list products as low stock when their stock falls this far")
+    command.add_argument("level", type=int, help="0 never lists the products")
+    command.add_argument("ids", nargs="+", type=int, metavar="PRODUCT")
+    command.set_defaults(run=reorder_level)
+
+    command = commands.add_parser("sell", help="record a sale and print its ID")
+    command.add_argument("customer")
+    command.add_argument("product", type=int)
+    command.add_argument("quantity", type=int)
+    command.add_argument("--sale-id", type=int, help="update this sale instead of adding one")
+    command.set_defaults(run=sell)
+
+    command = commands.add_parser("order", help="sell several products to one customer at once")
+    command.add_argument("customer")
+    command.add_argument("items", nargs="+", type=parse_item, metavar="PRODUCT:QUANTITY")
+    command.set_defaults(run=order)
+
+    command = commands.add_parser("delete", help="delete suppliers, products or sales")
+    command.add_argument("table", choices=("supplier", "product", "sale"))
+    command.add_argument("ids", nargs="+", type=int, metavar="ID")
+    command.set_defaults(run=delete)
+
+    command = commands.add_parser("archive", help="move the sales of closed periods into the archive")
+    command.add_argument("--before", type=date.fromisoformat,
+                         help="archive sales dated before this day (default: January 1 of this year)")
+    command.add_argument("--batch-size", type=int, default=SaleArchive.BATCH_SIZE)
+    command.set_defaults(run=archive)
+
+    command = commands.add_parser("import", help="bulk import products, stock or sales from CSV or JSON")
+    command.add_argument("kind", choices=BulkImport.KINDS)
+    command.add_argument("path")
+    command.add_argument("--batch-size", type=int, default=BulkImport.BATCH_SIZE)
+    command.add_argument("--add-stock", action="store_true", help="add quantities to existing stock instead of replacing them")
+    command.set_defaults(run=import_data)
+
+    command = commands.add_parser("export", help="export sales or inventory to CSV, Parquet or Arrow")
+    command.add_argument("kind", choices=BulkExport.KINDS)
+    command.add_argument("path", help="the extension picks the format: .csv, .parquet, .arrow or .feather")
+    command.add_argument("--from", dest="date_from", type=date.fromisoformat, help="sales only")
+    command.add_argument("--to", dest="date_to", type=date.fromisoformat, help="sales only")
+    command.add_argument("--customer", help="sales only: the customer's name")
+    command.add_argument("--product", type=int, help="sales only: the product ID")
+    command.set_defaults(run=export_data)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        connection = open_connection(args)
+    except mysql.connector.Error as err:
+        print(f"Database connection failed: {err}", file=sys.stderr)
+        return 2
+
+    service = StoreService(connection)
+    try:
+        return args.run(service, args) or 0
+    except mysql.connector.Error as err:
+        print(f"{args.command} failed: {err.msg}", file=sys.stderr)
+        return 1
+    except ValueError as err:
+        # Refused by the service before anything was written
+        print(f"{args.command} failed: {err}", file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,10 @@ use storedb;
 create table product (
     productid int primary key auto_increment,
     name varchar(255),
-    price decimal(10, 2)
+    price decimal(10, 2),
+    -- total stock at or below this puts the product on the low_stock
+    -- watchlist; 0 never does
+    reorderlevel int not null default 0
 );
 -- create supplier table with auto-incremented primary key
 create table supplier (
@@ -23,10 +26,19 @@ create table sale (
     productid int,
     customerid int,
     quantity int,
+    -- the price charged, copied from product.price when the sale is made
+    unitprice decimal(10, 2),
     saledate date default(current_date),
     foreign key (productid) references product(productid) on delete set null,
     foreign key (customerid) references customer(customerid) on delete cascade
 );
+-- indexes for the name to id lookups made on every sale
+create unique index uq_customer_name on customer (name);
+create index idx_product_name on product (name);
+-- indexes for the database-side sales search
+create fulltext index ft_product_name on product (name);
+create fulltext index ft_customer_name on customer (name);
+create index idx_sale_saledate on sale (saledate);
 -- create stock table
 create table stock (
     productid int,
@@ -37,16 +49,235 @@ create table stock (
     foreign key (productid) references product(productid) on delete cascade,
     foreign key (supplierid) references supplier(supplierid) on delete cascade
 );
+-- how much of each sale was taken from which supplier's stock, written by
+-- allocate_stock. undoing or editing a sale hands back exactly these rows.
+-- no foreign key to stock: a deleted stock row comes back with its
+-- allocations when the delete is undone.
+create table sale_allocation (
+    saleid int,
+    productid int not null,
+    supplierid int,
+    quantity int not null,
+    primary key (saleid, supplierid),
+    foreign key (saleid) references sale(saleid) on delete cascade
+);
+-- products whose total stock is at or below their reorder level, kept
+-- current by the triggers on stock and product, so checking what to reorder
+-- reads only the products running low instead of the whole inventory.
+create table low_stock (
+    productid int primary key,
+    quantity int not null,
+    reorderlevel int not null,
+    -- the day the product went low; kept while it stays low
+    since date not null default (current_date),
+    foreign key (productid) references product(productid) on delete cascade
+);
+-- sales summaries, kept current by the triggers on sale, so reports read a
+-- row per day, product or customer instead of the whole sales history.
+-- rebuild_summaries recomputes them from the sales.
+create table sales_daily (
+    saledate date primary key,
+    sales int not null default 0,
+    units bigint not null default 0,
+    revenue decimal(14, 2) not null default 0
+);
+create table sales_by_product (
+    productid int primary key,
+    sales int not null default 0,
+    units bigint not null default 0,
+    revenue decimal(14, 2) not null default 0,
+    index idx_sales_by_product_revenue (revenue),
+    foreign key (productid) references product(productid) on delete cascade
+);
+create table sales_by_customer (
+    customerid int primary key,
+    sales int not null default 0,
+    units bigint not null default 0,
+    revenue decimal(14, 2) not null default 0,
+    index idx_sales_by_customer_revenue (revenue),
+    foreign key (customerid) references customer(customerid) on delete cascade
+);
+-- closed periods of sales, moved out of sale by archive_sales so the live
+-- table only holds the current period. partitioned by year of saledate, so
+-- a date window reads only the years it covers. partitioned tables cannot
+-- take part in foreign keys: the customer and product triggers below do
+-- what the cascades on sale do. SaleArchive.py adds a partition per year
+-- before moving sales into it.
+create table sale_archive (
+    saleid int not null,
+    productid int,
+    customerid int,
+    quantity int,
+    unitprice decimal(10, 2),
+    saledate date not null,
+    primary key (saleid, saledate),
+    index idx_sale_archive_productid (productid),
+    index idx_sale_archive_customerid (customerid)
+)
+partition by range columns (saledate) (
+    partition p_future values less than (maxvalue)
+);
+-- change log for terminals sharing the database. every write to a table the
+-- views show records the keys it touched under a new changeid. the ids are
+-- handed out without a lock held to commit, so writers never wait on each
+-- other here, but a lower id can become visible after a higher one: clients
+-- read past the highest id they have seen in full (StoreService.poll_changes).
+-- a tablename of '*' tells every other terminal to reload in full.
+create table change_log (
+    changeid bigint primary key auto_increment,
+    tablename varchar(16) not null,
+    rowkey int not null,
+    -- connection_id() of the writer, so a terminal can skip its own changes
+    origin bigint
+);
+delimiter //
+-- takes p_quantity of a product off its stock for sale p_saleid, oldest
+-- delivery first, across as many supplier rows as it needs, and records each
+-- take in sale_allocation. the product's stock rows are locked before they
+-- are read, and each decrement only applies while the row still holds
+-- enough, so concurrent sales can neither oversell nor go negative.
+create procedure allocate_stock(
+    in p_saleid int,
+    in p_productid int,
+    in p_quantity int
+)
+begin
+    declare v_done int default false;
+    declare v_supplierid int;
+    declare v_available int;
+    declare v_take int;
+    declare v_remaining int default p_quantity;
+    declare rows_left cursor for
+        select supplierid, quantity from stock
+        where productid = p_productid and quantity > 0
+        order by purchasedate, supplierid
+        for update;
+    declare continue handler for not found set v_done = true;
+
+    open rows_left;
+    allocate: loop
+        if v_remaining <= 0 then
+            leave allocate;
+        end if;
+        fetch rows_left into v_supplierid, v_available;
+        if v_done then
+            leave allocate;
+        end if;
+        set v_take = least(v_available, v_remaining);
+        update stock
+            set quantity = quantity - v_take
+            where productid = p_productid and supplierid = v_supplierid and quantity >= v_take;
+        if row_count() = 1 then
+            set v_remaining = v_remaining - v_take;
+            insert into sale_allocation (saleid, productid, supplierid, quantity)
+                values (p_saleid, p_productid, v_supplierid, v_take)
+                on duplicate key update quantity = quantity + v_take;
+        end if;
+    end loop;
+    close rows_left;
+
+    if v_remaining > 0 then
+        signal sqlstate '45000'
+        set message_text = 'Product is not available in sufficient quantity. Transaction rolled back.';
+    end if;
+end//
+delimiter ;
+
+delimiter //
+-- hands back the stock sale p_saleid holds, to the rows it was taken from
+create procedure release_stock(
+    in p_saleid int
+)
+begin
+    update stock s join sale_allocation a on a.productid = s.productid and a.supplierid = s.supplierid
+        set s.quantity = s.quantity + a.quantity
+        where a.saleid = p_saleid;
+    delete from sale_allocation where saleid = p_saleid;
+end//
+delimiter ;
+
+delimiter //
+-- puts sales back as they were before an edit or a delete, for the undo
+-- journal. p_sales holds [saleid, productid, customerid, quantity, unitprice,
+-- saledate] and p_allocations [saleid, productid, supplierid, quantity]
+-- arrays. a sale still there (an edit) hands back what it holds now and
+-- takes its old allocation again; a deleted sale kept its stock, so only its
+-- allocation is recorded. the sale rows are written with the stock triggers
+-- skipped.
+create procedure restore_sales(
+    in p_sales json,
+    in p_allocations json
+)
+begin
+    declare exit handler for sqlexception
+    begin
+        set @skip_stock_triggers = null;
+        drop temporary table if exists restored_sales;
+        resignal;
+    end;
+
+    drop temporary table if exists restored_sales;
+    create temporary table restored_sales (saleid int primary key, edited int);
+    insert into restored_sales (saleid, edited)
+        select r.saleid, exists (select 1 from sale s where s.saleid = r.saleid)
+        from json_table(p_sales, '$[*]' columns (saleid int path '$[0]')) as r;
+
+    -- several sales can share a stock row, so the quantities are summed
+    -- before the row is updated once
+    update stock s join (
+            select a.productid, a.supplierid, sum(a.quantity) as quantity
+            from sale_allocation a join restored_sales r on r.saleid = a.saleid
+            group by a.productid, a.supplierid
+        ) held on held.productid = s.productid and held.supplierid = s.supplierid
+        set s.quantity = s.quantity + held.quantity;
+    delete a from sale_allocation a join restored_sales r on r.saleid = a.saleid;
+    update stock s join (
+            select a.productid, a.supplierid, sum(a.quantity) as quantity
+            from json_table(p_allocations, '$[*]' columns (
+                saleid int path '$[0]',
+                productid int path '$[1]',
+                supplierid int path '$[2]',
+                quantity int path '$[3]'
+            )) as a join restored_sales r on r.saleid = a.saleid and r.edited
+            group by a.productid, a.supplierid
+        ) taken on taken.productid = s.productid and taken.supplierid = s.supplierid
+        set s.quantity = s.quantity - taken.quantity;
+
+    set @skip_stock_triggers = 1;
+    insert into sale (saleid, productid, customerid, quantity, unitprice, saledate)
+        select saleid, productid, customerid, quantity, unitprice, saledate
+        from json_table(p_sales, '$[*]' columns (
+            saleid int path '$[0]',
+            productid int path '$[1]',
+            customerid int path '$[2]',
+            quantity int path '$[3]',
+            unitprice decimal(10, 2) path '$[4]',
+            saledate date path '$[5]'
+        )) as r
+        on duplicate key update customerid = values(customerid), productid = values(productid),
+            quantity = values(quantity), unitprice = values(unitprice), saledate = values(saledate);
+    set @skip_stock_triggers = null;
+    insert into sale_allocation (saleid, productid, supplierid, quantity)
+        select saleid, productid, supplierid, quantity
+        from json_table(p_allocations, '$[*]' columns (
+            saleid int path '$[0]',
+            productid int path '$[1]',
+            supplierid int path '$[2]',
+            quantity int path '$[3]'
+        )) as a;
+    drop temporary table restored_sales;
+end//
+delimiter ;
+
 delimiter //
 create trigger after_sale
 after insert on sale
 for each row
 begin
-    declare supplier_id int;
-    select supplierid into supplier_id from stock where productid = new.productid;
-    update stock
-    set quantity = quantity - new.quantity
-    where productid = new.productid and supplierid = supplier_id;
+    -- bulk loads that write the final stock themselves set @skip_stock_triggers
+    if new.productid is not null and @skip_stock_triggers is null then
+        call allocate_stock(new.saleid, new.productid, new.quantity);
+    end if;
 end//
 delimiter ;
 
@@ -55,37 +286,479 @@ create trigger update_sale
 before update on sale
 for each row
 begin
-    declare supplier_id int;
-    select supplierid into supplier_id from stock where productid = old.productid;
-    update stock
-        set quantity = quantity + old.quantity
-        where productid = old.productid and supplierid = supplier_id;
-    update stock
-        set quantity = quantity - new.quantity
-        where productid = new.productid and supplierid = supplier_id;
+    declare v_locked int;
+    -- a sale moved to another product is charged that product's price,
+    -- unless the update sets the price itself
+    if not (new.productid <=> old.productid) and new.unitprice <=> old.unitprice then
+        set new.unitprice = (select price from product where productid = new.productid);
+    end if;
+    -- lock both products' stock up front, in primary key order, so two
+    -- updates cannot deadlock on each other
+    -- a sale whose product was deleted has no stock to move; relinking it
+    -- (undoing the product delete) must not take stock a second time.
+    -- the old stock goes back to the rows it came from, and an update that
+    -- keeps the product and quantity moves none.
+    if old.productid is not null and @skip_stock_triggers is null
+            and (not (new.productid <=> old.productid) or not (new.quantity <=> old.quantity)) then
+        select count(*) into v_locked from stock
+            where productid in (old.productid, new.productid)
+            for update;
+        call release_stock(old.saleid);
+        if new.productid is not null then
+            call allocate_stock(new.saleid, new.productid, new.quantity);
+        end if;
+    end if;
+end//
+delimiter ;
+
+delimiter //
+create trigger price_sale
+before insert on sale
+for each row
+begin
+    if new.unitprice is null then
+        set new.unitprice = (select price from product where productid = new.productid);
+    end if;
+end//
+delimiter ;
+
+delimiter //
+-- puts a product on the low_stock watchlist or takes it off, from its total
+-- stock across suppliers. sales, deliveries and stock edits all pass through
+-- the triggers on stock below.
+create procedure watch_stock(
+    in p_productid int
+)
+begin
+    declare v_quantity int;
+    declare v_level int;
+
+    select coalesce(sum(quantity), 0) into v_quantity from stock where productid = p_productid;
+    select reorderlevel into v_level from product where productid = p_productid;
+    if v_level > 0 and v_quantity <= v_level then
+        insert into low_stock (productid, quantity, reorderlevel)
+            values (p_productid, v_quantity, v_level)
+            on duplicate key update quantity = v_quantity, reorderlevel = v_level;
+    else
+        delete from low_stock where productid = p_productid;
+    end if;
+end//
+delimiter ;
+
+delimiter //
+create trigger watch_stock_insert
+after insert on stock
+for each row
+begin
+    call watch_stock(new.productid);
+end//
+delimiter ;
+
+delimiter //
+create trigger watch_stock_update
+after update on stock
+for each row
+begin
+    if not (new.quantity <=> old.quantity) or new.productid <> old.productid then
+        call watch_stock(new.productid);
+    end if;
+    if new.productid <> old.productid then
+        call watch_stock(old.productid);
+    end if;
+end//
+delimiter ;
+
+delimiter //
+create trigger watch_stock_delete
+after delete on stock
+for each row
+begin
+    call watch_stock(old.productid);
+end//
+delimiter ;
+
+delimiter //
+create trigger watch_reorder_level
+after update on product
+for each row
+begin
+    if new.reorderlevel <> old.reorderlevel then
+        call watch_stock(new.productid);
+    end if;
+end//
+delimiter ;
+
+delimiter //
+-- foreign key actions fire no triggers: the stock a supplier delete cascades
+-- to is taken off its products' totals here
+create trigger watch_supplier_cascade
+before delete on supplier
+for each row
+begin
+    insert into low_stock (productid, quantity, reorderlevel)
+        select p.productid, coalesce(sum(other.quantity), 0), p.reorderlevel
+        from stock mine
+        join product p on p.productid = mine.productid
+        left join stock other on other.productid = mine.productid and other.supplierid <> old.supplierid
+        where mine.supplierid = old.supplierid and p.reorderlevel > 0
+        group by p.productid, p.reorderlevel
+        having coalesce(sum(other.quantity), 0) <= p.reorderlevel
+        on duplicate key update quantity = values(quantity);
+end//
+delimiter ;
+
+delimiter //
+-- adds one sale's figures to the summaries. called with negated figures to
+-- take a sale back out.
+create procedure summarize_sale(
+    in p_saledate date,
+    in p_productid int,
+    in p_customerid int,
+    in p_sales int,
+    in p_units int,
+    in p_revenue decimal(14, 2)
+)
+begin
+    if p_saledate is not null then
+        insert into sales_daily (saledate, sales, units, revenue)
+            values (p_saledate, p_sales, p_units, p_revenue)
+            on duplicate key update sales = sales + p_sales, units = units + p_units, revenue = revenue + p_revenue;
+    end if;
+    if p_productid is not null then
+        insert into sales_by_product (productid, sales, units, revenue)
+            values (p_productid, p_sales, p_units, p_revenue)
+            on duplicate key update sales = sales + p_sales, units = units + p_units, revenue = revenue + p_revenue;
+    end if;
+    if p_customerid is not null then
+        insert into sales_by_customer (customerid, sales, units, revenue)
+            values (p_customerid, p_sales, p_units, p_revenue)
+            on duplicate key update sales = sales + p_sales, units = units + p_units, revenue = revenue + p_revenue;
+    end if;
+end//
+delimiter ;
+
+delimiter //
+-- recomputes the summaries from the sales. run it inside a transaction: the
+-- sales it reads stay locked until the commit, so a sale made meanwhile waits
+-- and is then counted by its trigger as usual.
+create procedure rebuild_summaries()
+begin
+    delete from sales_daily;
+    insert into sales_daily (saledate, sales, units, revenue)
+        select saledate, count(*), coalesce(sum(quantity), 0), coalesce(sum(quantity * unitprice), 0)
+        from (select saledate, quantity, unitprice from sale
+              union all select saledate, quantity, unitprice from sale_archive) s
+        where saledate is not null group by saledate;
+    delete from sales_by_product;
+    insert into sales_by_product (productid, sales, units, revenue)
+        select productid, count(*), coalesce(sum(quantity), 0), coalesce(sum(quantity * unitprice), 0)
+        from (select productid, quantity, unitprice from sale
+              union all select productid, quantity, unitprice from sale_archive) s
+        where productid is not null group by productid;
+    delete from sales_by_customer;
+    insert into sales_by_customer (customerid, sales, units, revenue)
+        select customerid, count(*), coalesce(sum(quantity), 0), coalesce(sum(quantity * unitprice), 0)
+        from (select customerid, quantity, unitprice from sale
+              union all select customerid, quantity, unitprice from sale_archive) s
+        where customerid is not null group by customerid;
+end//
+delimiter ;
+
+delimiter //
+-- bulk loads that rebuild the summaries afterwards set @skip_summary_triggers
+create trigger summarize_new_sale
+after insert on sale
+for each row
+begin
+    if @skip_summary_triggers is null then
+        call summarize_sale(new.saledate, new.productid, new.customerid,
+                            1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0));
+    end if;
 end//
 delimiter ;
 
 delimiter //
+create trigger summarize_changed_sale
+after update on sale
+for each row
+begin
+    if @skip_summary_triggers is null then
+        call summarize_sale(old.saledate, old.productid, old.customerid,
+                            -1, -coalesce(old.quantity, 0), -coalesce(old.quantity * old.unitprice, 0));
+        call summarize_sale(new.saledate, new.productid, new.customerid,
+                            1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0));
+    end if;
+end//
+delimiter ;
+
+delimiter //
+create trigger summarize_deleted_sale
+after delete on sale
+for each row
+begin
+    if @skip_summary_triggers is null then
+        call summarize_sale(old.saledate, old.productid, old.customerid,
+                            -1, -coalesce(old.quantity, 0), -coalesce(old.quantity * old.unitprice, 0));
+    end if;
+end//
+delimiter ;
+
+delimiter //
+-- deleting a customer deletes their sales through the foreign key, which
+-- fires no sale triggers, so their figures come off the daily and product
+-- summaries here. their own summary row goes with its foreign key.
+create trigger forget_customer_sales
+before delete on customer
+for each row
+begin
+    if @skip_summary_triggers is null then
+        update sales_daily d
+            join (select saledate, count(*) as sales, coalesce(sum(quantity), 0) as units,
+                         coalesce(sum(quantity * unitprice), 0) as revenue
+                  from (select saledate, quantity, unitprice from sale where customerid = old.customerid
+                        union all
+                        select saledate, quantity, unitprice from sale_archive where customerid = old.customerid) c
+                  group by saledate) s
+            on s.saledate = d.saledate
+            set d.sales = d.sales - s.sales, d.units = d.units - s.units, d.revenue = d.revenue - s.revenue;
+        update sales_by_product p
+            join (select productid, count(*) as sales, coalesce(sum(quantity), 0) as units,
+                         coalesce(sum(quantity * unitprice), 0) as revenue
+                  from (select productid, quantity, unitprice from sale where customerid = old.customerid
+                        union all
+                        select productid, quantity, unitprice from sale_archive where customerid = old.customerid) c
+                  where productid is not null group by productid) s
+            on s.productid = p.productid
+            set p.sales = p.sales - s.sales, p.units = p.units - s.units, p.revenue = p.revenue - s.revenue;
+    end if;
+    -- the cascade on sale, for the archived sales
+    delete from sale_archive where customerid = old.customerid;
+end//
+delimiter ;
+
+delimiter //
+-- on delete set null, as on sale, for the archived sales
+create trigger forget_archived_product
+before delete on product
+for each row
+begin
+    update sale_archive set productid = null where productid = old.productid;
+end//
+delimiter ;
+
+delimiter //
+-- moves up to p_batch of the oldest sales dated before p_before into
+-- sale_archive; p_moved is how many moved, 0 once none are left. the
+-- summaries go on counting archived sales, so the delete skips the summary
+-- triggers. the caller commits each batch.
+create procedure archive_sales(
+    in p_before date,
+    in p_batch int,
+    out p_moved int
+)
+begin
+    declare exit handler for sqlexception
+    begin
+        set @skip_summary_triggers = null;
+        drop temporary table if exists archive_batch;
+        resignal;
+    end;
+
+    drop temporary table if exists archive_batch;
+    create temporary table archive_batch (saleid int primary key);
+    -- oldest first, read in idx_sale_saledate order
+    insert into archive_batch
+        select saleid from sale where saledate < p_before order by saledate, saleid limit p_batch;
+    insert into sale_archive (saleid, productid, customerid, quantity, unitprice, saledate)
+        select s.saleid, s.productid, s.customerid, s.quantity, s.unitprice, s.saledate
+        from sale s join archive_batch b on b.saleid = s.saleid;
+    set @skip_summary_triggers = 1;
+    delete s from sale s join archive_batch b on b.saleid = s.saleid;
+    set p_moved = row_count();
+    set @skip_summary_triggers = null;
+    drop temporary table archive_batch;
+end//
+delimiter ;
+
+delimiter //
+-- records one changed row
+create procedure log_change(
+    in p_table varchar(16),
+    in p_key int
+)
+begin
+    -- bulk loads set @skip_change_log and log a single '*' row instead, which
+    -- makes every other terminal reload
+    if @skip_change_log is null and p_key is not null then
+        insert into change_log (tablename, rowkey, origin) values (p_table, p_key, connection_id());
+    end if;
+end//
+delimiter ;
+
+delimiter //
+create trigger log_supplier_insert
+after insert on supplier
+for each row
+begin
+    call log_change('supplier', new.supplierid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_supplier_update
+after update on supplier
+for each row
+begin
+    call log_change('supplier', new.supplierid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_supplier_delete
+after delete on supplier
+for each row
+begin
+    call log_change('supplier', old.supplierid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_product_insert
+after insert on product
+for each row
+begin
+    call log_change('product', new.productid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_product_update
+after update on product
+for each row
+begin
+    call log_change('product', new.productid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_product_delete
+after delete on product
+for each row
+begin
+    call log_change('product', old.productid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_sale_insert
+after insert on sale
+for each row
+begin
+    call log_change('sale', new.saleid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_sale_update
+after update on sale
+for each row
+begin
+    call log_change('sale', new.saleid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_sale_delete
+after delete on sale
+for each row
+begin
+    call log_change('sale', old.saleid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_customer_insert
+after insert on customer
+for each row
+begin
+    call log_change('customer', new.customerid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_customer_update
+after update on customer
+for each row
+begin
+    call log_change('customer', new.customerid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_customer_delete
+after delete on customer
+for each row
+begin
+    call log_change('customer', old.customerid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_stock_insert
+after insert on stock
+for each row
+begin
+    call log_change('stock', new.productid);
+end//
+delimiter ;
+
+delimiter //
+create trigger log_stock_update
+after update on stock
+for each row
+begin
+    call log_change('stock', new.productid);
+    if old.productid <> new.productid then
+        call log_change('stock', old.productid);
+    end if;
+end//
+delimiter ;
+
+delimiter //
+create trigger log_stock_delete
+after delete on stock
+for each row
+begin
+    call log_change('stock', old.productid);
+end//
+delimiter ;
+
+-- foreign key actions fire no triggers, so the stock rows a supplier delete
+-- cascades to are logged here. sales show product and customer names, so
+-- clients reload the sales on any product or customer change instead.
+delimiter //
+create trigger log_supplier_cascade
+before delete on supplier
+for each row
+begin
+    if @skip_change_log is null then
+        insert into change_log (tablename, rowkey, origin)
+            select 'stock', productid, connection_id() from stock where supplierid = old.supplierid;
+    end if;
+end//
+delimiter ;
+
+delimiter //
+-- the stock check and decrement happen atomically in the after_sale trigger.
+-- the caller's unit of work commits or rolls back.
 create procedure makepurchase(
     in p_customerid int,
     in p_productid int,
     in p_quantity int
 )
 begin
-    declare current_quantity int;
-    select quantity into current_quantity from stock
-    where productid = p_productid;
-
-    if current_quantity - p_quantity < 0 then
-        rollback;
-        signal sqlstate '45000'
-        set message_text = 'Product is not available in sufficient quantity. Transaction rolled back.';
-    else
-        insert into sale (productid, customerid, quantity, saledate)
-        values (p_productid, p_customerid, p_quantity, current_date());
-        commit;
-    end if;
+    insert into sale (productid, customerid, quantity, saledate)
+    values (p_productid, p_customerid, p_quantity, current_date());
 end //
 delimiter ;
 delimiter //
@@ -96,21 +769,102 @@ create procedure updatesale(
     in p_saleid int
 )
 begin
-    declare current_quantity int;
-    select quantity into current_quantity from stock
-    where productid = p_productid;
-    if current_quantity - p_quantity < 0 then
-        rollback;
-        signal sqlstate '45000'
-        set message_text = 'Product is not available in sufficient quantity. Transaction rolled back.';
-    else
-        update sale
-        set customerid = p_customerid,
-            productid = p_productid,
-            quantity = p_quantity
-        where saleid = p_saleid;
-        commit;
+    update sale
+    set customerid = p_customerid,
+        productid = p_productid,
+        quantity = p_quantity
+    where saleid = p_saleid;
+end//
+delimiter ;
+delimiter //
+-- places a whole basket in one call. p_items is a json array of
+-- {"productid": .., "quantity": ..} objects. stock for every line is locked
+-- and checked in one statement; either all lines are sold or none are, and
+-- the customer is only added with a sale. one row per line is returned with
+-- its status and, when sold, its sale id. runs in the caller's transaction,
+-- which commits or rolls back the whole order.
+create procedure makeorder(
+    in p_customer varchar(255),
+    in p_items json,
+    out p_customerid int,
+    out p_added int
+)
+begin
+    declare v_failed int;
+    declare v_locked int;
+    declare v_done int default false;
+    declare v_line int;
+    declare v_productid int;
+    declare v_quantity int;
+    declare lines cursor for select line, productid, quantity from order_lines order by line;
+    declare continue handler for not found set v_done = true;
+    declare exit handler for sqlexception
+    begin
+        drop temporary table if exists order_lines;
+        resignal;
+    end;
+
+    drop temporary table if exists order_lines;
+    create temporary table order_lines (
+        line int primary key,
+        productid int,
+        quantity int,
+        requested int,
+        available int,
+        status varchar(32),
+        saleid int
+    );
+
+    set p_added = 0;
+    select customerid into p_customerid from customer where name = p_customer limit 1;
+
+    insert into order_lines (line, productid, quantity, requested)
+    select line, productid, quantity, sum(quantity) over (partition by productid)
+    from json_table(p_items, '$[*]' columns (
+        line for ordinality,
+        productid int path '$.productid',
+        quantity int path '$.quantity'
+    )) as items;
+
+    -- lock the stock rows of every product in the basket
+    select count(*) into v_locked
+    from stock s join order_lines o on o.productid = s.productid
+    for update of s;
+
+    update order_lines
+    set available = (select coalesce(sum(s.quantity), 0) from stock s where s.productid = order_lines.productid),
+        status = case
+            when quantity is null or quantity <= 0 then 'invalid quantity'
+            when not exists (select 1 from product p where p.productid = order_lines.productid) then 'unknown product'
+            when requested > available then 'insufficient stock'
+            else 'ok'
+        end;
+
+    select count(*) into v_failed from order_lines where status <> 'ok';
+
+    if v_failed = 0 then
+        if p_customerid is null then
+            insert into customer (name) values (p_customer);
+            set p_customerid = last_insert_id();
+            set p_added = 1;
+        end if;
+        -- the customer lookup may have tripped the not found handler
+        set v_done = false;
+        open lines;
+        sell: loop
+            fetch lines into v_line, v_productid, v_quantity;
+            if v_done then
+                leave sell;
+            end if;
+            insert into sale (productid, customerid, quantity, saledate)
+            values (v_productid, p_customerid, v_quantity, current_date());
+            update order_lines set saleid = last_insert_id() where line = v_line;
+        end loop;
+        close lines;
     end if;
+
+    select line, productid, quantity, available, status, saleid from order_lines order by line;
+    drop temporary table order_lines;
 end//
 delimiter ;
 insert into supplier (name)
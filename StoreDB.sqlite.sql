@@ -0,0 +1,525 @@
+-- StoreDB.sql ported to SQLite for the embedded backend (SQLiteBackend.py).
+-- SQLite has no stored procedures: the triggers carry the stock and summary
+-- logic inline, and makepurchase, updatesale, makeorder, release_stock,
+-- restore_sales, rebuild_summaries and archive_sales are implemented in
+-- SQLiteBackend.py.
+-- session_variable() reads the @variables a connection has SET.
+pragma foreign_keys = on;
+-- create product table with auto-incremented primary key
+create table product (
+    productid integer primary key autoincrement,
+    name varchar(255),
+    price decimal(10, 2),
+    -- total stock at or below this puts the product on the low_stock
+    -- watchlist; 0 never does
+    reorderlevel int not null default 0
+);
+-- create supplier table with auto-incremented primary key
+create table supplier (
+    supplierid integer primary key autoincrement,
+    name varchar(255)
+);
+-- create customer table with auto-incremented primary key
+create table customer (
+    customerid integer primary key autoincrement,
+    name varchar(255)
+);
+-- create sale table with auto-incremented primary key
+create table sale (
+    saleid integer primary key autoincrement,
+    productid int,
+    customerid int,
+    quantity int,
+    -- the price charged, copied from product.price when the sale is made
+    unitprice decimal(10, 2),
+    saledate date default (date('now', 'localtime')),
+    foreign key (productid) references product(productid) on delete set null,
+    foreign key (customerid) references customer(customerid) on delete cascade
+);
+-- indexes for the name to id lookups made on every sale
+create unique index uq_customer_name on customer (name);
+create index idx_product_name on product (name);
+create index idx_sale_saledate on sale (saledate);
+create index idx_sale_productid on sale (productid);
+create index idx_sale_customerid on sale (customerid);
+-- create stock table
+create table stock (
+    productid int,
+    supplierid int,
+    quantity int,
+    purchasedate date default (date('now', 'localtime')),
+    primary key (productid, supplierid),
+    foreign key (productid) references product(productid) on delete cascade,
+    foreign key (supplierid) references supplier(supplierid) on delete cascade
+);
+create index idx_stock_supplierid on stock (supplierid);
+-- how much of each sale was taken from which supplier's stock
+create table sale_allocation (
+    saleid int,
+    productid int not null,
+    supplierid int,
+    quantity int not null,
+    primary key (saleid, supplierid),
+    foreign key (saleid) references sale(saleid) on delete cascade
+);
+-- products running low, kept current by the watch_* triggers
+create table low_stock (
+    productid int primary key,
+    quantity int not null,
+    reorderlevel int not null,
+    -- the day the product went low; kept while it stays low
+    since date not null default (date('now', 'localtime')),
+    foreign key (productid) references product(productid) on delete cascade
+);
+-- every product's total stock across suppliers
+create view stock_levels as
+    select p.productid, coalesce((select sum(quantity) from stock where stock.productid = p.productid), 0) as quantity,
+           p.reorderlevel
+    from product p;
+-- sales summaries, kept current by the triggers on sale
+create table sales_daily (
+    saledate date primary key,
+    sales int not null default 0,
+    units bigint not null default 0,
+    revenue decimal(14, 2) not null default 0
+);
+create table sales_by_product (
+    productid int primary key,
+    sales int not null default 0,
+    units bigint not null default 0,
+    revenue decimal(14, 2) not null default 0,
+    foreign key (productid) references product(productid) on delete cascade
+);
+create index idx_sales_by_product_revenue on sales_by_product (revenue);
+create table sales_by_customer (
+    customerid int primary key,
+    sales int not null default 0,
+    units bigint not null default 0,
+    revenue decimal(14, 2) not null default 0,
+    foreign key (customerid) references customer(customerid) on delete cascade
+);
+create index idx_sales_by_customer_revenue on sales_by_customer (revenue);
+-- closed periods of sales, moved out of sale by archive_sales. sqlite has no
+-- partitions; the saledate index serves date windows instead.
+create table sale_archive (
+    saleid int not null,
+    productid int,
+    customerid int,
+    quantity int,
+    unitprice decimal(10, 2),
+    saledate date not null,
+    primary key (saleid, saledate)
+);
+create index idx_sale_archive_saledate on sale_archive (saledate);
+create index idx_sale_archive_productid on sale_archive (productid);
+create index idx_sale_archive_customerid on sale_archive (customerid);
+-- change log for terminals sharing the file, as in StoreDB.sql. sqlite fires
+-- triggers for foreign key actions, so cascaded deletes log themselves.
+create table change_log (
+    changeid integer primary key autoincrement,
+    tablename varchar(16) not null,
+    rowkey int not null,
+    origin bigint
+);
+
+-- takes new.quantity of a product off its stock, oldest delivery first, as
+-- allocate_stock does in StoreDB.sql: the takes are recorded in
+-- sale_allocation, then taken off the stock rows. sqlite runs one writer at
+-- a time, so the check and the decrement cannot interleave with another sale.
+create trigger after_sale
+after insert on sale
+for each row when new.productid is not null and session_variable('skip_stock_triggers') is null
+begin
+    select raise(abort, 'Product is not available in sufficient quantity. Transaction rolled back.')
+        where (select coalesce(sum(max(quantity, 0)), 0) from stock where productid = new.productid) < new.quantity;
+    insert into sale_allocation (saleid, productid, supplierid, quantity)
+        select new.saleid, new.productid, supplierid, take
+        from (select supplierid, min(quantity, max(0, new.quantity - (running - quantity))) as take
+              from (select supplierid, quantity,
+                           sum(quantity) over (order by purchasedate, supplierid) as running
+                    from stock where productid = new.productid and quantity > 0))
+        where take > 0;
+    update stock
+        set quantity = stock.quantity - sale_allocation.quantity
+        from sale_allocation
+        where sale_allocation.saleid = new.saleid and stock.productid = sale_allocation.productid
+          and stock.supplierid = sale_allocation.supplierid;
+end;
+
+-- the old product's stock goes back to the rows it was taken from and the
+-- new one is allocated as for a new sale. a sale whose product was deleted
+-- has no stock to move, and an update that keeps the product and quantity
+-- moves none.
+create trigger update_sale
+after update of productid, quantity on sale
+for each row when old.productid is not null and session_variable('skip_stock_triggers') is null
+                  and (old.productid is not new.productid or old.quantity is not new.quantity)
+begin
+    update stock
+        set quantity = stock.quantity + sale_allocation.quantity
+        from sale_allocation
+        where sale_allocation.saleid = old.saleid and stock.productid = sale_allocation.productid
+          and stock.supplierid = sale_allocation.supplierid;
+    delete from sale_allocation where saleid = old.saleid;
+    select raise(abort, 'Product is not available in sufficient quantity. Transaction rolled back.')
+        where new.productid is not null
+          and (select coalesce(sum(max(quantity, 0)), 0) from stock where productid = new.productid) < new.quantity;
+    insert into sale_allocation (saleid, productid, supplierid, quantity)
+        select new.saleid, new.productid, supplierid, take
+        from (select supplierid, min(quantity, max(0, new.quantity - (running - quantity))) as take
+              from (select supplierid, quantity,
+                           sum(quantity) over (order by purchasedate, supplierid) as running
+                    from stock where productid = new.productid and quantity > 0))
+        where take > 0;
+    update stock
+        set quantity = stock.quantity - sale_allocation.quantity
+        from sale_allocation
+        where sale_allocation.saleid = new.saleid and stock.productid = sale_allocation.productid
+          and stock.supplierid = sale_allocation.supplierid;
+end;
+
+-- triggers cannot assign to new in sqlite, so the price is filled in by an
+-- update right after the insert; summarize_priced_sale counts the sale then
+create trigger price_sale
+after insert on sale
+for each row when new.unitprice is null
+begin
+    update sale
+        set unitprice = coalesce((select price from product where productid = new.productid), 0)
+        where saleid = new.saleid;
+end;
+
+-- a sale moved to another product is charged that product's price, unless
+-- the update sets the price itself
+create trigger reprice_sale
+after update of productid on sale
+for each row when new.productid is not null and old.productid is not new.productid
+                  and old.unitprice is new.unitprice
+begin
+    update sale
+        set unitprice = coalesce((select price from product where productid = new.productid), 0)
+        where saleid = new.saleid;
+end;
+
+-- watch_stock in StoreDB.sql, inline: a product goes on the low_stock
+-- watchlist or comes off it whenever its stock or reorder level changes.
+-- foreign key actions fire triggers in sqlite, so a supplier delete needs no
+-- trigger of its own.
+create trigger watch_stock_insert
+after insert on stock
+for each row
+begin
+    delete from low_stock where productid = new.productid and not exists
+        (select 1 from stock_levels where productid = new.productid and reorderlevel > 0 and quantity <= reorderlevel);
+    insert into low_stock (productid, quantity, reorderlevel)
+        select productid, quantity, reorderlevel from stock_levels
+        where productid = new.productid and reorderlevel > 0 and quantity <= reorderlevel
+        on conflict (productid) do update set quantity = excluded.quantity, reorderlevel = excluded.reorderlevel;
+end;
+
+create trigger watch_stock_update
+after update of productid, quantity on stock
+for each row
+begin
+    delete from low_stock where productid = new.productid and not exists
+        (select 1 from stock_levels where productid = new.productid and reorderlevel > 0 and quantity <= reorderlevel);
+    insert into low_stock (productid, quantity, reorderlevel)
+        select productid, quantity, reorderlevel from stock_levels
+        where productid = new.productid and reorderlevel > 0 and quantity <= reorderlevel
+        on conflict (productid) do update set quantity = excluded.quantity, reorderlevel = excluded.reorderlevel;
+    delete from low_stock where productid = old.productid and not exists
+        (select 1 from stock_levels where productid = old.productid and reorderlevel > 0 and quantity <= reorderlevel);
+    insert into low_stock (productid, quantity, reorderlevel)
+        select productid, quantity, reorderlevel from stock_levels
+        where productid = old.productid and reorderlevel > 0 and quantity <= reorderlevel
+        on conflict (productid) do update set quantity = excluded.quantity, reorderlevel = excluded.reorderlevel;
+end;
+
+create trigger watch_stock_delete
+after delete on stock
+for each row
+begin
+    delete from low_stock where productid = old.productid and not exists
+        (select 1 from stock_levels where productid = old.productid and reorderlevel > 0 and quantity <= reorderlevel);
+    insert into low_stock (productid, quantity, reorderlevel)
+        select productid, quantity, reorderlevel from stock_levels
+        where productid = old.productid and reorderlevel > 0 and quantity <= reorderlevel
+        on conflict (productid) do update set quantity = excluded.quantity, reorderlevel = excluded.reorderlevel;
+end;
+
+create trigger watch_reorder_level
+after update of reorderlevel on product
+for each row when new.reorderlevel is not old.reorderlevel
+begin
+    delete from low_stock where productid = new.productid and not exists
+        (select 1 from stock_levels where productid = new.productid and reorderlevel > 0 and quantity <= reorderlevel);
+    insert into low_stock (productid, quantity, reorderlevel)
+        select productid, quantity, reorderlevel from stock_levels
+        where productid = new.productid and reorderlevel > 0 and quantity <= reorderlevel
+        on conflict (productid) do update set quantity = excluded.quantity, reorderlevel = excluded.reorderlevel;
+end;
+
+-- summaries: figures are added with an upsert and taken away with a plain
+-- update, so taking away never recreates the row of a customer or product
+-- whose delete is cascading
+create trigger summarize_new_sale
+after insert on sale
+for each row when new.unitprice is not null and session_variable('skip_summary_triggers') is null
+begin
+    insert into sales_daily (saledate, sales, units, revenue)
+        select new.saledate, 1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0)
+        where new.saledate is not null
+        on conflict (saledate) do update set sales = sales + excluded.sales, units = units + excluded.units,
+                                             revenue = revenue + excluded.revenue;
+    insert into sales_by_product (productid, sales, units, revenue)
+        select new.productid, 1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0)
+        where new.productid is not null
+        on conflict (productid) do update set sales = sales + excluded.sales, units = units + excluded.units,
+                                              revenue = revenue + excluded.revenue;
+    insert into sales_by_customer (customerid, sales, units, revenue)
+        select new.customerid, 1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0)
+        where new.customerid is not null
+        on conflict (customerid) do update set sales = sales + excluded.sales, units = units + excluded.units,
+                                               revenue = revenue + excluded.revenue;
+end;
+
+create trigger summarize_priced_sale
+after update of unitprice on sale
+for each row when old.unitprice is null and new.unitprice is not null and session_variable('skip_summary_triggers') is null
+begin
+    insert into sales_daily (saledate, sales, units, revenue)
+        select new.saledate, 1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0)
+        where new.saledate is not null
+        on conflict (saledate) do update set sales = sales + excluded.sales, units = units + excluded.units,
+                                             revenue = revenue + excluded.revenue;
+    insert into sales_by_product (productid, sales, units, revenue)
+        select new.productid, 1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0)
+        where new.productid is not null
+        on conflict (productid) do update set sales = sales + excluded.sales, units = units + excluded.units,
+                                              revenue = revenue + excluded.revenue;
+    insert into sales_by_customer (customerid, sales, units, revenue)
+        select new.customerid, 1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0)
+        where new.customerid is not null
+        on conflict (customerid) do update set sales = sales + excluded.sales, units = units + excluded.units,
+                                               revenue = revenue + excluded.revenue;
+end;
+
+create trigger summarize_changed_sale
+after update on sale
+for each row when old.unitprice is not null and session_variable('skip_summary_triggers') is null
+begin
+    update sales_daily
+        set sales = sales - 1, units = units - coalesce(old.quantity, 0),
+            revenue = revenue - coalesce(old.quantity * old.unitprice, 0)
+        where saledate = old.saledate;
+    update sales_by_product
+        set sales = sales - 1, units = units - coalesce(old.quantity, 0),
+            revenue = revenue - coalesce(old.quantity * old.unitprice, 0)
+        where productid = old.productid;
+    update sales_by_customer
+        set sales = sales - 1, units = units - coalesce(old.quantity, 0),
+            revenue = revenue - coalesce(old.quantity * old.unitprice, 0)
+        where customerid = old.customerid;
+    insert into sales_daily (saledate, sales, units, revenue)
+        select new.saledate, 1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0)
+        where new.saledate is not null
+        on conflict (saledate) do update set sales = sales + excluded.sales, units = units + excluded.units,
+                                             revenue = revenue + excluded.revenue;
+    insert into sales_by_product (productid, sales, units, revenue)
+        select new.productid, 1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0)
+        where new.productid is not null
+        on conflict (productid) do update set sales = sales + excluded.sales, units = units + excluded.units,
+                                              revenue = revenue + excluded.revenue;
+    insert into sales_by_customer (customerid, sales, units, revenue)
+        select new.customerid, 1, coalesce(new.quantity, 0), coalesce(new.quantity * new.unitprice, 0)
+        where new.customerid is not null
+        on conflict (customerid) do update set sales = sales + excluded.sales, units = units + excluded.units,
+                                               revenue = revenue + excluded.revenue;
+end;
+
+-- unlike mysql, sqlite fires this for sales deleted by a cascade as well, so
+-- deleting a customer only needs a trigger for its archived sales
+create trigger summarize_deleted_sale
+after delete on sale
+for each row when old.unitprice is not null and session_variable('skip_summary_triggers') is null
+begin
+    update sales_daily
+        set sales = sales - 1, units = units - coalesce(old.quantity, 0),
+            revenue = revenue - coalesce(old.quantity * old.unitprice, 0)
+        where saledate = old.saledate;
+    update sales_by_product
+        set sales = sales - 1, units = units - coalesce(old.quantity, 0),
+            revenue = revenue - coalesce(old.quantity * old.unitprice, 0)
+        where productid = old.productid;
+    update sales_by_customer
+        set sales = sales - 1, units = units - coalesce(old.quantity, 0),
+            revenue = revenue - coalesce(old.quantity * old.unitprice, 0)
+        where customerid = old.customerid;
+end;
+
+-- the cascades on sale, for the archived sales
+create trigger forget_customer_sales
+before delete on customer
+for each row when session_variable('skip_summary_triggers') is null
+begin
+    update sales_daily
+        set sales = sales_daily.sales - s.sales, units = sales_daily.units - s.units, revenue = sales_daily.revenue - s.revenue
+        from (select saledate, count(*) as sales, coalesce(sum(quantity), 0) as units,
+                     coalesce(sum(quantity * unitprice), 0) as revenue
+              from sale_archive where customerid = old.customerid group by saledate) as s
+        where sales_daily.saledate = s.saledate;
+    update sales_by_product
+        set sales = sales_by_product.sales - s.sales, units = sales_by_product.units - s.units, revenue = sales_by_product.revenue - s.revenue
+        from (select productid, count(*) as sales, coalesce(sum(quantity), 0) as units,
+                     coalesce(sum(quantity * unitprice), 0) as revenue
+              from sale_archive where customerid = old.customerid and productid is not null group by productid) as s
+        where sales_by_product.productid = s.productid;
+    delete from sale_archive where customerid = old.customerid;
+end;
+
+-- the same delete when the summaries are skipped. sqlite runs triggers in no
+-- set order, so the one above cannot leave it to a trigger of its own.
+create trigger forget_archived_sales
+before delete on customer
+for each row when session_variable('skip_summary_triggers') is not null
+begin
+    delete from sale_archive where customerid = old.customerid;
+end;
+
+create trigger forget_archived_product
+before delete on product
+for each row
+begin
+    update sale_archive set productid = null where productid = old.productid;
+end;
+
+-- log_change in StoreDB.sql, inline: one changeid per changed row. only one
+-- writer holds the file at a time, so changeids commit in order. bulk loads
+-- set @skip_change_log and log a single '*' row instead.
+create trigger log_supplier_insert
+after insert on supplier
+for each row when new.supplierid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('supplier', new.supplierid, connection_id());
+end;
+
+create trigger log_supplier_update
+after update on supplier
+for each row when new.supplierid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('supplier', new.supplierid, connection_id());
+end;
+
+create trigger log_supplier_delete
+after delete on supplier
+for each row when old.supplierid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('supplier', old.supplierid, connection_id());
+end;
+
+create trigger log_product_insert
+after insert on product
+for each row when new.productid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('product', new.productid, connection_id());
+end;
+
+create trigger log_product_update
+after update on product
+for each row when new.productid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('product', new.productid, connection_id());
+end;
+
+create trigger log_product_delete
+after delete on product
+for each row when old.productid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('product', old.productid, connection_id());
+end;
+
+create trigger log_sale_insert
+after insert on sale
+for each row when new.saleid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('sale', new.saleid, connection_id());
+end;
+
+create trigger log_sale_update
+after update on sale
+for each row when new.saleid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('sale', new.saleid, connection_id());
+end;
+
+create trigger log_sale_delete
+after delete on sale
+for each row when old.saleid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('sale', old.saleid, connection_id());
+end;
+
+create trigger log_customer_insert
+after insert on customer
+for each row when new.customerid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('customer', new.customerid, connection_id());
+end;
+
+create trigger log_customer_update
+after update on customer
+for each row when new.customerid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('customer', new.customerid, connection_id());
+end;
+
+create trigger log_customer_delete
+after delete on customer
+for each row when old.customerid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('customer', old.customerid, connection_id());
+end;
+
+create trigger log_stock_insert
+after insert on stock
+for each row when new.productid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('stock', new.productid, connection_id());
+end;
+
+create trigger log_stock_update
+after update on stock
+for each row when new.productid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('stock', new.productid, connection_id());
+end;
+
+create trigger log_stock_delete
+after delete on stock
+for each row when old.productid is not null
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('stock', old.productid, connection_id());
+end;
+
+create trigger log_stock_move
+after update of productid on stock
+for each row when old.productid is not new.productid
+                  and session_variable('skip_change_log') is null
+begin
+    insert into change_log (tablename, rowkey, origin) values ('stock', old.productid, connection_id());
+end;
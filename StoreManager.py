@@ -1,25 +1,48 @@
-from PyQt6.QtWidgets import QMainWindow, QApplication, QTableWidgetItem, QMessageBox, QDialog
-from PyQt6.uic import loadUi
-from PyQt6.QtCore import QSettings, Qt
-import mysql.connector
+from PyQt6.QtWidgets import QMainWindow, QApplication, QMessageBox, QDialog, QLabel, QFileDialog, QInputDialog
+from PyQt6.QtCore import Qt, QTimer, QDate, pyqtSignal
+from PyQt6.QtGui import QAction
+import os
 from datetime import datetime
 from MySQLConnectionConfigure import ConnectionDialog, check_database_connection
+from ConnectionManager import ConnectionManager
+from TableModels import StoreTableModel, SearchFilterProxyModel, INT, MONEY, DATE, TEXT
+from RefreshEngine import RefreshEngine
+from QueryExecutor import QueryExecutor
+from UiCache import load_ui
+import BulkImport
+import BulkExport
+from StoreService import StoreService, sales_conditions
+from QueryInstrumentation import QueryInstrumentation
+from DiagnosticsPanel import DiagnosticsPanel
+from ReportsTab import ReportsTab
+from LowStockTab import LowStockTab
+from ChangeWatcher import ChangeWatcher
+from PrefixCompleter import PrefixCompleter
+
+# Save dialog filters and the extension each one adds to a bare file name
+EXPORT_FILTERS = {"CSV (*.csv)": ".csv", "Parquet (*.parquet)": ".parquet", "Arrow (*.arrow *.feather)": ".arrow"}
+
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    import_progress = pyqtSignal(str)
+
+    def __init__(self, db=None):
         super().__init__()
-        # Load database configuration from config.ini
-        self.settings = QSettings("config.ini", QSettings.Format.IniFormat)
-        self.username = self.settings.value("Database/user", "")
-        self.password = self.settings.value("Database/password", "")
-        self.port = self.settings.value("Database/port", "")
+        # Shared connection pool, configured from config.ini when not given
+        self.db = db if db is not None else ConnectionManager()
 
         # Load UI file
-        loadUi("StoreManager.ui", self)
+        load_ui("StoreManager.ui", self)
 
         # Database connection
         self.setup_database_connection()
 
+        # Table models
+        self.setup_table_models()
+
+        # Order lines waiting for checkout, as (product id, quantity)
+        self.basket = []
+
         # Signals and slots
         self.pb_add_supplier.clicked.connect(self.add_supplier)
         self.pb_insert_update_product.clicked.connect(self.add_product)
@@ -27,63 +50,261 @@ class MainWindow(QMainWindow):
         self.pb_delete_product.clicked.connect(self.delete_product)
         self.pb_delete_sale.clicked.connect(self.delete_sale)
         self.pb_insert_update_sale.clicked.connect(self.add_sale)
+        self.pb_insert_update_sale.clicked.connect(self.finish_edit_sale)
         self.pb_edit_sale.clicked.connect(self.edit_sale)
         self.pb_edit_product.clicked.connect(self.edit_product)
-        self.psearch_field.textChanged.connect(self.search_products)
-        self.ssearch_field.textChanged.connect(self.search_sales)
-        self.sales_table.itemSelectionChanged.connect(self.cancel_edit_sale)
-        self.products_table.itemSelectionChanged.connect(self.cancel_edit_product)
+        self.pb_add_to_basket.clicked.connect(self.add_to_basket)
+        self.pb_checkout.clicked.connect(self.checkout)
+        self.pb_clear_basket.clicked.connect(self.clear_basket)
+        self.psearch_field.textChanged.connect(self.product_search_timer.start)
+        self.ssearch_field.textChanged.connect(self.sale_search_timer.start)
+        self.server_search_check.toggled.connect(self.search_sales)
+        self.date_range_check.toggled.connect(self.search_sales)
+        self.sdate_from.dateChanged.connect(self.sale_search_timer.start)
+        self.sdate_to.dateChanged.connect(self.sale_search_timer.start)
+        self.sales_table.selectionModel().selectionChanged.connect(self.cancel_edit_sale)
+        self.products_table.selectionModel().selectionChanged.connect(self.cancel_edit_product)
+
+        # Bulk edits act on every selected product row
+        self.products_table.setContextMenuPolicy(Qt.ContextMenuPolicy.ActionsContextMenu)
+        for label, slot in (("Adjust prices...", self.adjust_prices), ("Adjust stock...", self.adjust_stock),
+                            ("Set reorder level...", self.set_reorder_level)):
+            action = QAction(label, self.products_table)
+            action.triggered.connect(slot)
+            self.products_table.addAction(action)
 
         self.actionSave.triggered.connect(self.create_savepoint)
         self.actionRollback.triggered.connect(self.rollback_to_savepoint)
+        self.actionImport.triggered.connect(self.import_data)
+        self.actionExport.triggered.connect(self.export_data)
+        self.actionCacheStats.triggered.connect(self.show_cache_stats)
+        self.import_progress.connect(lambda message: self.statusbar.showMessage(message))
 
-        # Load initial data
-        self.reload_data()
+        # Load initial data once the window is on screen
+        QTimer.singleShot(0, self.reload_data)
 
     def setup_database_connection(self):
-        database_name = 'storedb'
-
-        # Initialize database connection
-        self.conn = mysql.connector.connect(
-            host='localhost',
-            user=self.username,
-            password=self.password,
-            port=self.port,
-            database=database_name,
-            autocommit=0
-        )
+        # The window keeps one pooled connection as its session. It runs in
+        # autocommit mode; each action is its own short unit of work.
+        # Statements are traced per action into queries.log and the
+        # diagnostics panel. With a read replica configured, a second session
+        # on it serves the lists, searches and reports.
+        if self.db.instrumentation is None:
+            self.db.instrumentation = QueryInstrumentation()
+        self.conn = self.db.session()
+        replica = self.db.read_session()
+        self.service = StoreService(self.conn, replica)
 
         if not self.conn.is_connected():
             self.statusbar.showMessage("Database connection failed.", 3000)
+        elif replica is not None:
+            self.statusbar.showMessage("Database connected successfully. Reading from a replica.", 3000)
         else:
             self.statusbar.showMessage("Database connected successfully.", 3000)
 
+        # From here on the session connection is only used on the executor's
+        # thread, so queries never block the GUI
+        self.executor = QueryExecutor(self, instrumentation=self.db.instrumentation)
+        self.executor.failed.connect(lambda message: self.statusbar.showMessage(message, 3000))
+        self.busy_label = QLabel("Working . . .")
+        self.busy_label.setVisible(False)
+        self.statusbar.addPermanentWidget(self.busy_label)
+        self.executor.busy_changed.connect(self.busy_label.setVisible)
+
+        # Imports and exports run on their own pooled connection, beside the session
+        self.import_executor = QueryExecutor(self, instrumentation=self.db.instrumentation)
+
+        self.diagnostics = DiagnosticsPanel(self.db.instrumentation, self)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.diagnostics)
+        self.diagnostics.hide()
+        self.menuMenu.addAction(self.diagnostics.toggleViewAction())
+
+    def closeEvent(self, event):
+        self.changes.stop()
+        self.import_executor.shutdown()
+        self.executor.shutdown()
+        super().closeEvent(event)
+
+    def error_reporter(self, message):
+        return lambda err: self.statusbar.showMessage(f"{message}: {err}", 3000)
+
+    def setup_table_models(self):
+        # Conditions pushed into the sales queries by the database search
+        self.sales_conditions = ([], [])
+        self.sales_window = None
+        self.sdate_to.setDate(QDate.currentDate())
+        self.sdate_from.setDate(QDate.currentDate().addDays(-30))
+
+        self.sales_model = StoreTableModel(
+            ["Sales ID", "Customer Name", "Product Name", "Quantity", "Total Costs", "Sales Date"],
+            [INT, TEXT, TEXT, INT, MONEY, DATE],
+            self.fetch_sales_page,
+            executor=self.executor,
+            parent=self
+        )
+        self.products_model = StoreTableModel(
+            ["Product ID", "Product Name", "Price", "Stock Quantity", "Stock Updated", "Supplier ID"],
+            [INT, TEXT, MONEY, INT, DATE, INT],
+            self.service.fetch_products_page,
+            key_columns=(0, 5),
+            executor=self.executor,
+            parent=self
+        )
+        self.supplier_model = StoreTableModel(
+            ["Supplier ID", "Supplier Name"],
+            [INT, TEXT],
+            self.service.fetch_suppliers_page,
+            executor=self.executor,
+            parent=self
+        )
+
+        self.sales_proxy = self.attach_model(self.sales_table, self.sales_model)
+        self.products_proxy = self.attach_model(self.products_table, self.products_model)
+        self.supplier_proxy = self.attach_model(self.supplier_table, self.supplier_model)
+
+        # Searches run once typing pauses rather than on every keystroke
+        self.product_search_timer = self.debounce_timer(self.search_products)
+        self.sale_search_timer = self.debounce_timer(self.search_sales)
+
+        self.refresh = RefreshEngine(self.tabWidget, self.executor)
+        self.refresh.register("sales", self.sales_model, self.fetch_sales_rows, self.tab_sales)
+        self.refresh.register("products", self.products_model, self.service.fetch_products_rows, self.tab_products)
+        self.refresh.register("suppliers", self.supplier_model, self.service.fetch_suppliers_rows, self.tab_products)
+
+        # Reports read the sales summaries, so they reload whenever shown
+        self.reports = ReportsTab(self.service, self.executor, self)
+        self.reports.message.connect(lambda message: self.statusbar.showMessage(message, 3000))
+        self.tabWidget.addTab(self.reports, "Reports")
+        self.tabWidget.currentChanged.connect(self.show_reports)
+
+        # The low stock watchlist follows every change to the products' stock
+        self.low_stock = LowStockTab(self.service, self.executor, self)
+        self.low_stock.message.connect(lambda message: self.statusbar.showMessage(message, 3000))
+        self.low_stock.count_changed.connect(self.show_low_stock_count)
+        self.tabWidget.addTab(self.low_stock, "Low stock")
+        self.refresh.register("low_stock", self.low_stock.model, self.service.fetch_low_stock_rows, self.low_stock)
+        self.refresh.subscribe("products", self.products_changed)
+        self.low_stock.refresh()
+
+        # Rows other terminals change are patched in as for local changes
+        self.changes = ChangeWatcher(self.service, self.executor, self.refresh, self)
+        self.changes.message.connect(lambda message: self.statusbar.showMessage(message, 3000))
+        self.changes.changed.connect(self.update_completions)
+        self.changes.start()
+
+        # Customer names and products are suggested while typing a sale
+        self.customer_completer = PrefixCompleter(self.s_cnfield, parent=self)
+        self.product_completer = PrefixCompleter(self.s_pidfield, parent=self)
+        self.load_completions()
+
+    def attach_model(self, view, model):
+        proxy = SearchFilterProxyModel(self)
+        proxy.setSourceModel(model)
+        view.setModel(proxy)
+        view.setSortingEnabled(True)
+        view.sortByColumn(0, Qt.SortOrder.AscendingOrder)
+        return proxy
+
+    def debounce_timer(self, slot, interval=200):
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(interval)
+        timer.timeout.connect(slot)
+        return timer
+
     ######################### TRANSACTION METHODS ################################
     def create_savepoint(self):
         confirmation = QMessageBox.question(self, "Create savepoint",
                                             "Create a new savepoint? This will overwrite any existing savepoint.",
                                             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if confirmation == QMessageBox.StandardButton.Yes:
-            try:
-                with self.conn.cursor() as cursor:
-                    cursor.execute(f"SAVEPOINT mysave")
-                self.statusbar.showMessage(f"Savepoint created.", 3000)
-                self.reload_data()
-            except Exception as err:
-                self.statusbar.showMessage(f"Failed to create the savepoint: {err}", 3000)
+            self.executor.submit(
+                self.service.mark_savepoint,
+                on_result=lambda _: self.statusbar.showMessage("Savepoint created.", 3000),
+                on_error=self.error_reporter("Failed to create the savepoint")
+            )
 
     def rollback_to_savepoint(self):
         confirmation = QMessageBox.question(self, "Rollback to savepoint",
                                             "Rollback to savepoint? changes made will disappear.",
                                             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if confirmation == QMessageBox.StandardButton.Yes:
-            try:
-                with self.conn.cursor() as cursor:
-                    cursor.execute("ROLLBACK to mysave")
-                self.statusbar.showMessage("Rolled back to savepoint.", 3000)
-                self.reload_data()
-            except mysql.connector.Error as err:
-                self.statusbar.showMessage(f"Error rolling back to savepoint: {err}", 3000)
+            self.executor.submit(
+                self.service.rollback_to_savepoint,
+                on_result=self.rolled_back,
+                on_error=self.error_reporter("Error rolling back to savepoint")
+            )
+
+    def rolled_back(self, undone):
+        self.statusbar.showMessage(f"Rolled back to savepoint: {len(undone)} actions undone.", 3000)
+        # Any row may have changed since the savepoint
+        self.refresh.invalidate_all()
+        self.load_completions()
+
+    ######################### IMPORT METHODS ################################
+    def import_data(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import", "", "Data files (*.csv *.json *.jsonl *.ndjson)")
+        if not path:
+            return
+        kind, accepted = QInputDialog.getItem(self, "Import", "Import the file as:", BulkImport.KINDS, 0, False)
+        if not accepted:
+            return
+
+        self.statusbar.showMessage(f"Importing {kind} . . .")
+        self.import_executor.submit(
+            self.run_import, kind, path,
+            on_result=self.import_finished,
+            on_error=self.error_reporter("Import failed")
+        )
+
+    def run_import(self, kind, path):
+        def progress(report):
+            self.import_progress.emit(
+                f"Importing {kind}: {report.rows_ok + report.rows_failed} rows, {report.rows_per_sec:,.0f} rows/sec"
+            )
+
+        with self.db.connection() as connection:
+            # Logged as this terminal's change, which import_finished reloads
+            return BulkImport.import_file(connection, kind, path, progress=progress, origin=self.service.origin)
+
+    def import_finished(self, report):
+        self.statusbar.showMessage(report.summary(), 5000)
+        self.service.clear_caches()
+        if report.errors:
+            details = "\n".join(f"Line {line}: {message}" for line, message in report.errors[:50])
+            QMessageBox.warning(self, "Import", f"{report.summary()}\n\n{details}")
+        self.refresh.invalidate_all()
+        # Imported customers and products are offered from now on
+        self.load_completions()
+
+    def export_data(self):
+        kind, accepted = QInputDialog.getItem(self, "Export", "Export:", BulkExport.KINDS, 0, False)
+        if not accepted:
+            return
+        path, selected = QFileDialog.getSaveFileName(self, "Export", f"{kind}.csv", ";;".join(EXPORT_FILTERS))
+        if not path:
+            return
+        if not os.path.splitext(path)[1]:
+            path += EXPORT_FILTERS.get(selected, ".csv")
+
+        # Sales follow the date range of the Sales tab when it is switched on
+        conditions = ([], [])
+        if kind == "sales" and self.date_range_check.isChecked():
+            conditions = BulkExport.sales_filter(self.sdate_from.date().toPyDate(), self.sdate_to.date().toPyDate())
+
+        self.statusbar.showMessage(f"Exporting {kind} . . .")
+        self.import_executor.submit(
+            self.run_export, kind, path, conditions,
+            on_result=lambda report: self.statusbar.showMessage(report.summary(), 5000),
+            on_error=self.error_reporter("Export failed")
+        )
+
+    def run_export(self, kind, path, conditions):
+        def progress(report):
+            self.import_progress.emit(f"Exporting {kind}: {report.rows} rows, {report.rows_per_sec:,.0f} rows/sec")
+
+        with self.db.read_connection() as connection:
+            return BulkExport.export_file(connection, kind, path, conditions=conditions, progress=progress)
 
     ######################### EDIT METHODS ##############################
     def edit_sale(self):
@@ -91,31 +312,26 @@ class MainWindow(QMainWindow):
         if self.pb_insert_update_sale.text() == "Update":
             self.cancel_edit_sale()
         else:
-            selected_row = self.sales_table.currentRow()
+            selected = self.selected_values(self.sales_table)
 
-            if selected_row == -1:
+            if selected is None:
                 QMessageBox.warning(self, "Warning", "Please select a sale to edit.")
                 return
 
             # Data from the selected row
-            sale_id_item = self.sales_table.item(selected_row, 0)
-            customer_name_item = self.sales_table.item(selected_row, 1)
-            product_name_item = self.sales_table.item(selected_row, 2)
-            quantity_item = self.sales_table.item(selected_row, 3)
+            sale_id, customer_name, product_name, quantity = selected[:4]
 
-            if None in (sale_id_item, customer_name_item, product_name_item, quantity_item):
+            if None in (sale_id, customer_name, product_name, quantity):
                 QMessageBox.warning(self, "Warning", "Unable to retrieve sale information.")
                 return
 
-            sale_id = int(sale_id_item.text())
-            customer_name = customer_name_item.text()
-            product_name = product_name_item.text()
-            quantity = int(quantity_item.text())
-
             # Populating the fields with the selected data
             self.s_cnfield.setText(customer_name)
-            product_id = self.get_product_id_by_name(product_name)
-            self.s_pidfield.setText(str(product_id))
+            self.executor.submit(
+                self.service.get_product_id_by_name, product_name,
+                on_result=lambda product_id: self.show_sale_product(product_name, product_id),
+                on_error=self.error_reporter("Failed to look up the product")
+            )
             self.s_pqfield.setText(str(quantity))
             self.s_sidfield.setText(str(sale_id))
 
@@ -123,7 +339,15 @@ class MainWindow(QMainWindow):
             self.pb_edit_sale.setText("Cancel Edit")
             self.pb_delete_sale.setEnabled(False)
 
-            self.pb_insert_update_sale.clicked.connect(self.cancel_edit_sale)
+    def show_sale_product(self, product_name, product_id):
+        if product_id is None:
+            QMessageBox.warning(self, "Warning", f"Product '{product_name} not found.")
+        self.s_pidfield.setText(str(product_id))
+
+    def finish_edit_sale(self):
+        # Runs after add_sale: Update saves the edit and leaves edit mode
+        if self.pb_insert_update_sale.text() == "Update":
+            self.cancel_edit_sale()
 
     def cancel_edit_sale(self):
         self.clear_sale()
@@ -135,28 +359,18 @@ class MainWindow(QMainWindow):
         if self.pb_insert_update_product.text() == "Update":
             self.cancel_edit_product()
         else:
-            selected_row = self.products_table.currentRow()
+            selected = self.selected_values(self.products_table)
 
-            if selected_row == -1:
+            if selected is None:
                 QMessageBox.warning(self, "Warning", "Please select a product to edit.")
                 return
 
             # Get the data from the selected row
-            product_id_item = self.products_table.item(selected_row, 0)
-            product_name_item = self.products_table.item(selected_row, 1)
-            price_item = self.products_table.item(selected_row, 2)
-            stock_quantity_item = self.products_table.item(selected_row, 3)
-            supplier_id_item = self.products_table.item(selected_row, 5)
-            if None in (product_id_item, product_name_item, price_item, stock_quantity_item, supplier_id_item):
+            product_id, product_name, price, stock_quantity, _, supplier_id = selected
+            if None in (product_id, product_name, price, stock_quantity, supplier_id):
                 QMessageBox.warning(self, "Warning", "Unable to retrieve product information.")
                 return
 
-            product_id = int(product_id_item.text())
-            product_name = product_name_item.text()
-            price = float(price_item.text())
-            stock_quantity = int(stock_quantity_item.text())
-            supplier_id = int(supplier_id_item.text())
-
             self.pidfield.setText(str(product_id))
             self.sidfield.setText(str(supplier_id))
             self.pnamefield.setText(product_name)
@@ -178,77 +392,175 @@ class MainWindow(QMainWindow):
 
     ######## UTILITY METHODS #####################
 
-    def sorting_enable(self):
-        self.sales_table.setSortingEnabled(True)
-        self.products_table.setSortingEnabled(True)
-        self.supplier_table.setSortingEnabled(True)
-
-    def sorting_disable(self):
-        self.sales_table.setSortingEnabled(False)
-        self.products_table.setSortingEnabled(False)
-        self.supplier_table.setSortingEnabled(False)
+    def selected_values(self, view):
+        # Raw values of the selected row, read from the model behind the proxy
+        index = view.currentIndex()
+        if not index.isValid():
+            return None
+        proxy = view.model()
+        source_row = proxy.mapToSource(index).row()
+        return proxy.sourceModel().row_values(source_row)
+
+    def selected_rows(self, view):
+        # Raw values of every selected row, in view order
+        proxy = view.model()
+        rows = sorted(view.selectionModel().selectedRows(), key=lambda index: index.row())
+        return [proxy.sourceModel().row_values(proxy.mapToSource(index).row()) for index in rows]
+
+    def selected_ids(self, view):
+        # Distinct ids (first column) of the selected rows
+        return list(dict.fromkeys(values[0] for values in self.selected_rows(view) if values[0] is not None))
 
     def reload_data(self):
-        self.sorting_disable()
         self.load_sales()
         self.load_products()
         self.load_suppliers()
-        self.sorting_enable()
 
-    def get_product_id_by_name(self, product_name):
-        with self.conn.cursor() as cursor:
-            query = "SELECT productid FROM product WHERE name = %s"
-            cursor.execute(query, (product_name,))
-            result = cursor.fetchone()
+    def show_reports(self, index):
+        if self.tabWidget.widget(index) is self.reports:
+            self.reports.refresh()
+
+    def products_changed(self, product_ids):
+        if product_ids is None:
+            self.refresh.invalidate("low_stock")
+        else:
+            self.refresh.touch("low_stock", product_ids)
+        self.low_stock.count_timer.start()
+
+    def show_low_stock_count(self, count):
+        index = self.tabWidget.indexOf(self.low_stock)
+        self.tabWidget.setTabText(index, f"Low stock ({count})" if count else "Low stock")
+
+    def show_cache_stats(self):
+        QMessageBox.information(self, "Lookup caches",
+                                f"{self.service.customer_ids.describe()}\n{self.service.product_ids.describe()}\n"
+                                f"{self.service.statements.describe()}")
+
+    ####################### COMPLETION METHODS ###########################
+    # Both indexes are read once, then kept current from the rows this
+    # window writes and the changes of other terminals
+
+    def load_completions(self):
+        self.load_customer_completions()
+        self.executor.submit(
+            self.service.fetch_product_names,
+            on_result=self.load_product_completions,
+            on_error=self.error_reporter("Failed to load product names"),
+            key=("completions", "products")
+        )
+
+    def load_customer_completions(self):
+        self.executor.submit(
+            self.service.fetch_customer_names,
+            on_result=lambda rows: self.customer_completer.index.load(
+                (customer_id, name, name, name) for customer_id, name in rows
+            ),
+            on_error=self.error_reporter("Failed to load customer names"),
+            key=("completions", "customers")
+        )
+
+    def product_completions(self, rows):
+        # A product is found by its name or its id; either way the id is
+        # what goes into the field
+        for product_id, name in rows:
+            yield product_id, name, f"{name} (#{product_id})", str(product_id)
+            yield product_id, str(product_id), f"#{product_id} {name}", str(product_id)
+
+    def load_product_completions(self, rows):
+        self.product_completer.index.load(self.product_completions(rows))
+
+    def refresh_product_completions(self, product_ids):
+        # Re-reads the names of added, renamed or deleted products
+        product_ids = list(product_ids)
+        if product_ids:
+            self.executor.submit(
+                self.service.fetch_product_names, product_ids,
+                on_result=lambda rows: self.patch_product_completions(product_ids, rows),
+                on_error=self.error_reporter("Failed to load product names")
+            )
+
+    def patch_product_completions(self, product_ids, rows):
+        index = self.product_completer.index
+        for product_id in product_ids:
+            index.remove(product_id)
+        for entry in self.product_completions(rows):
+            index.add(*entry)
+
+    def refresh_customer_completions(self, customer_ids):
+        # Re-reads the names of added, renamed or deleted customers
+        customer_ids = list(customer_ids)
+        if customer_ids:
+            self.executor.submit(
+                self.service.fetch_customer_names, customer_ids,
+                on_result=lambda rows: self.patch_customer_completions(customer_ids, rows),
+                on_error=self.error_reporter("Failed to load customer names")
+            )
+
+    def patch_customer_completions(self, customer_ids, rows):
+        index = self.customer_completer.index
+        for customer_id in customer_ids:
+            index.remove(customer_id)
+        for customer_id, name in rows:
+            index.add(customer_id, name, name, name)
+
+    def add_customer_completion(self, name):
+        # The id of a customer added here is not known to the window, so the
+        # name stands in as the key until the next full load
+        index = self.customer_completer.index
+        index.remove(name)
+        index.add(name, name, name, name)
+
+    def update_completions(self, changes):
+        if changes is None:
+            self.load_completions()
+            return
+        if "customer" in changes:
+            self.refresh_customer_completions(changes["customer"])
+        if "product" in changes:
+            self.refresh_product_completions(changes["product"])
 
-            if result:
-                return result[0]
-            else:
-                QMessageBox.warning(self, "Warning", f"Product '{product_name} not found.")
-                return None
     ####################### SEARCH METHODS  ###########################
 
     def search_products(self):
-        search_text = self.psearch_field.text().lower()
-        self.products_table.setSortingEnabled(False)
-        for row in range(self.products_table.rowCount()):
-            row_hidden = all(
-                search_text not in self.products_table.item(row, col).text().lower()
-                for col in range(self.products_table.columnCount())
-            )
-            self.products_table.setRowHidden(row, row_hidden)
-        self.products_table.setSortingEnabled(True)
+        self.products_proxy.set_search_text(self.psearch_field.text())
 
     def search_sales(self):
-        search_text = self.ssearch_field.text().lower()
-        self.sales_table.setSortingEnabled(False)
-        for row in range(self.sales_table.rowCount()):
-            row_hidden = all(
-                search_text not in self.sales_table.item(row, col).text().lower()
-                for col in range(self.sales_table.columnCount())
-            )
-            self.sales_table.setRowHidden(row, row_hidden)
-        self.sales_table.setSortingEnabled(True)
+        search_text = self.ssearch_field.text()
+        server_side = self.server_search_check.isChecked()
+
+        # The date range reads the live and archived sales of those days only
+        window = None
+        if self.date_range_check.isChecked():
+            window = (self.sdate_from.date().toPyDate(), self.sdate_to.date().toPyDate())
+        conditions = sales_conditions(search_text if server_side else "")
+
+        if conditions != self.sales_conditions or window != self.sales_window:
+            # The database filters the whole table; results arrive page by page
+            self.sales_conditions = conditions
+            self.sales_window = window
+            self.load_sales()
+
+        self.sales_proxy.set_search_text("" if server_side else search_text)
+        if not server_side and search_text and not self.sales_model.fully_loaded():
+            # The search covers every sale, so the rest are being loaded
+            self.statusbar.showMessage("Loading every sale to search them; tick Search database to search "
+                                       "in the database instead.", 3000)
     ####################### ADD TO DATABASE METHODS #################
 
     def add_supplier(self):
-        cursor = self.conn.cursor()
         supplier_name = self.sfield.text()
+        self.executor.submit(
+            self.service.insert_supplier, supplier_name,
+            on_result=self.supplier_added,
+            on_error=self.error_reporter("Failed to add supplier")
+        )
 
-        try:
-            cursor.execute("INSERT INTO supplier (name) VALUES (%s)", (supplier_name,))
-            # self.conn.commit()
-            self.statusbar.showMessage("Supplier added successfully.", 3000)
-            self.sfield.clear()
-            self.reload_data()
-        except mysql.connector.Error as err:
-            self.statusbar.showMessage(f"Failed to add supplier: {err}", 3000)
-        finally:
-            cursor.close()
+    def supplier_added(self, supplier_id):
+        self.statusbar.showMessage("Supplier added successfully.", 3000)
+        self.sfield.clear()
+        self.refresh.touch("suppliers", [supplier_id])
 
     def add_product(self):
-        cursor = self.conn.cursor()
-
         product_id_text = self.pidfield.text()
         supplier_id_text = self.sidfield.text()
         product_name = self.pnamefield.text()
@@ -265,56 +577,31 @@ class MainWindow(QMainWindow):
             stock_quantity = int(stock_quantity_text.strip())
 
             if self.pb_insert_update_product.text() == "Add Product":
-                # Inserting new product
-                cursor.execute(
-                    "INSERT INTO product (name, price) VALUES (%s, %s)",
-                    (product_name, price)
-                )
-                product_id = cursor.lastrowid
-                self.statusbar.showMessage("Product added successfully.", 3000)
+                product_id = None
             else:
-                # Updating existing product
                 product_id = int(product_id_text)
-                cursor.execute(
-                    "UPDATE product SET name = %s, price = %s WHERE productid = %s",
-                    (product_name, price, product_id)
-                )
-                self.statusbar.showMessage("Product updated successfully.", 3000)
-
-            # Checking if the stock entry already exists
-            cursor.execute(
-                "SELECT productid, supplierid FROM stock WHERE productid = %s AND supplierid = %s",
-                (product_id, supplier_id)
-            )
-            result = cursor.fetchone()
-
-            if result:
-                # Updating existing stock entry
-                cursor.execute(
-                    "UPDATE stock SET quantity = %s, purchasedate = CURRENT_DATE(), supplierid = %s WHERE productid = %s AND supplierid = %s",
-                    (stock_quantity, supplier_id, product_id, supplier_id)
-                )
-            else:
-                # Inserting new stock entry
-                cursor.execute(
-                    "INSERT INTO stock (productid, supplierid, quantity) VALUES (%s, %s, %s)",
-                    (product_id, supplier_id, stock_quantity)
-                )
-
-            # self.conn.commit()
-            self.clear_product()
-            self.load_products()
-
         except ValueError as Verr:
             self.statusbar.showMessage(f"Invalid input. Please enter valid values.{Verr}", 3000)
-        except mysql.connector.Error as err:
-            self.statusbar.showMessage(f"Failed to add/update product: {err}", 3000)
-        finally:
-            cursor.close()
+            return
 
-    def add_sale(self):
-        cursor = self.conn.cursor()
+        self.executor.submit(
+            self.service.save_product, product_id, supplier_id, product_name, price, stock_quantity,
+            on_result=lambda saved_id: self.product_saved(saved_id, product_id is None),
+            on_error=self.error_reporter("Failed to add/update product")
+        )
 
+    def product_saved(self, product_id, inserted):
+        if inserted:
+            self.statusbar.showMessage("Product added successfully.", 3000)
+        else:
+            self.statusbar.showMessage("Product updated successfully.", 3000)
+            # Sales rows show the product name and price
+            self.refresh.invalidate("sales")
+        self.clear_product()
+        self.refresh.touch("products", [product_id])
+        self.refresh_product_completions([product_id])
+
+    def add_sale(self):
         product_id_text = self.s_pidfield.text()
         customer_name = self.s_cnfield.text()
         quantity_text = self.s_pqfield.text()
@@ -326,51 +613,109 @@ class MainWindow(QMainWindow):
         try:
             product_id = int(product_id_text)
             quantity = int(quantity_text)
+        except ValueError:
+            self.statusbar.showMessage("Invalid numeric input. Please enter valid numbers.", 3000)
+            return
 
-            # Checking if the customer already exists
-            cursor.execute("SELECT customerid FROM customer WHERE name = %s", (customer_name,))
-            result = cursor.fetchone()
+        if self.pb_insert_update_sale.text() == "Insert":
+            sale_id = None
+        elif self.pb_insert_update_sale.text() == "Update":
+            selected = self.selected_values(self.sales_table)
+            if selected is None:
+                self.statusbar.showMessage("Please select a sale to update.", 3000)
+                return
 
-            if result:
-                # Customer exists, get the customer ID
-                customer_id = result[0]
-            else:
-                # Customer doesn't exist, add the customer
-                cursor.execute("INSERT INTO customer (name) VALUES (%s)", (customer_name,))
-                # self.conn.commit()
-                self.statusbar.showMessage("Customer not found, new customer added successfully.", 3000)
-                # Get the customer ID of the added customer
-                customer_id = cursor.lastrowid
-
-            if self.pb_insert_update_sale.text() == "Insert":
-                cursor.callproc("makepurchase", (customer_id, product_id, quantity))
-                self.statusbar.showMessage("Sale added successfully.", 3000)
-            elif self.pb_insert_update_sale.text() == "Update":
-                selected_row = self.sales_table.currentRow()
-                if selected_row == -1:
-                    self.statusbar.showMessage("Please select a sale to update.", 3000)
-                    return
-
-                sale_id_item = self.sales_table.item(selected_row, 0)
-                if sale_id_item is None:
-                    self.statusbar.showMessage("Unable to retrieve sale information.", 3000)
-                    return
-
-                sale_id = int(sale_id_item.text())
-
-                cursor.callproc("updatesale", (customer_id, product_id, quantity, sale_id))
-                self.statusbar.showMessage("Sale updated successfully.", 3000)
-
-            # self.conn.commit()
-            self.clear_sale()
-            self.reload_data()
+            sale_id = selected[0]
+            if sale_id is None:
+                self.statusbar.showMessage("Unable to retrieve sale information.", 3000)
+                return
+        else:
+            return
+
+        self.executor.submit(
+            self.service.save_sale, customer_name, product_id, quantity, sale_id,
+            on_result=lambda result: self.sale_saved(*result, inserted=sale_id is None, customer_name=customer_name),
+            on_error=self.error_reporter("Failed to add/update sale")
+        )
+
+    def sale_saved(self, sale_id, touched_products, customer_added, inserted, customer_name):
+        message = "Sale added successfully." if inserted else "Sale updated successfully."
+        if customer_added:
+            message += " Customer not found, new customer added successfully."
+            self.add_customer_completion(customer_name)
+        self.statusbar.showMessage(message, 3000)
+        self.clear_sale()
+        self.refresh.touch("sales", [sale_id])
+        self.refresh.touch("products", touched_products)
+
+    ####################### BASKET METHODS #################
+
+    def add_to_basket(self):
+        product_id_text = self.s_pidfield.text()
+        quantity_text = self.s_pqfield.text()
+
+        if not product_id_text or not quantity_text:
+            self.statusbar.showMessage("Please fill in the product ID and quantity.", 3000)
+            return
 
+        try:
+            product_id = int(product_id_text)
+            quantity = int(quantity_text)
         except ValueError:
             self.statusbar.showMessage("Invalid numeric input. Please enter valid numbers.", 3000)
-        except mysql.connector.Error as err:
-            self.statusbar.showMessage(f"Failed to add/update sale: {err}", 3000)
-        finally:
-            cursor.close()
+            return
+
+        self.basket.append((product_id, quantity))
+        self.s_pidfield.clear()
+        self.s_pqfield.clear()
+        self.update_basket_label()
+
+    def clear_basket(self):
+        self.basket = []
+        self.update_basket_label()
+
+    def update_basket_label(self):
+        if not self.basket:
+            self.basket_label.setText("Basket is empty")
+            return
+        lines = ", ".join(f"#{product_id} x {quantity}" for product_id, quantity in self.basket)
+        self.basket_label.setText(f"Basket ({len(self.basket)}): {lines}")
+        self.basket_label.setToolTip(lines)
+
+    def checkout(self):
+        customer_name = self.s_cnfield.text()
+
+        if not customer_name:
+            self.statusbar.showMessage("Please fill in the customer name.", 3000)
+            return
+        if not self.basket:
+            self.statusbar.showMessage("The basket is empty.", 3000)
+            return
+
+        items = [{"productid": product_id, "quantity": quantity} for product_id, quantity in self.basket]
+        self.executor.submit(
+            self.service.place_order, customer_name, items,
+            on_result=lambda lines: self.order_placed(lines, customer_name),
+            on_error=self.error_reporter("Failed to place the order")
+        )
+
+    def order_placed(self, lines, customer_name):
+        failed = [line for line in lines if line[4] != "ok"]
+        if failed:
+            details = "\n".join(
+                f"Line {line}: product {product_id} x {quantity} - {status} (available: {available})"
+                for line, product_id, quantity, available, status, _ in failed
+            )
+            QMessageBox.warning(self, "Order not placed", f"Nothing was sold:\n\n{details}")
+            return
+
+        self.statusbar.showMessage(f"Order placed: {len(lines)} sales added successfully.", 3000)
+        # The order may have added the customer
+        self.add_customer_completion(customer_name)
+        self.clear_basket()
+        self.clear_sale()
+        self.refresh.touch("sales", [line[5] for line in lines])
+        self.refresh.touch("products", [line[1] for line in lines])
 
     ############################# FIELD CLEAR METHODS ############################
 
@@ -389,162 +734,160 @@ class MainWindow(QMainWindow):
     ###################### LOAD AND POPULATE TABLE METHODS  #############
 
     def load_suppliers(self):
-        cursor = self.conn.cursor(dictionary=True)
-        cursor.execute("SELECT supplierid, name FROM supplier order by supplierid")
-        self.supplier_table.setRowCount(0)
-
-        for row_position, row in enumerate(cursor.fetchall()):
-            self.supplier_table.insertRow(row_position)
-            self.supplier_table.setItem(row_position, 0, QTableWidgetItem(str(row['supplierid'])))
-            self.supplier_table.setItem(row_position, 1, QTableWidgetItem(row['name']))
-
-        cursor.close()
+        self.supplier_model.reload()
 
     def load_products(self):
-        self.products_table.setRowCount(0)
-
-        query = """
-                SELECT p.productid, p.name, p.price, s.quantity, s.purchasedate, su.supplierid
-                    FROM product p
-                    JOIN stock s ON p.productid = s.productid
-                    JOIN supplier su ON s.supplierid = su.supplierid
-                    order by p.productid
-                """
-        with self.conn.cursor() as cursor:
-            cursor.execute(query)
-            result = cursor.fetchall()
-            self.products_table.setRowCount(0)
-            for row_position, row_data in enumerate(result):
-                self.products_table.insertRow(row_position)
-
-                for column_position, column_value in enumerate(row_data):
-                    self.products_table.setItem(row_position, column_position, QTableWidgetItem(str(column_value)))
+        self.products_model.reload()
 
     def load_sales(self):
-        query = """
-                    SELECT
-                        saleid,
-                        customer.name as customer_name,
-                        product.name as product_name,
-                        quantity,
-                        quantity * price as total_cost,
-                        saledate
-                    FROM
-                        sale
-                    INNER JOIN
-                        customer ON sale.customerid = customer.customerid
-                    INNER JOIN
-                        product ON sale.productid = product.productid
-                    order by saleid
-                """
-        self.sales_table.setRowCount(0)
-        with self.conn.cursor() as cursor:
-            cursor.execute(query)
-            result = cursor.fetchall()
-            for row_position, data in enumerate(result):
-                self.sales_table.insertRow(row_position)
-                self.sales_table.setItem(row_position, 0, QTableWidgetItem(str(data[0])))
-                self.sales_table.setItem(row_position, 1, QTableWidgetItem(data[1]))
-                self.sales_table.setItem(row_position, 2, QTableWidgetItem(data[2]))
-                self.sales_table.setItem(row_position, 3, QTableWidgetItem(str(data[3])))
-                self.sales_table.setItem(row_position, 4, QTableWidgetItem(str(data[4])))
-                self.sales_table.setItem(row_position, 5, QTableWidgetItem(str(data[5])))
-
-    ####### DELETE METHODS  #################
-    def delete_supplier(self):
-        selected_row = self.supplier_table.currentRow()
-        if selected_row == -1:
-            QMessageBox.warning(self, "Warning", "Please select a supplier to delete.")
-            return
+        self.sales_model.reload()
 
-        supplier_id_item = self.supplier_table.item(selected_row, 0)
-        if supplier_id_item is None:
-            QMessageBox.warning(self, "Warning", "Unable to retrieve supplier information.")
-            return
+    def fetch_sales_page(self, after_key, limit):
+        return self.service.fetch_sales_page(after_key, limit, self.sales_conditions, self.sales_window)
 
-        supplier_id = int(supplier_id_item.text())
+    def fetch_sales_rows(self, sale_ids):
+        # Patched rows that no longer match the database search drop out
+        return self.service.fetch_sales_rows(sale_ids, self.sales_conditions, self.sales_window)
 
-        reply = QMessageBox.question(self, "Confirmation", f"Do you want to delete supplier ID {supplier_id}?",
+    ####### DELETE METHODS  #################
+    def confirm_delete(self, noun, ids):
+        if len(ids) == 1:
+            question = f"Do you want to delete {noun} ID {ids[0]}?"
+        else:
+            question = f"Do you want to delete these {len(ids)} {noun}s?"
+        reply = QMessageBox.question(self, "Confirmation", question,
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        return reply == QMessageBox.StandardButton.Yes
 
-        if reply == QMessageBox.StandardButton.Yes:
-            try:
-                cursor = self.conn.cursor()
-                delete_query = "DELETE FROM supplier WHERE supplierid = %s"
-                cursor.execute(delete_query, (supplier_id,))
-                # self.conn.commit()
-                self.statusbar.showMessage(f"Supplier ID {supplier_id} deleted successfully.", 3000)
-                self.reload_data()
+    def deleted_message(self, noun, ids):
+        if len(ids) == 1:
+            return f"{noun.capitalize()} ID {ids[0]} deleted successfully."
+        return f"{len(ids)} {noun}s deleted successfully."
 
-            except mysql.connector.Error as err:
-                self.statusbar.showMessage(f"Failed to delete supplier ID {supplier_id}. Error: {err}", 3000)
+    def delete_supplier(self):
+        supplier_ids = self.selected_ids(self.supplier_table)
+        if not supplier_ids:
+            QMessageBox.warning(self, "Warning", "Please select a supplier to delete.")
+            return
 
-            finally:
-                cursor.close()
+        if self.confirm_delete("supplier", supplier_ids):
+            self.executor.submit(
+                self.service.remove_suppliers, supplier_ids,
+                on_result=lambda product_ids: self.suppliers_deleted(supplier_ids, product_ids),
+                on_error=self.error_reporter("Failed to delete the suppliers. Error")
+            )
 
-        else:
-            pass
+    def suppliers_deleted(self, supplier_ids, product_ids):
+        self.statusbar.showMessage(self.deleted_message("supplier", supplier_ids), 3000)
+        self.refresh.touch("suppliers", supplier_ids)
+        self.refresh.touch("products", product_ids)
+        self.refresh_product_completions(product_ids)
 
     def delete_product(self):
-        selected_row = self.products_table.currentRow()
-        if selected_row == -1:
+        product_ids = self.selected_ids(self.products_table)
+        if not product_ids:
             QMessageBox.warning(self, "Warning", "Please select a product to delete.")
             return
 
-        product_id_item = self.products_table.item(selected_row, 0)
-        if product_id_item is None:
-            QMessageBox.warning(self, "Warning", "Unable to retrieve product information.")
+        if self.confirm_delete("product", product_ids):
+            self.executor.submit(
+                self.service.remove_products, product_ids,
+                on_result=lambda sale_ids: self.products_deleted(product_ids, sale_ids),
+                on_error=self.error_reporter("Failed to delete the products")
+            )
+
+    def products_deleted(self, product_ids, sale_ids):
+        self.statusbar.showMessage(self.deleted_message("product", product_ids), 3000)
+        self.refresh.touch("products", product_ids)
+        self.refresh.touch("sales", sale_ids)
+        for product_id in product_ids:
+            self.product_completer.index.remove(product_id)
+
+    def delete_sale(self):
+        sale_ids = self.selected_ids(self.sales_table)
+        if not sale_ids:
+            self.statusbar.showMessage("Please select a sale to delete.", 3000)
             return
 
-        product_id = int(product_id_item.text())
+        if self.confirm_delete("sale", sale_ids):
+            self.executor.submit(
+                self.service.remove_sales, sale_ids,
+                on_result=lambda _: self.sales_deleted(sale_ids),
+                on_error=self.error_reporter("Failed to delete the sales")
+            )
 
-        reply = QMessageBox.question(self, "Confirmation", f"Do you want to delete product ID {product_id}?",
-                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+    def sales_deleted(self, sale_ids):
+        self.statusbar.showMessage(self.deleted_message("sale", sale_ids), 3000)
+        self.refresh.touch("sales", sale_ids)
 
-        if reply == QMessageBox.StandardButton.Yes:
-            cursor = self.conn.cursor()
-            try:
-                cursor.execute("DELETE FROM product WHERE productid = %s", (product_id,))
-                # self.conn.commit()
-                self.statusbar.showMessage(f"Product ID {product_id} deleted successfully.", 3000)
-                self.reload_data()
-            except mysql.connector.Error as err:
-                self.statusbar.showMessage(f"Failed to delete product ID {product_id}: {err}", 3000)
-            finally:
-                cursor.close()
-        else:
-            pass
+    ####### BULK EDIT METHODS  #################
+    def adjust_prices(self):
+        product_ids = self.selected_ids(self.products_table)
+        if not product_ids:
+            self.statusbar.showMessage("Please select the products to reprice.", 3000)
+            return
+        percent, accepted = QInputDialog.getDouble(
+            self, "Adjust prices", f"Change the price of {len(product_ids)} products by (%):", 0, -99, 1000, 2
+        )
+        if not accepted or not percent:
+            return
 
-    def delete_sale(self):
-        selected_row = self.sales_table.currentRow()
+        self.executor.submit(
+            self.service.adjust_prices, product_ids, percent,
+            on_result=lambda _: self.prices_adjusted(product_ids),
+            on_error=self.error_reporter("Failed to adjust the prices")
+        )
 
-        if selected_row == -1:
-            self.statusbar.showMessage("Please select a sale to delete.", 3000)
+    def prices_adjusted(self, product_ids):
+        self.statusbar.showMessage(f"Prices of {len(product_ids)} products adjusted.", 3000)
+        self.refresh.touch("products", product_ids)
+        # Sales rows show the product price
+        self.refresh.invalidate("sales")
+
+    def adjust_stock(self):
+        # Stock rows are per product and supplier
+        stock_keys = sorted({(values[0], values[5]) for values in self.selected_rows(self.products_table)})
+        if not stock_keys:
+            self.statusbar.showMessage("Please select the stock rows to adjust.", 3000)
             return
-        sale_id_item = self.sales_table.item(selected_row, 0)
-        if sale_id_item is None:
-            self.statusbar.showMessage("Unable to retrieve sale information.", 3000)
+        delta, accepted = QInputDialog.getInt(
+            self, "Adjust stock", f"Add to the stock of {len(stock_keys)} rows (negative to take away):",
+            0, -1000000, 1000000
+        )
+        if not accepted or not delta:
             return
 
-        sale_id = int(sale_id_item.text())
+        self.executor.submit(
+            self.service.adjust_stock, stock_keys, delta,
+            on_result=lambda _: self.stock_adjusted(stock_keys),
+            on_error=self.error_reporter("Failed to adjust the stock")
+        )
 
-        # Confirm deletion message box
-        reply = QMessageBox.question(self, "Confirmation", f"Do you want to delete sale ID {sale_id}?",
-                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+    def stock_adjusted(self, stock_keys):
+        self.statusbar.showMessage(f"Stock of {len(stock_keys)} rows adjusted.", 3000)
+        self.refresh.touch("products", [product_id for product_id, supplier_id in stock_keys])
 
-        if reply == QMessageBox.StandardButton.Yes:
-            try:
-                cursor = self.conn.cursor()
-                cursor.execute("DELETE FROM sale WHERE saleid = %s", (sale_id,))
-                # self.conn.commit()
-                self.statusbar.showMessage(f"Sale ID {sale_id} deleted successfully.", 3000)
-                self.reload_data()
-            except mysql.connector.Error as err:
-                self.statusbar.showMessage(f"Failed to delete sale ID {sale_id}: {err}", 3000)
-            finally:
-                cursor.close()
-        else:
-            pass
+    def set_reorder_level(self):
+        product_ids = self.selected_ids(self.products_table)
+        if not product_ids:
+            self.statusbar.showMessage("Please select the products to set a reorder level for.", 3000)
+            return
+        level, accepted = QInputDialog.getInt(
+            self, "Set reorder level",
+            f"List {len(product_ids)} products as low when their stock falls to (0 to never):", 0, 0, 1000000
+        )
+        if not accepted:
+            return
+
+        self.executor.submit(
+            self.service.set_reorder_levels, product_ids, level,
+            on_result=lambda _: self.reorder_levels_set(product_ids),
+            on_error=self.error_reporter("Failed to set the reorder levels")
+        )
+
+    def reorder_levels_set(self, product_ids):
+        self.statusbar.showMessage(f"Reorder level of {len(product_ids)} products set.", 3000)
+        self.refresh.touch("products", product_ids)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,772 @@
+import json
+import re
+import time
+from contextlib import contextmanager
+from LookupCache import LookupCache
+from StatementCache import StatementCache
+from UnitOfWork import UnitOfWork, UndoJournal
+
+SUPPLIERS_QUERY = "SELECT supplierid, name FROM supplier"
+
+PRODUCTS_QUERY = """
+                SELECT p.productid, p.name, p.price, s.quantity, s.purchasedate, su.supplierid
+                    FROM product p
+                    JOIN stock s ON p.productid = s.productid
+                    JOIN supplier su ON s.supplierid = su.supplierid
+                """
+
+SALES_QUERY = """
+                    SELECT
+                        saleid,
+                        customer.name as customer_name,
+                        product.name as product_name,
+                        quantity,
+                        quantity * price as total_cost,
+                        saledate
+                    FROM
+                        {source}
+                    INNER JOIN
+                        customer ON sale.customerid = customer.customerid
+                    INNER JOIN
+                        product ON sale.productid = product.productid
+                """
+
+# Without a date window the sales view reads only the live sales. With one it
+# reads the window from the live sales and the archive, each filtered on
+# saledate so MySQL prunes the archive to the partitions the window covers.
+LIVE_SALES = "sale"
+
+WINDOWED_SALES = """
+                        (SELECT saleid, productid, customerid, quantity, unitprice, saledate
+                            FROM sale WHERE saledate BETWEEN %s AND %s
+                         UNION ALL
+                         SELECT saleid, productid, customerid, quantity, unitprice, saledate
+                            FROM sale_archive WHERE saledate BETWEEN %s AND %s) AS sale
+                """
+
+# Reports read the summary tables the sale triggers keep, never the sales
+DAILY_SUMMARY_QUERY = "SELECT saledate, sales, units, revenue FROM sales_daily"
+
+PRODUCT_SUMMARY_QUERY = """
+                SELECT s.productid, p.name, s.sales, s.units, s.revenue
+                    FROM sales_by_product s
+                    JOIN product p ON p.productid = s.productid
+                """
+
+CUSTOMER_SUMMARY_QUERY = """
+                SELECT s.customerid, c.name, s.sales, s.units, s.revenue
+                    FROM sales_by_customer s
+                    JOIN customer c ON c.customerid = s.customerid
+                """
+
+# The watchlist the stock triggers keep: only the products running low
+LOW_STOCK_QUERY = """
+                SELECT l.productid, p.name, l.quantity, l.reorderlevel, l.since
+                    FROM low_stock l
+                    JOIN product p ON p.productid = l.productid
+                """
+
+NO_CONDITIONS = ([], [])
+
+# A change log id missing this long after a higher one showed up belonged to
+# a write that was rolled back, and is no longer waited for
+CHANGE_GAP_SECONDS = 60.0
+
+# After a write, reads stay on the primary this long, so the refresh that
+# follows a user's own change never reads a replica that has not caught up
+READ_YOUR_WRITES_SECONDS = 5.0
+
+
+def placeholders(values):
+    # "%s, %s, ..." for an IN list of the values
+    return ", ".join(["%s"] * len(values))
+
+
+def sales_search_condition(text):
+    # SQL condition for a database-side sales search. Words of three or more
+    # characters go through the FULLTEXT indexes on customer and product names
+    # as prefix terms; shorter input falls back to a name prefix match.
+    words = [word for word in re.sub(r'[+\-<>()~*"@]', " ", text).split() if len(word) >= 3]
+    if words:
+        expression = " ".join(f"+{word}*" for word in words)
+        condition = ("(sale.customerid IN (SELECT customerid FROM customer"
+                     " WHERE MATCH(name) AGAINST (%s IN BOOLEAN MODE))"
+                     " OR sale.productid IN (SELECT productid FROM product"
+                     " WHERE MATCH(name) AGAINST (%s IN BOOLEAN MODE)))")
+        params = [expression, expression]
+    else:
+        pattern = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        condition = "(customer.name LIKE %s OR product.name LIKE %s)"
+        params = [pattern, pattern]
+
+    if text.isdigit():
+        condition = f"(saleid = %s OR {condition})"
+        params = [int(text)] + params
+    return condition, params
+
+
+def sales_conditions(search_text=""):
+    # (conditions, params) for fetch_sales_page and fetch_sales_rows. Dates
+    # are filtered by the window those take, which also reaches the archive.
+    conditions, params = [], []
+    if search_text.strip():
+        condition, condition_params = sales_search_condition(search_text.strip())
+        conditions.append(condition)
+        params += condition_params
+    return conditions, params
+
+
+def sales_source(window=None):
+    # (FROM clause, params) of the sales view for an optional date window
+    if window is None:
+        return LIVE_SALES, []
+    date_from, date_to = window
+    return WINDOWED_SALES, [date_from, date_to, date_from, date_to]
+
+
+class ChangePosition:
+    # How far a terminal has read the change log. Ids are handed out as rows
+    # are logged but become visible as their writers commit, so a lower id
+    # can show up after a higher one. Every id up to `through` has been read;
+    # `seen` holds the ids read beyond it and `gaps` when each id missing
+    # below them was first noticed.
+    def __init__(self, through, seen=(), gaps=None):
+        self.through = through
+        self.seen = set(seen)
+        self.gaps = dict(gaps or {})
+
+
+class StoreService:
+    # The store's database operations on a single connection, with no Qt
+    # dependency, so the GUI and headless jobs share one implementation.
+    # Every write runs as its own short unit of work and commits before it
+    # returns; wrap several calls in transaction() to commit them together.
+    #
+    # With a read replica, the list, search and report reads go to it;
+    # writes, stock checks and the lookups writes depend on stay on the
+    # primary.
+    def __init__(self, connection, replica=None):
+        self.conn = connection
+        self.replica = replica
+        self.last_write = None
+        self.origin = None
+        self.unit = None
+        self.journal = UndoJournal()
+        # The lookups, page reads and stock checks run as prepared statements
+        self.statements = StatementCache()
+
+        # Name to id caches, kept current by the methods that write names
+        self.customer_ids = LookupCache("Customer lookups", self.load_customer_id)
+        self.product_ids = LookupCache("Product lookups", self.load_product_id)
+
+    @contextmanager
+    def transaction(self, label):
+        # Calls made inside an open unit join it, so a batch of actions
+        # shares one transaction and one commit
+        if self.unit is not None:
+            yield self.unit
+            return
+        self.unit = UnitOfWork(self.conn, label, self.journal)
+        try:
+            with self.unit:
+                yield self.unit
+            self.last_write = time.monotonic()
+        except Exception:
+            # Ids cached during the unit may have been rolled back with it
+            self.clear_caches()
+            raise
+        finally:
+            self.unit = None
+
+    def clear_caches(self):
+        self.customer_ids.clear()
+        self.product_ids.clear()
+
+    def mark_savepoint(self):
+        self.journal.mark()
+
+    def rollback_to_savepoint(self):
+        # Labels of the actions undone, oldest first
+        undone = self.journal.rollback(self.conn)
+        self.last_write = time.monotonic()
+        self.clear_caches()
+        return undone
+
+    def reader(self):
+        # The connection for reads that may lag the primary by a moment
+        if self.replica is None or self.unit is not None:
+            return self.conn
+        if self.last_write is not None and time.monotonic() - self.last_write < READ_YOUR_WRITES_SECONDS:
+            return self.conn
+        return self.replica
+
+    def connection_id(self):
+        # The primary connection's id, as the change log records it
+        if self.origin is None:
+            with self.conn.cursor() as cursor:
+                cursor.execute("SELECT CONNECTION_ID()")
+                self.origin = cursor.fetchone()[0]
+        return self.origin
+
+    ####################### LOOKUPS #################
+
+    def get_product_id_by_name(self, product_name):
+        return self.product_ids.get(product_name)
+
+    def get_customer_id_by_name(self, customer_name):
+        return self.customer_ids.get(customer_name)
+
+    def load_product_id(self, product_name):
+        query = "SELECT productid FROM product WHERE name = %s"
+        result = self.statements.rows(self.conn, query, (product_name,))
+
+        if result:
+            return result[0][0]
+        else:
+            return None
+
+    def load_customer_id(self, customer_name):
+        result = self.statements.rows(self.conn, "SELECT customerid FROM customer WHERE name = %s", (customer_name,))
+        return result[0][0] if result else None
+
+    ####################### READS #################
+
+    def fetch_suppliers_page(self, after_key, limit):
+        after_id = after_key[0] if after_key else 0
+        return self.statements.rows(
+            self.reader(),
+            SUPPLIERS_QUERY + " WHERE supplierid > %s order by supplierid LIMIT %s",
+            (after_id, limit)
+        )
+
+    def fetch_suppliers_rows(self, supplier_ids):
+        return self.fetch_rows(SUPPLIERS_QUERY + " WHERE supplierid IN ({}) order by supplierid", supplier_ids)
+
+    def fetch_products_page(self, after_key, limit):
+        after_product, after_supplier = after_key if after_key else (0, 0)
+        query = PRODUCTS_QUERY + """
+                    WHERE (p.productid, su.supplierid) > (%s, %s)
+                    order by p.productid, su.supplierid
+                    LIMIT %s
+                """
+        return self.statements.rows(self.reader(), query, (after_product, after_supplier, limit))
+
+    def fetch_products_rows(self, product_ids):
+        return self.fetch_rows(
+            PRODUCTS_QUERY + " WHERE p.productid IN ({}) order by p.productid, su.supplierid",
+            product_ids
+        )
+
+    def fetch_sales_page(self, after_key, limit, conditions=NO_CONDITIONS, window=None):
+        # Keyset pagination: each page starts after the last saleid loaded, so
+        # the cost of a page does not grow with the size of the table.
+        # window is (date_from, date_to) to include archived sales.
+        after_id = after_key[0] if after_key else 0
+        conditions, params = conditions
+        source, source_params = sales_source(window)
+        where = " AND ".join(["saleid > %s"] + conditions)
+        return self.statements.rows(
+            self.reader(),
+            SALES_QUERY.format(source=source) + f" WHERE {where} order by saleid LIMIT %s",
+            (*source_params, after_id, *params, limit)
+        )
+
+    def fetch_sales_rows(self, sale_ids, conditions=NO_CONDITIONS, window=None):
+        # Rows that no longer match the conditions are left out
+        conditions, params = conditions
+        source, source_params = sales_source(window)
+        where = " AND ".join([f"saleid IN ({placeholders(sale_ids)})"] + conditions)
+        return self.statements.rows(
+            self.reader(),
+            SALES_QUERY.format(source=source) + f" WHERE {where} order by saleid",
+            (*source_params, *sale_ids, *params)
+        )
+
+    def fetch_customer_names(self, customer_ids=None):
+        # (customerid, name) of the given customers, or of all of them, for
+        # the name completer
+        if customer_ids is None:
+            with self.reader().cursor() as cursor:
+                cursor.execute("SELECT customerid, name FROM customer")
+                return cursor.fetchall()
+        return self.fetch_rows("SELECT customerid, name FROM customer WHERE customerid IN ({})", customer_ids)
+
+    def fetch_product_names(self, product_ids=None):
+        # (productid, name) of the given products, or of all of them
+        if product_ids is None:
+            with self.reader().cursor() as cursor:
+                cursor.execute("SELECT productid, name FROM product")
+                return cursor.fetchall()
+        return self.fetch_rows("SELECT productid, name FROM product WHERE productid IN ({})", product_ids)
+
+    def fetch_rows(self, query, keys):
+        return self.statements.rows(self.reader(), query.format(placeholders(keys)), keys)
+
+    def iter_rows(self, fetch_page, key_columns=(0,), page_size=1000):
+        # Every row fetch_page returns, one keyset page at a time
+        after_key = None
+        while True:
+            rows = fetch_page(after_key, page_size)
+            yield from rows
+            if len(rows) < page_size:
+                return
+            after_key = tuple(rows[-1][column] for column in key_columns)
+
+    ####################### REPORTS #################
+
+    def fetch_daily_summary_page(self, after_key, limit, date_from, date_to):
+        # Newest day first; days with no sales left are skipped
+        where, params = "saledate BETWEEN %s AND %s AND sales > 0", [date_from, date_to]
+        if after_key:
+            where += " AND saledate < %s"
+            params.append(after_key[0])
+        return self.statements.rows(
+            self.reader(),
+            DAILY_SUMMARY_QUERY + f" WHERE {where} order by saledate DESC LIMIT %s",
+            (*params, limit)
+        )
+
+    def fetch_product_summary_page(self, after_key, limit):
+        return self.fetch_ranked_page(PRODUCT_SUMMARY_QUERY, "s.productid", after_key, limit)
+
+    def fetch_customer_summary_page(self, after_key, limit):
+        return self.fetch_ranked_page(CUSTOMER_SUMMARY_QUERY, "s.customerid", after_key, limit)
+
+    def fetch_ranked_page(self, query, id_column, after_key, limit):
+        # Highest revenue first. The key is (revenue, id), read in reverse
+        # from the revenue index, so after_key is (revenue, id) of the last row.
+        where, params = "s.sales > 0", []
+        if after_key:
+            where += f" AND (s.revenue, {id_column}) < (%s, %s)"
+            params += after_key
+        return self.statements.rows(
+            self.reader(),
+            query + f" WHERE {where} order by s.revenue DESC, {id_column} DESC LIMIT %s",
+            (*params, limit)
+        )
+
+    def summary_totals(self, date_from, date_to):
+        # (sales, units, revenue) between the two dates, one row per day read
+        with self.reader().cursor() as cursor:
+            cursor.execute(
+                "SELECT COALESCE(SUM(sales), 0), COALESCE(SUM(units), 0), COALESCE(SUM(revenue), 0)"
+                " FROM sales_daily WHERE saledate BETWEEN %s AND %s",
+                (date_from, date_to)
+            )
+            return cursor.fetchone()
+
+    def rebuild_summaries(self):
+        # Repairs the summaries from the sales, e.g. after a bulk load that
+        # skipped the summary triggers. Nothing to undo: they are derived data.
+        with self.transaction("Rebuild summaries"), self.conn.cursor() as cursor:
+            cursor.callproc("rebuild_summaries")
+
+    ####################### LOW STOCK #################
+
+    def fetch_low_stock_page(self, after_key, limit):
+        after_id = after_key[0] if after_key else 0
+        return self.statements.rows(
+            self.reader(),
+            LOW_STOCK_QUERY + " WHERE l.productid > %s order by l.productid LIMIT %s",
+            (after_id, limit)
+        )
+
+    def fetch_low_stock_rows(self, product_ids):
+        return self.fetch_rows(LOW_STOCK_QUERY + " WHERE l.productid IN ({}) order by l.productid", product_ids)
+
+    def count_low_stock(self):
+        with self.reader().cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM low_stock")
+            return cursor.fetchone()[0]
+
+    def set_reorder_levels(self, product_ids, level):
+        # The triggers put the products on the watchlist or take them off
+        product_ids = list(product_ids)
+        ids = placeholders(product_ids)
+        with self.transaction("Set reorder levels") as unit, self.conn.cursor() as cursor:
+            cursor.execute(f"SELECT productid, reorderlevel FROM product WHERE productid IN ({ids}) FOR UPDATE",
+                           product_ids)
+            before = cursor.fetchall()
+            cursor.execute(f"UPDATE product SET reorderlevel = %s WHERE productid IN ({ids})", (level, *product_ids))
+            if before:
+                unit.undo(
+                    "UPDATE product SET reorderlevel = CASE productid " + " ".join(["WHEN %s THEN %s"] * len(before))
+                    + f" END WHERE productid IN ({placeholders(before)})",
+                    [value for row in before for value in row] + [row[0] for row in before]
+                )
+
+    ####################### CHANGES #################
+
+    def poll_changes(self, position):
+        # (position, changes) where changes maps each table to the keys other
+        # connections changed since `position`: {} when nothing did, and None
+        # when the log no longer reaches back that far, or another terminal
+        # asked for it, and every view has to reload. Reads no row while
+        # nothing changes. Read where the rows will be re-read from, so a
+        # replica's log never runs ahead of its rows.
+        with self.reader().cursor() as cursor:
+            if position is None:
+                cursor.execute("SELECT COALESCE(MAX(changeid), 0) FROM change_log")
+                return ChangePosition(cursor.fetchone()[0]), {}
+
+            cursor.execute(
+                "SELECT changeid, tablename, rowkey, origin FROM change_log WHERE changeid > %s ORDER BY changeid",
+                (position.through,)
+            )
+            rows = [row for row in cursor.fetchall() if row[0] not in position.seen]
+            if not rows and not position.gaps:
+                return position, {}
+
+            if rows and rows[0][0] > position.through + 1:
+                cursor.execute("SELECT MIN(changeid) FROM change_log")
+                if cursor.fetchone()[0] > position.through + 1:
+                    # Pruned past what this terminal has read
+                    self.clear_caches()
+                    return ChangePosition(rows[-1][0]), None
+
+        position = ChangePosition(position.through, position.seen, position.gaps)
+        origin = self.connection_id()
+        changes = {}
+        for change_id, table, key, writer in rows:
+            position.seen.add(change_id)
+            position.gaps.pop(change_id, None)
+            if writer != origin:
+                changes.setdefault(table, set()).add(key)
+
+        now = time.monotonic()
+        for change_id in range(position.through + 1, max(position.seen, default=0)):
+            if change_id not in position.seen:
+                position.gaps.setdefault(change_id, now)
+        while True:
+            following = position.through + 1
+            if following in position.seen:
+                position.seen.remove(following)
+            elif following in position.gaps and now - position.gaps[following] > CHANGE_GAP_SECONDS:
+                del position.gaps[following]
+            else:
+                break
+            position.through = following
+
+        if "*" in changes:
+            self.clear_caches()
+            return position, None
+        # Renamed or deleted elsewhere, so the cached ids may be stale
+        for key in changes.get("customer", ()):
+            self.customer_ids.invalidate_value(key)
+        for key in changes.get("product", ()):
+            self.product_ids.invalidate_value(key)
+        return position, changes
+
+    def prune_changes(self, keep):
+        # Drops all but the last `keep` rows of the change log. A terminal
+        # that falls further behind reloads in full on its next poll.
+        with self.transaction("Prune change log"), self.conn.cursor() as cursor:
+            cursor.execute("SELECT MAX(changeid) FROM change_log")
+            newest = cursor.fetchone()[0]
+            if newest is not None:
+                cursor.execute("DELETE FROM change_log WHERE changeid <= %s", (newest - keep,))
+
+    ####################### WRITES #################
+
+    def place_order(self, customer_name, items):
+        # One round trip: makeorder resolves the customer, checks and locks
+        # stock for every line and inserts the sales in a single transaction.
+        # It returns the customer's id and whether it added the customer.
+        with self.transaction("Place order") as unit, self.conn.cursor() as cursor:
+            _, _, customer_id, customer_added = cursor.callproc("makeorder", (customer_name, json.dumps(items), 0, 0))
+            lines = [tuple(row) for result_set in cursor.stored_results() for row in result_set.fetchall()]
+
+            if customer_id is not None:
+                self.customer_ids.put(customer_name, customer_id)
+            if all(line[4] == "ok" for line in lines):
+                if customer_added:
+                    unit.undo("DELETE FROM customer WHERE customerid = %s", (customer_id,))
+                for *_, sale_id in lines:
+                    # Deleting a sale leaves the stock alone, so it is handed
+                    # back first (recorded last-first)
+                    unit.undo("DELETE FROM sale WHERE saleid = %s", (sale_id,))
+                    unit.undo("CALL release_stock(%s)", (sale_id,))
+            return lines
+
+    def insert_supplier(self, supplier_name):
+        with self.transaction("Add supplier") as unit, self.conn.cursor() as cursor:
+            cursor.execute("INSERT INTO supplier (name) VALUES (%s)", (supplier_name,))
+            unit.undo("DELETE FROM supplier WHERE supplierid = %s", (cursor.lastrowid,))
+            return cursor.lastrowid
+
+    def save_product(self, product_id, supplier_id, product_name, price, stock_quantity):
+        with self.transaction("Save product") as unit:
+            with self.conn.cursor() as cursor:
+                if product_id is None:
+                    # Inserting new product
+                    cursor.execute(
+                        "INSERT INTO product (name, price) VALUES (%s, %s)",
+                        (product_name, price)
+                    )
+                    product_id = cursor.lastrowid
+                    unit.undo("DELETE FROM product WHERE productid = %s", (product_id,))
+                else:
+                    # Updating existing product
+                    cursor.execute("SELECT name, price FROM product WHERE productid = %s FOR UPDATE", (product_id,))
+                    before = cursor.fetchone()
+                    cursor.execute(
+                        "UPDATE product SET name = %s, price = %s WHERE productid = %s",
+                        (product_name, price, product_id)
+                    )
+                    if before:
+                        unit.undo("UPDATE product SET name = %s, price = %s WHERE productid = %s", (*before, product_id))
+                    # The old name may be cached
+                    self.product_ids.invalidate_value(product_id)
+                self.product_ids.put(product_name, product_id)
+
+            self.set_stock(product_id, supplier_id, stock_quantity)
+            return product_id
+
+    def set_stock(self, product_id, supplier_id, stock_quantity):
+        with self.transaction("Set stock") as unit, self.conn.cursor() as cursor:
+            # Checking if the stock entry already exists
+            rows = self.statements.rows(
+                self.conn,
+                "SELECT quantity, purchasedate FROM stock WHERE productid = %s AND supplierid = %s FOR UPDATE",
+                (product_id, supplier_id)
+            )
+            before = rows[0] if rows else None
+
+            if before:
+                # Updating existing stock entry
+                cursor.execute(
+                    "UPDATE stock SET quantity = %s, purchasedate = CURRENT_DATE(), supplierid = %s WHERE productid = %s AND supplierid = %s",
+                    (stock_quantity, supplier_id, product_id, supplier_id)
+                )
+                # Undone as a delta, so sales made since then still count
+                unit.undo(
+                    "UPDATE stock SET quantity = quantity - %s, purchasedate = %s WHERE productid = %s AND supplierid = %s",
+                    (stock_quantity - before[0], before[1], product_id, supplier_id)
+                )
+            else:
+                # Inserting new stock entry
+                cursor.execute(
+                    "INSERT INTO stock (productid, supplierid, quantity) VALUES (%s, %s, %s)",
+                    (product_id, supplier_id, stock_quantity)
+                )
+                unit.undo("DELETE FROM stock WHERE productid = %s AND supplierid = %s", (product_id, supplier_id))
+
+    def save_sale(self, customer_name, product_id, quantity, sale_id=None):
+        with self.transaction("Save sale") as unit, self.conn.cursor() as cursor:
+            if sale_id is not None:
+                # Only live sales can be edited; checked before the customer
+                # is added, so a refused edit writes nothing
+                cursor.execute(
+                    "SELECT saleid, productid, customerid, quantity, unitprice, saledate"
+                    " FROM sale WHERE saleid = %s FOR UPDATE",
+                    (sale_id,)
+                )
+                before = cursor.fetchone()
+                if before is None:
+                    raise ValueError(self.missing_sales_message(cursor, [sale_id], "edited"))
+
+            # Checking if the customer already exists
+            customer_id = self.customer_ids.get(customer_name)
+
+            customer_added = customer_id is None
+            if customer_added:
+                # Customer doesn't exist, add the customer
+                cursor.execute("INSERT INTO customer (name) VALUES (%s)", (customer_name,))
+                # Get the customer ID of the added customer
+                customer_id = cursor.lastrowid
+                unit.undo("DELETE FROM customer WHERE customerid = %s", (customer_id,))
+                self.customer_ids.put(customer_name, customer_id)
+
+            if sale_id is None:
+                cursor.callproc("makepurchase", (customer_id, product_id, quantity))
+                cursor.execute("SELECT LAST_INSERT_ID()")
+                sale_id = cursor.fetchone()[0]
+                touched_products = [product_id]
+                # Deleting a sale leaves the stock alone, so give it back first
+                unit.undo("DELETE FROM sale WHERE saleid = %s", (sale_id,))
+                unit.undo("CALL release_stock(%s)", (sale_id,))
+            else:
+                # The old product gets its stock back, so its row changes too
+                touched_products = [product_id, before[1]]
+
+                # Read before the update_sale trigger moves the stock
+                unit.undo("CALL restore_sales(%s, %s)", self.restore_sales_args(cursor, [before]))
+                cursor.callproc("updatesale", (customer_id, product_id, quantity, sale_id))
+
+            return sale_id, touched_products, customer_added
+
+    def remove_supplier(self, supplier_id):
+        return self.remove_suppliers([supplier_id])
+
+    def remove_suppliers(self, supplier_ids):
+        # Deletes the suppliers in one statement; returns the products whose
+        # stock rows went with them
+        supplier_ids = list(supplier_ids)
+        ids = placeholders(supplier_ids)
+        with self.transaction("Delete suppliers" if len(supplier_ids) > 1 else "Delete supplier") as unit, \
+                self.conn.cursor() as cursor:
+            cursor.execute(f"SELECT supplierid, name FROM supplier WHERE supplierid IN ({ids}) FOR UPDATE", supplier_ids)
+            before = cursor.fetchall()
+            # Their stock rows go with them, so those product rows change
+            cursor.execute(
+                f"SELECT productid, supplierid, quantity, purchasedate FROM stock WHERE supplierid IN ({ids}) FOR UPDATE",
+                supplier_ids
+            )
+            stock = cursor.fetchall()
+            product_ids = sorted({row[0] for row in stock})
+            cursor.execute(f"DELETE FROM supplier WHERE supplierid IN ({ids})", supplier_ids)
+
+            # Recorded last-first: the suppliers are restored before their stock
+            if stock:
+                unit.undo(
+                    "INSERT INTO stock (productid, supplierid, quantity, purchasedate) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s)"] * len(stock)),
+                    [value for row in stock for value in row]
+                )
+            if before:
+                unit.undo(
+                    "INSERT INTO supplier (supplierid, name) VALUES " + ", ".join(["(%s, %s)"] * len(before)),
+                    [value for row in before for value in row]
+                )
+            return product_ids
+
+    def remove_product(self, product_id):
+        return self.remove_products([product_id])
+
+    def remove_products(self, product_ids):
+        # Deletes the products in one statement; returns the sales that lost
+        # their product
+        product_ids = list(product_ids)
+        ids = placeholders(product_ids)
+        with self.transaction("Delete products" if len(product_ids) > 1 else "Delete product") as unit, \
+                self.conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT productid, name, price, reorderlevel FROM product WHERE productid IN ({ids}) FOR UPDATE",
+                product_ids
+            )
+            before = cursor.fetchall()
+            cursor.execute(
+                f"SELECT productid, supplierid, quantity, purchasedate FROM stock WHERE productid IN ({ids}) FOR UPDATE",
+                product_ids
+            )
+            stock = cursor.fetchall()
+            # Their sales lose their product and drop out of the sales view
+            cursor.execute(f"SELECT saleid, productid FROM sale WHERE productid IN ({ids}) FOR UPDATE", product_ids)
+            sales = cursor.fetchall()
+            cursor.execute(f"DELETE FROM product WHERE productid IN ({ids})", product_ids)
+            for product_id in product_ids:
+                self.product_ids.invalidate_value(product_id)
+
+            # Recorded last-first: products, then their stock, then their sales
+            if sales:
+                unit.undo(
+                    "UPDATE sale SET productid = CASE saleid " + " ".join(["WHEN %s THEN %s"] * len(sales))
+                    + f" END WHERE saleid IN ({placeholders(sales)})",
+                    [value for row in sales for value in row] + [row[0] for row in sales]
+                )
+            if stock:
+                unit.undo(
+                    "INSERT INTO stock (productid, supplierid, quantity, purchasedate) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s)"] * len(stock)),
+                    [value for row in stock for value in row]
+                )
+            if before:
+                unit.undo(
+                    "INSERT INTO product (productid, name, price, reorderlevel) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s)"] * len(before)),
+                    [value for row in before for value in row]
+                )
+            return [row[0] for row in sales]
+
+    def remove_sale(self, sale_id):
+        self.remove_sales([sale_id])
+
+    def remove_sales(self, sale_ids):
+        # Deletes the sales in one statement. Their stock is not handed back,
+        # as for a single sale.
+        sale_ids = list(sale_ids)
+        ids = placeholders(sale_ids)
+        with self.transaction("Delete sales" if len(sale_ids) > 1 else "Delete sale") as unit, \
+                self.conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT saleid, productid, customerid, quantity, unitprice, saledate"
+                f" FROM sale WHERE saleid IN ({ids}) FOR UPDATE",
+                sale_ids
+            )
+            before = cursor.fetchall()
+            if len(before) < len(set(sale_ids)):
+                found = {row[0] for row in before}
+                raise ValueError(self.missing_sales_message(
+                    cursor, [sale_id for sale_id in sale_ids if sale_id not in found], "deleted"
+                ))
+            if before:
+                # Read before the delete takes the allocations with the sales
+                unit.undo("CALL restore_sales(%s, %s)", self.restore_sales_args(cursor, before))
+            cursor.execute(f"DELETE FROM sale WHERE saleid IN ({ids})", sale_ids)
+
+    def restore_sales_args(self, cursor, sales):
+        # The restore_sales arguments that put these sale rows back, with the
+        # stock rows each one holds now
+        sale_ids = [row[0] for row in sales]
+        cursor.execute(
+            "SELECT saleid, productid, supplierid, quantity FROM sale_allocation"
+            f" WHERE saleid IN ({placeholders(sale_ids)})",
+            sale_ids
+        )
+        allocations = [list(row) for row in cursor.fetchall()]
+        return json.dumps([list(row) for row in sales], default=str), json.dumps(allocations)
+
+    def missing_sales_message(self, cursor, sale_ids, action):
+        # Why sales that are not in the live table cannot be changed
+        cursor.execute(f"SELECT saleid FROM sale_archive WHERE saleid IN ({placeholders(sale_ids)})", sale_ids)
+        archived = sorted(row[0] for row in cursor.fetchall())
+        missing = sorted(set(sale_ids) - set(archived))
+        reasons = []
+        if archived:
+            reasons.append(f"sale IDs {', '.join(map(str, archived))} are archived and cannot be {action}")
+        if missing:
+            reasons.append(f"sale IDs {', '.join(map(str, missing))} do not exist")
+        return "Nothing changed: " + "; ".join(reasons) + "."
+
+    def adjust_prices(self, product_ids, percent):
+        # Raises (or with a negative percent lowers) the prices in one
+        # statement, rounded to the cent
+        product_ids = list(product_ids)
+        ids = placeholders(product_ids)
+        with self.transaction("Adjust prices") as unit, self.conn.cursor() as cursor:
+            cursor.execute(f"SELECT productid, price FROM product WHERE productid IN ({ids}) FOR UPDATE", product_ids)
+            before = cursor.fetchall()
+            cursor.execute(
+                f"UPDATE product SET price = ROUND(price * (100 + %s) / 100.0, 2) WHERE productid IN ({ids})",
+                (percent, *product_ids)
+            )
+            if before:
+                unit.undo(
+                    "UPDATE product SET price = CASE productid " + " ".join(["WHEN %s THEN %s"] * len(before))
+                    + f" END WHERE productid IN ({placeholders(before)})",
+                    [value for row in before for value in row] + [row[0] for row in before]
+                )
+
+    def adjust_stock(self, stock_keys, delta):
+        # Adds delta to the stock rows given as (productid, supplierid) in one
+        # statement. Nothing changes if any row would go below zero.
+        stock_keys = list(stock_keys)
+        keys = ", ".join(["(%s, %s)"] * len(stock_keys))
+        params = [value for key in stock_keys for value in key]
+        with self.transaction("Adjust stock") as unit, self.conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT productid FROM stock WHERE (productid, supplierid) IN ({keys}) AND quantity + %s < 0 FOR UPDATE",
+                (*params, delta)
+            )
+            short = sorted({row[0] for row in cursor.fetchall()})
+            if short:
+                raise ValueError(f"Not enough stock to take {-delta} from product IDs {', '.join(map(str, short))}.")
+            cursor.execute(
+                f"UPDATE stock SET quantity = quantity + %s WHERE (productid, supplierid) IN ({keys})",
+                (delta, *params)
+            )
+            # Undone as a delta, so sales made since then still count
+            unit.undo(
+                f"UPDATE stock SET quantity = quantity - %s WHERE (productid, supplierid) IN ({keys})",
+                (delta, *params)
+            )
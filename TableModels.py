@@ -0,0 +1,288 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from decimal import Decimal
+from functools import partial
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from SearchIndex import TrigramIndex
+
+# Column kinds. Numbers and dates are kept in typed arrays (8 bytes per cell)
+# instead of one Python object per cell; only text needs a list.
+INT = "int"
+MONEY = "money"
+DATE = "date"
+TEXT = "text"
+
+NULL_INT = -(2 ** 63)
+NULL_DATE = 0
+
+
+def _new_column(kind):
+    if kind in (INT, MONEY):
+        return array("q")
+    if kind == DATE:
+        return array("l")
+    return []
+
+
+def _encode(kind, value):
+    if kind == INT:
+        return NULL_INT if value is None else int(value)
+    if kind == MONEY:
+        # Stored as cents so decimal(10, 2) values round-trip exactly
+        return NULL_INT if value is None else int((Decimal(value) * 100).to_integral_value())
+    if kind == DATE:
+        return NULL_DATE if value is None else value.toordinal()
+    return value
+
+
+def _decode(kind, stored):
+    if kind == INT:
+        return None if stored == NULL_INT else stored
+    if kind == MONEY:
+        return None if stored == NULL_INT else Decimal(stored).scaleb(-2)
+    if kind == DATE:
+        return None if stored == NULL_DATE else date.fromordinal(stored)
+    return stored
+
+
+class StoreTableModel(QAbstractTableModel):
+    # fetch_page(after_key, limit) must return at most `limit` rows ordered by
+    # the key columns and strictly greater than after_key (None for the first
+    # page). Pages are pulled on demand by the view through canFetchMore and
+    # fetchMore, so only the rows that were scrolled to are ever held. With an
+    # executor, pages are fetched on its thread and appended when they arrive.
+    def __init__(self, headers, kinds, fetch_page, key_columns=(0,), chunk_size=500, executor=None, parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.kinds = list(kinds)
+        self.fetch_page = fetch_page
+        self.key_columns = tuple(key_columns)
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self.page_key = ("page", id(self))
+        self._fetching = False
+        # Kept in step with the stored rows for SearchFilterProxyModel
+        self.search_index = TrigramIndex()
+
+        self._columns = [_new_column(kind) for kind in self.kinds]
+        self._last_key = None
+        self._exhausted = True
+        # Set while a search or sort needs every row, not just those scrolled to
+        self._load_all = False
+
+    ######################### QT MODEL INTERFACE ##############################
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns[0])
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.kinds)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            # Formatting happens here, only for the cells actually painted
+            value = self.value(index.row(), index.column())
+            return "" if value is None else str(value)
+        if role == Qt.ItemDataRole.UserRole:
+            return self.value(index.row(), index.column())
+        if role == Qt.ItemDataRole.TextAlignmentRole and self.kinds[index.column()] in (INT, MONEY):
+            return int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted or self._fetching:
+            return
+        if self.executor is None:
+            self.page_loaded(self._last_key, self.fetch_page(self._last_key, self.chunk_size))
+            return
+
+        # Submitting under the model's key supersedes an outdated page request
+        self._fetching = True
+        self.executor.submit(
+            self.fetch_page, self._last_key, self.chunk_size,
+            on_result=partial(self.page_loaded, self._last_key),
+            on_error=self.page_failed,
+            key=self.page_key
+        )
+
+    def page_loaded(self, after_key, rows):
+        self._fetching = False
+        if after_key != self._last_key:
+            # Rows were patched while the page was in flight; ask again
+            self.fetchMore()
+            return
+        if len(rows) < self.chunk_size:
+            self._exhausted = True
+        self.append_rows(rows)
+        if self._load_all:
+            self.fetchMore()
+
+    def page_failed(self, error):
+        self._fetching = False
+        self._exhausted = True
+        if self.executor is not None:
+            self.executor.failed.emit(f"Failed to load rows: {error}")
+
+    def set_load_all(self, load_all):
+        # While set, pages are pulled one after another until the table is
+        # fully loaded, and again after every reload
+        self._load_all = load_all
+        if load_all:
+            if self.executor is None:
+                while self.canFetchMore():
+                    self.fetchMore()
+            else:
+                self.fetchMore()
+
+    def fully_loaded(self):
+        return self._exhausted
+
+    ######################### STORAGE METHODS ################################
+    def reload(self):
+        self.beginResetModel()
+        self._columns = [_new_column(kind) for kind in self.kinds]
+        self._last_key = None
+        self._exhausted = False
+        self._fetching = False
+        self.search_index.clear()
+        self.endResetModel()
+        self.set_load_all(self._load_all)
+        if not self._load_all:
+            self.fetchMore()
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        first = self.rowCount()
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        for column, kind in enumerate(self.kinds):
+            storage = self._columns[column]
+            storage.extend(_encode(kind, row[column]) for row in rows)
+        self._last_key = tuple(rows[-1][column] for column in self.key_columns)
+        self.index_rows(rows)
+        self.endInsertRows()
+
+    def patch_groups(self, group_keys, rows):
+        # Replaces every stored row whose first key column is in group_keys with
+        # the matching rows from `rows` (fresh from the database). Keys with no
+        # fresh rows are removed. Groups beyond the loaded pages are left for
+        # fetchMore to pick up, so the stored rows stay a prefix of the table.
+        fresh = {}
+        for row in rows:
+            fresh.setdefault(row[self.key_columns[0]], []).append(row)
+
+        for group_key in sorted(set(group_keys)):
+            low, high = self.group_range(group_key)
+            if high > low:
+                self.beginRemoveRows(QModelIndex(), low, high - 1)
+                for row in range(low, high):
+                    self.search_index.remove(self.key_at(row))
+                for storage in self._columns:
+                    del storage[low:high]
+                self.endRemoveRows()
+
+            group_rows = fresh.get(group_key)
+            if group_rows and self.is_loaded(group_key):
+                self.insert_rows(low, group_rows)
+
+        if not self._exhausted:
+            self._last_key = self.key_at(self.rowCount() - 1) if self.rowCount() else None
+
+    def insert_rows(self, position, rows):
+        self.beginInsertRows(QModelIndex(), position, position + len(rows) - 1)
+        for column, kind in enumerate(self.kinds):
+            storage = self._columns[column]
+            values = [_encode(kind, row[column]) for row in rows]
+            storage[position:position] = array(storage.typecode, values) if isinstance(storage, array) else values
+        self.index_rows(rows)
+        self.endInsertRows()
+
+    def index_rows(self, rows):
+        for row in rows:
+            self.search_index.add(tuple(row[column] for column in self.key_columns), row)
+
+    def group_range(self, group_key):
+        column = self.key_columns[0]
+        encoded = _encode(self.kinds[column], group_key)
+        storage = self._columns[column]
+        return bisect_left(storage, encoded), bisect_right(storage, encoded)
+
+    def is_loaded(self, group_key):
+        if self._exhausted:
+            return True
+        return self._last_key is not None and group_key <= self._last_key[0]
+
+    def value(self, row, column):
+        return _decode(self.kinds[column], self._columns[column][row])
+
+    def row_values(self, row):
+        return [self.value(row, column) for column in range(len(self.kinds))]
+
+    def key_at(self, row):
+        return tuple(self.value(row, column) for column in self.key_columns)
+
+
+class StoreSortFilterProxyModel(QSortFilterProxyModel):
+    # Sorts on the raw column values rather than their display strings, so ids,
+    # prices and dates order numerically. Any order but the one the pages come
+    # in has the source load every page, which are merged into place as they
+    # arrive, so rows not yet scrolled to still sort into place.
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        super().sort(column, order)
+        self.update_load_all()
+
+    def needs_all_rows(self):
+        source = self.sourceModel()
+        column = self.sortColumn()
+        return column >= 0 and not (column == source.key_columns[0] and self.sortOrder() == Qt.SortOrder.AscendingOrder)
+
+    def update_load_all(self):
+        if self.sourceModel() is not None:
+            self.sourceModel().set_load_all(self.needs_all_rows())
+
+    def lessThan(self, left, right):
+        source = self.sourceModel()
+        left_value = source.value(left.row(), left.column())
+        right_value = source.value(right.row(), right.column())
+        if left_value is None or right_value is None:
+            return left_value is None and right_value is not None
+        return left_value < right_value
+
+
+class SearchFilterProxyModel(StoreSortFilterProxyModel):
+    # Filters on the source model's trigram index; a row is shown when its key
+    # is in the current match set, so a search costs one set lookup per row
+    # rather than reading and lowercasing every cell. A search has the source
+    # load every page, so it finds rows not yet scrolled to.
+    def set_search_text(self, text):
+        self.sourceModel().search_index.search(text)
+        self.invalidateFilter()
+        self.update_load_all()
+
+    def needs_all_rows(self):
+        return super().needs_all_rows() or self.sourceModel().search_index.matches is not None
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        source = self.sourceModel()
+        matches = source.search_index.matches
+        if matches is None:
+            return True
+        return source.key_at(source_row) in matches
@@ -0,0 +1,58 @@
+import importlib.util
+import os
+from PyQt6.uic import compileUi, loadUi
+
+CACHE_DIR = "__uicache__"
+
+
+def _cache_path(ui_path):
+    directory, name = os.path.split(os.path.abspath(ui_path))
+    return os.path.join(directory, CACHE_DIR, os.path.splitext(name)[0] + "_ui.py")
+
+
+def _stamp(ui_path):
+    return f"# source mtime: {os.stat(ui_path).st_mtime_ns}\n"
+
+
+def compiled_module(ui_path):
+    # The .ui file compiled to Python, recompiled whenever the .ui file's
+    # mtime changes. Importing it lets Python reuse its cached bytecode, so a
+    # warm start skips the XML parsing loadUi does on every launch.
+    path = _cache_path(ui_path)
+    stamp = _stamp(ui_path)
+    try:
+        with open(path, encoding="utf-8") as cached:
+            fresh = cached.readline() == stamp
+    except OSError:
+        fresh = False
+
+    if not fresh:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name so a half-written module is never imported
+        with open(path + ".tmp", "w", encoding="utf-8") as compiled:
+            compiled.write(stamp)
+            with open(ui_path, encoding="utf-8") as source:
+                compileUi(source, compiled)
+        os.replace(path + ".tmp", path)
+
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_ui(ui_path, widget):
+    # Drop-in replacement for loadUi(ui_path, widget). Falls back to loadUi
+    # when the cache cannot be written or the compiled form fails to load.
+    try:
+        module = compiled_module(ui_path)
+        form = next(value for name, value in vars(module).items() if name.startswith("Ui_"))
+    except Exception:
+        return loadUi(ui_path, widget)
+
+    ui = form()
+    ui.setupUi(widget)
+    # loadUi exposes the child widgets as attributes of the widget itself
+    for name, value in vars(ui).items():
+        setattr(widget, name, value)
+    return widget
@@ -0,0 +1,61 @@
+class UnitOfWork:
+    # One user action as one short, explicit transaction. Row locks are held
+    # from the first write until __exit__ commits, milliseconds later, instead
+    # of for the lifetime of the window. Writers record the statements that
+    # reverse their changes with undo(); a committed unit hands them to the
+    # journal so the action can be taken back from the Rollback menu.
+    def __init__(self, connection, label, journal=None):
+        self.connection = connection
+        self.label = label
+        self.journal = journal
+        self.steps = []
+
+    def __enter__(self):
+        # A connection without autocommit may already be in a transaction
+        # opened by a plain read; the unit simply takes it over
+        if not self.connection.in_transaction:
+            self.connection.start_transaction()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.connection.rollback()
+            return False
+        self.connection.commit()
+        if self.journal is not None and self.steps:
+            self.journal.record(self.label, self.steps)
+        return False
+
+    def undo(self, statement, params=()):
+        # Undo steps run last recorded first, like a stack
+        self.steps.append((statement, tuple(params)))
+
+
+class UndoJournal:
+    # Actions committed since the last savepoint, oldest first, each with the
+    # statements that reverse it. Compensating statements work from deltas and
+    # before-images of the rows the action touched, so changes other
+    # terminals made in the meantime are left in place.
+    def __init__(self):
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, label, steps):
+        self.entries.append((label, steps))
+
+    def mark(self):
+        self.entries = []
+
+    def rollback(self, connection):
+        # Reverses every action since the savepoint in one transaction. If any
+        # statement fails nothing is undone and the journal is kept.
+        with UnitOfWork(connection, "Rollback to savepoint"):
+            with connection.cursor() as cursor:
+                for label, steps in reversed(self.entries):
+                    for statement, params in reversed(steps):
+                        cursor.execute(statement, params)
+        undone = [label for label, steps in self.entries]
+        self.entries = []
+        return undone
@@ -0,0 +1,2 @@
+# Synthetic data generator and timings for the store's hot paths.
+# Run from the repository root: python -m benchmarks --help
@@ -0,0 +1,115 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import mysql.connector
+from ConnectionManager import CONFIG_FILE, read_database_config
+from benchmarks import datagen, hotpaths
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def connect(args, **options):
+    connection = mysql.connector.connect(**read_database_config(args.config), **options)
+    # Like the GUI session: reads outside a unit of work see the latest data
+    connection.autocommit = True
+    return connection
+
+
+def generate(args):
+    sizes = datagen.scaled_sizes(args.scale, suppliers=args.suppliers, products=args.products,
+                                 customers=args.customers, sales=args.sales)
+    connection = connect(args, allow_local_infile=True)
+    try:
+        if not datagen.database_is_empty(connection):
+            if not args.replace:
+                print("The database already holds data. Use --replace to delete it first.", file=sys.stderr)
+                return 1
+            datagen.clear_database(connection)
+        connection.autocommit = False
+        timings = datagen.generate(
+            connection, sizes, args.seed,
+            progress=lambda table, rows, seconds: print(
+                f"{table}: {rows:,} rows in {seconds:.1f}s ({rows / seconds if seconds else 0:,.0f} rows/sec)",
+                file=sys.stderr
+            )
+        )
+    finally:
+        connection.close()
+    print(json.dumps({table: {"rows": rows, "seconds": round(seconds, 3)} for table, (rows, seconds) in timings.items()},
+                     indent=2))
+    return 0
+
+
+def run(args):
+    connection = connect(args)
+    try:
+        report = hotpaths.run(connection, args.repeat, include_writes=not args.read_only)
+    finally:
+        connection.close()
+    report.update(commit=git_commit(), python=platform.python_version(),
+                  timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as stream:
+            stream.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+def compare(args):
+    # Median of every benchmark in both runs, and the change from the first
+    with open(args.before, encoding="utf-8") as stream:
+        before = json.load(stream)
+    with open(args.after, encoding="utf-8") as stream:
+        after = json.load(stream)
+    print(f"{'benchmark':<38}{before.get('commit') or 'before':>12}{after.get('commit') or 'after':>12}{'change':>10}")
+    for name, result in after["results"].items():
+        old = before["results"].get(name, {}).get("median_ms")
+        new = result.get("median_ms")
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old:+.0%}" if old else ""
+        print(f"{name:<38}{old:>10.2f}ms{new:>10.2f}ms{change:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Generate a synthetic store and time its hot paths.")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("generate", help="load a synthetic dataset into an empty database")
+    command.add_argument("--scale", type=float, default=1.0,
+                         help="multiplies the default sizes of 1k suppliers, 10k products, 100k customers, 5M sales")
+    command.add_argument("--suppliers", type=int)
+    command.add_argument("--products", type=int)
+    command.add_argument("--customers", type=int)
+    command.add_argument("--sales", type=int)
+    command.add_argument("--seed", type=int, default=1)
+    command.add_argument("--replace", action="store_true", help="delete the existing rows first")
+    command.set_defaults(run=generate)
+
+    command = commands.add_parser("run", help="time the hot paths and print the results as JSON")
+    command.add_argument("--repeat", type=int, default=20)
+    command.add_argument("--read-only", action="store_true", help="skip the sale and delete benchmarks")
+    command.add_argument("--output", help="write the JSON here instead of stdout")
+    command.set_defaults(run=run)
+
+    command = commands.add_parser("compare", help="compare two JSON results")
+    command.add_argument("before")
+    command.add_argument("after")
+    command.set_defaults(run=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.run(args))
@@ -0,0 +1,238 @@
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+import mysql.connector
+from BulkImport import _values
+
+# Generates a realistic, reproducible store into an empty database loaded from
+# StoreDB.sql. Rows get explicit ids so the relationships are known without
+# lookups, and every table is streamed in chunks: nothing holds the 5M sales
+# in memory at once.
+
+DEFAULT_SIZES = {"suppliers": 1000, "products": 10000, "customers": 100000, "sales": 5000000}
+TABLES = ("sale_archive", "sale_allocation", "sale", "stock", "customer", "product", "supplier")
+SUMMARY_TABLES = ("sales_daily", "sales_by_product", "sales_by_customer")
+CHUNK_ROWS = 200000
+INSERT_ROWS = 5000
+SALE_DAYS = 3 * 365
+
+FIRST_NAMES = ("James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David",
+               "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah",
+               "Ahmed", "Fatima", "Wei", "Mei", "Arjun", "Priya", "Carlos", "Lucia", "Olga", "Ivan", "Kenji", "Yuki")
+LAST_NAMES = ("Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+              "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Taylor", "Thomas", "Moore", "Jackson",
+              "Khan", "Rahman", "Chen", "Wang", "Patel", "Singh", "Silva", "Santos", "Ivanov", "Sato", "Kim", "Nguyen")
+COMPANY_WORDS = ("Global", "United", "Prime", "Northern", "Eastern", "Pacific", "Atlas", "Summit", "Apex",
+                 "Evergreen", "Blue River", "Golden Gate", "Silver Line", "Union", "Metro", "Delta")
+COMPANY_KINDS = ("Traders", "Supplies", "Wholesale", "Distribution", "Imports", "Logistics", "Foods", "Industries")
+PRODUCT_ADJECTIVES = ("Organic", "Classic", "Premium", "Fresh", "Large", "Small", "Extra", "Family", "Light",
+                      "Spicy", "Sweet", "Whole", "Frozen", "Natural", "Deluxe", "Mini")
+PRODUCT_NOUNS = ("Rice", "Flour", "Sugar", "Tea", "Coffee", "Milk", "Butter", "Cheese", "Bread", "Pasta",
+                 "Soap", "Shampoo", "Detergent", "Juice", "Biscuits", "Chocolate", "Noodles", "Oil", "Honey",
+                 "Cereal", "Yogurt", "Salt", "Lentils", "Beans", "Sauce", "Water", "Soda", "Chips", "Nuts", "Jam")
+PACK_SIZES = ("100g", "250g", "500g", "1kg", "2kg", "5kg", "250ml", "500ml", "1L", "2L", "6 pack", "12 pack")
+
+
+def scaled_sizes(scale=1.0, **overrides):
+    sizes = {table: max(1, int(count * scale)) for table, count in DEFAULT_SIZES.items()}
+    sizes.update({table: count for table, count in overrides.items() if count is not None})
+    return sizes
+
+
+######################### ROWS ######################################
+def supplier_rows(count, rng):
+    for supplier_id in range(1, count + 1):
+        yield supplier_id, f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_KINDS)} {supplier_id}"
+
+
+def product_rows(count, rng):
+    for product_id in range(1, count + 1):
+        name = f"{rng.choice(PRODUCT_ADJECTIVES)} {rng.choice(PRODUCT_NOUNS)} {rng.choice(PACK_SIZES)} #{product_id}"
+        price = Decimal(rng.lognormvariate(5, 1)).quantize(Decimal("0.01"))
+        yield product_id, name, max(price, Decimal("1.00"))
+
+
+def customer_rows(count, rng):
+    # customer.name is unique, so the id keeps generated names apart
+    for customer_id in range(1, count + 1):
+        yield customer_id, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {customer_id}"
+
+
+def stock_rows(products, suppliers, rng, today):
+    # One to three suppliers per product, with stock left for the write benchmarks
+    for product_id in range(1, products + 1):
+        for supplier_id in rng.sample(range(1, suppliers + 1), min(suppliers, rng.randint(1, 3))):
+            yield (product_id, supplier_id, rng.randint(50, 5000),
+                   today - timedelta(days=rng.randint(0, 180)))
+
+
+def sale_rows(count, products, customers, rng, today):
+    # A few best sellers take most of the sales, as in a real shop
+    for sale_id in range(1, count + 1):
+        product_id = int(products * rng.random() ** 3) + 1
+        yield (sale_id, product_id, rng.randint(1, customers), rng.randint(1, 5),
+               today - timedelta(days=rng.randint(0, SALE_DAYS)))
+
+
+######################### LOADING ######################################
+def chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_data_infile(cursor, table, columns, rows):
+    # LOAD DATA LOCAL INFILE is the fastest way in, when the server allows it
+    handle, path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(handle, "w", newline="", encoding="utf-8") as stream:
+            csv.writer(stream, lineterminator="\n").writerows(rows)
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4"
+            " FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n'"
+            f" ({', '.join(columns)})",
+            (path,)
+        )
+    finally:
+        os.remove(path)
+
+
+def insert_rows(cursor, table, columns, rows):
+    for batch in chunks(rows, INSERT_ROWS):
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + _values(len(batch), len(columns)),
+            [value for row in batch for value in row]
+        )
+
+
+class Loader:
+    def __init__(self, connection):
+        self.connection = connection
+        self.use_infile = True
+
+    def load(self, table, columns, rows):
+        count = 0
+        with self.connection.cursor() as cursor:
+            for chunk in chunks(rows, CHUNK_ROWS):
+                if self.use_infile:
+                    try:
+                        load_data_infile(cursor, table, columns, chunk)
+                    except mysql.connector.Error:
+                        # local_infile is off on the server or the client
+                        self.use_infile = False
+                if not self.use_infile:
+                    insert_rows(cursor, table, columns, chunk)
+                self.connection.commit()
+                count += len(chunk)
+        return count
+
+
+def allocate_sales(connection, sales):
+    # The generated stock is net of the sales but says nothing of which
+    # supplier each came from: every sale is recorded as taken from its
+    # product's first supplier, so editing or undoing one has a row to hand
+    # the stock back to
+    count = 0
+    with connection.cursor() as cursor:
+        for first in range(1, sales + 1, CHUNK_ROWS):
+            cursor.execute(
+                "INSERT INTO sale_allocation (saleid, productid, supplierid, quantity)"
+                " SELECT s.saleid, s.productid, MIN(st.supplierid), s.quantity FROM sale s"
+                " JOIN stock st ON st.productid = s.productid"
+                " WHERE s.saleid BETWEEN %s AND %s GROUP BY s.saleid",
+                (first, first + CHUNK_ROWS - 1)
+            )
+            count += cursor.rowcount
+            connection.commit()
+    return count
+
+
+def database_is_empty(connection):
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+            if cursor.fetchone()[0]:
+                return False
+        return True
+
+
+def clear_database(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SET foreign_key_checks = 0")
+        for table in SUMMARY_TABLES + TABLES:
+            cursor.execute(f"TRUNCATE TABLE {table}")
+        cursor.execute("SET foreign_key_checks = 1")
+        reset_change_log(cursor)
+    connection.commit()
+
+
+def reset_change_log(cursor):
+    # Loads bypass the change log; a log holding only a '*' row tells every
+    # terminal watching it to reload in full. DELETE rather than TRUNCATE
+    # keeps the ids growing past what the terminals have read.
+    cursor.execute("DELETE FROM change_log")
+    cursor.execute("INSERT INTO change_log (tablename, rowkey) VALUES ('*', 0)")
+
+
+def generate(connection, sizes, seed=1, progress=None):
+    # Returns {table: (rows, seconds)}
+    rng = random.Random(seed)
+    today = date.today()
+    loader = Loader(connection)
+    timings = {}
+
+    plan = (
+        ("supplier", ("supplierid", "name"), supplier_rows(sizes["suppliers"], rng)),
+        ("product", ("productid", "name", "price"), product_rows(sizes["products"], rng)),
+        ("customer", ("customerid", "name"), customer_rows(sizes["customers"], rng)),
+        ("stock", ("productid", "supplierid", "quantity", "purchasedate"),
+         stock_rows(sizes["products"], sizes["suppliers"], rng, today)),
+        ("sale", ("saleid", "productid", "customerid", "quantity", "saledate"),
+         sale_rows(sizes["sales"], sizes["products"], sizes["customers"], rng, today)),
+    )
+
+    with connection.cursor() as cursor:
+        # The generated stock is already net of the generated sales, and the
+        # summaries are built in one pass once the sales are in
+        cursor.execute("SET unique_checks = 0, foreign_key_checks = 0, @skip_stock_triggers = 1,"
+                       " @skip_summary_triggers = 1, @skip_change_log = 1")
+    try:
+        for table, columns, rows in plan:
+            started = time.perf_counter()
+            count = loader.load(table, columns, rows)
+            timings[table] = (count, time.perf_counter() - started)
+            if progress is not None:
+                progress(table, count, timings[table][1])
+        started = time.perf_counter()
+        count = allocate_sales(connection, sizes["sales"])
+        timings["sale_allocation"] = (count, time.perf_counter() - started)
+        if progress is not None:
+            progress("sale_allocation", count, timings["sale_allocation"][1])
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SET unique_checks = 1, foreign_key_checks = 1, @skip_stock_triggers = NULL,"
+                           " @skip_summary_triggers = NULL, @skip_change_log = NULL")
+
+    started = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.callproc("rebuild_summaries")
+        reset_change_log(cursor)
+    connection.commit()
+    timings["summaries"] = (sizes["sales"], time.perf_counter() - started)
+    if progress is not None:
+        progress("summaries", sizes["sales"], timings["summaries"][1])
+
+    with connection.cursor() as cursor:
+        for table in SUMMARY_TABLES + TABLES:
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+    return timings
@@ -0,0 +1,159 @@
+import statistics
+import time
+from StoreService import StoreService, sales_conditions
+
+# Times the paths a cashier hits most, against whatever data the database
+# holds (normally a generated dataset). Writes are undone through the undo
+# journal afterwards, so the dataset can be reused across runs.
+
+PAGE_SIZE = 500
+KEYSTROKES = "chocolate"
+
+
+def timed(fn, repeat, reset=None):
+    # reset runs untimed after every sample
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+        if reset is not None:
+            reset()
+    samples.sort()
+    return {
+        "runs": repeat,
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def per_keystroke(search, text=KEYSTROKES):
+    # One search per prefix, as the debounced search fields issue them
+    def run():
+        for end in range(1, len(text) + 1):
+            search(text[:end])
+    return run
+
+
+def page_through(fetch_page, pages, key_columns=(0,)):
+    def run():
+        after_key = None
+        for _ in range(pages):
+            rows = fetch_page(after_key, PAGE_SIZE)
+            if len(rows) < PAGE_SIZE:
+                return
+            after_key = tuple(rows[-1][column] for column in key_columns)
+    return run
+
+
+def busiest(service, query):
+    with service.conn.cursor() as cursor:
+        cursor.execute(query)
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+
+######################### BENCHMARKS ######################################
+def read_benchmarks(service, repeat):
+    results = {
+        "load_sales.first_page": timed(lambda: service.fetch_sales_page(None, PAGE_SIZE), repeat),
+        "load_sales.20_pages": timed(page_through(service.fetch_sales_page, 20), max(1, repeat // 5)),
+        "load_products.first_page": timed(lambda: service.fetch_products_page(None, PAGE_SIZE), repeat),
+        "load_products.all": timed(
+            lambda: list(service.iter_rows(service.fetch_products_page, key_columns=(0, 5))), max(1, repeat // 5)
+        ),
+        "search_sales.server_per_keystroke": timed(
+            per_keystroke(lambda text: service.fetch_sales_page(None, PAGE_SIZE, sales_conditions(text))),
+            max(1, repeat // 5)
+        ),
+    }
+    return results
+
+
+def model_benchmarks(service, repeat):
+    # Table population and the in-memory product search need QtCore only
+    try:
+        from TableModels import StoreTableModel, SearchFilterProxyModel, INT, MONEY, DATE, TEXT
+    except ImportError as err:
+        return {"table_population": {"skipped": str(err)}}
+
+    sales_page = service.fetch_sales_page(None, PAGE_SIZE)
+    products = list(service.iter_rows(service.fetch_products_page, key_columns=(0, 5)))
+    sales_kinds = [INT, TEXT, TEXT, INT, MONEY, DATE]
+    product_kinds = [INT, TEXT, MONEY, INT, DATE, INT]
+
+    def populate(kinds, rows, key_columns=(0,)):
+        model = StoreTableModel([""] * len(kinds), kinds, None, key_columns=key_columns)
+        model.append_rows(rows)
+        return model
+
+    def populate_sales():
+        model = populate(sales_kinds, sales_page)
+        # The cells of one screenful, as the view asks for them
+        for row in range(min(40, model.rowCount())):
+            for column in range(model.columnCount()):
+                model.data(model.index(row, column))
+
+    results = {
+        "table_population.sales_page": timed(populate_sales, repeat),
+        "table_population.all_products": timed(
+            lambda: populate(product_kinds, products, (0, 5)), max(1, repeat // 5)
+        ),
+    }
+
+    proxy = SearchFilterProxyModel()
+    proxy.setSourceModel(populate(product_kinds, products, (0, 5)))
+    results["search_products.per_keystroke"] = timed(per_keystroke(proxy.set_search_text), repeat)
+    proxy.set_search_text("")
+    return results
+
+
+def write_benchmarks(service, repeat):
+    product_id = busiest(service, "SELECT productid FROM stock GROUP BY productid ORDER BY SUM(quantity) DESC LIMIT 1")
+    if product_id is None:
+        return {"writes": {"skipped": "no stock to sell"}}
+    customer = "benchmark customer"
+
+    service.mark_savepoint()
+    try:
+        results = {
+            "add_sale.makepurchase": timed(lambda: service.save_sale(customer, product_id, 1), repeat),
+        }
+
+        # Deletes cascade through stock and sale; each one is undone, untimed,
+        # before the next so every run deletes the same rows
+        victim = busiest(service, "SELECT productid FROM sale GROUP BY productid ORDER BY COUNT(*) DESC LIMIT 1")
+        supplier = busiest(service, "SELECT supplierid FROM stock GROUP BY supplierid ORDER BY COUNT(*) DESC LIMIT 1")
+        deletes = max(1, repeat // 10)
+        if victim is not None:
+            results["delete_product.cascade"] = timed(
+                lambda: service.remove_product(victim), deletes, reset=service.rollback_to_savepoint
+            )
+        if supplier is not None:
+            results["delete_supplier.cascade"] = timed(
+                lambda: service.remove_supplier(supplier), deletes, reset=service.rollback_to_savepoint
+            )
+    finally:
+        service.rollback_to_savepoint()
+    return results
+
+
+def dataset_sizes(service):
+    sizes = {}
+    with service.conn.cursor() as cursor:
+        for table in ("supplier", "product", "customer", "stock", "sale"):
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            sizes[table] = cursor.fetchone()[0]
+    return sizes
+
+
+def run(connection, repeat=20, include_writes=True):
+    service = StoreService(connection)
+    results = {}
+    results.update(read_benchmarks(service, repeat))
+    results.update(model_benchmarks(service, repeat))
+    if include_writes:
+        results.update(write_benchmarks(service, repeat))
+    return {"dataset": dataset_sizes(service), "results": results}